@@ -0,0 +1 @@
+# Backend package: read-serving API over the DuckDB marts
@@ -0,0 +1,183 @@
+"""
+Pool of read-only DuckDB connections served from a snapshot of the marts.
+
+DuckDB allows one writing process per database file, and a process holding
+the file open read-only blocks dbt and dlt from writing. So the pool never
+opens the live file: it copies it to a serving snapshot whenever a writer has
+committed and closed it (no ``.wal`` next to it), and points fresh connections
+at the new snapshot. Readers never contend with the writer, and each snapshot
+swap bumps ``generation`` so the result cache knows to drop stale entries.
+
+Cursors are reference counted per generation: a replaced snapshot is closed
+(and its file removed) only once the last of its cursors has been returned,
+so requests still reading it are never cut off.
+"""
+
+import os
+import queue
+import shutil
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+import duckdb
+
+
+def _file_version(path: Path):
+    """Identity of the committed database file (mtime + size), None if missing."""
+    try:
+        stat = path.stat()
+    except FileNotFoundError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+class ReadOnlyPool:
+    """
+    Fixed-size pool of read-only DuckDB cursors over a database snapshot.
+
+    Args:
+        db_path: Live database written by dbt / dlt
+        size: Number of concurrent read connections
+        snapshot_dir: Where serving snapshots are kept (defaults next to db_path)
+        check_interval: Seconds between checks for a new committed version
+        threads: DuckDB threads per snapshot (shared by all pooled cursors)
+    """
+
+    def __init__(self, db_path: str, size: int = 4, snapshot_dir: str = None,
+                 check_interval: float = 2.0, threads: int = None):
+        self.db_path = Path(db_path).resolve()
+        self.size = size
+        self.snapshot_dir = Path(snapshot_dir) if snapshot_dir else self.db_path.parent / ".serving"
+        self.check_interval = check_interval
+        self.threads = threads
+        self.generation = 0
+
+        self._lock = threading.Lock()
+        self._version = None
+        self._databases = {}     # generation -> (database, snapshot file)
+        self._open_cursors = {}  # generation -> cursors not yet closed
+        self._idle = queue.Queue()
+        self._last_check = 0.0
+
+        self.snapshot_dir.mkdir(parents=True, exist_ok=True)
+        self.refresh(force=True)
+
+    def _wal_path(self) -> Path:
+        return self.db_path.with_name(self.db_path.name + ".wal")
+
+    def refresh(self, force: bool = False) -> bool:
+        """
+        Swap to a new snapshot if the live file changed since the last one.
+
+        Returns:
+            bool: True if a new snapshot generation is being served
+        """
+        now = time.monotonic()
+        if not force and now - self._last_check < self.check_interval:
+            return False
+
+        with self._lock:
+            self._last_check = now
+            version = _file_version(self.db_path)
+            if version is None or version == self._version:
+                return False
+            if self._wal_path().exists():
+                # A writer is mid-transaction or has not checkpointed yet;
+                # keep serving the previous snapshot and try again later
+                return False
+
+            snapshot = self.snapshot_dir / f"{self.db_path.stem}.{version[0]}.duckdb"
+            tmp = snapshot.with_suffix(".tmp")
+            shutil.copy2(self.db_path, tmp)
+            if _file_version(self.db_path) != version or self._wal_path().exists():
+                # Writer started while we were copying; discard and retry later
+                tmp.unlink(missing_ok=True)
+                return False
+            os.replace(tmp, snapshot)
+
+            config = {"threads": self.threads} if self.threads else {}
+            database = duckdb.connect(str(snapshot), read_only=True, config=config)
+
+            self._version = version
+            self.generation += 1
+            self._databases[self.generation] = (database, snapshot)
+            self._open_cursors[self.generation] = self.size
+
+            # Idle cursors of older generations are closed now; leased ones
+            # when they come back through connection()
+            current = []
+            while True:
+                try:
+                    generation, cursor = self._idle.get_nowait()
+                except queue.Empty:
+                    break
+                if generation == self.generation:
+                    current.append((generation, cursor))
+                else:
+                    self._close_cursor(generation, cursor)
+            for _ in range(self.size):
+                current.append((self.generation, database.cursor()))
+            for item in current:
+                self._idle.put(item)
+
+        print(f"🔄 Serving snapshot generation {self.generation}: {snapshot.name}")
+        return True
+
+    def _close_cursor(self, generation: int, cursor):
+        """Close a cursor; the last one of a replaced generation retires its snapshot (hold the lock)."""
+        cursor.close()
+        if generation not in self._open_cursors:
+            return
+        self._open_cursors[generation] -= 1
+        if self._open_cursors[generation] == 0 and generation != self.generation:
+            del self._open_cursors[generation]
+            self._retire(*self._databases.pop(generation))
+
+    @staticmethod
+    def _retire(database, snapshot):
+        database.close()
+        try:
+            snapshot.unlink()
+        except OSError:
+            pass
+
+    def open_generations(self) -> list:
+        """Generations whose snapshot is still open (the current one plus any still leased)."""
+        with self._lock:
+            return sorted(self._databases)
+
+    @contextmanager
+    def connection(self, timeout: float = 30.0):
+        """Lease a read-only cursor for the duration of the ``with`` block."""
+        self.refresh()
+        while True:
+            generation, cursor = self._idle.get(timeout=timeout)
+            if generation == self.generation:
+                break
+            with self._lock:
+                self._close_cursor(generation, cursor)
+
+        try:
+            yield cursor
+        finally:
+            with self._lock:
+                if generation == self.generation:
+                    self._idle.put((generation, cursor))
+                else:
+                    self._close_cursor(generation, cursor)
+
+    def close(self):
+        """Close every snapshot (cursors still leased fail on their next use)."""
+        with self._lock:
+            while True:
+                try:
+                    _, cursor = self._idle.get_nowait()
+                except queue.Empty:
+                    break
+                cursor.close()
+            for database, snapshot in self._databases.values():
+                self._retire(database, snapshot)
+            self._databases.clear()
+            self._open_cursors.clear()
@@ -0,0 +1,103 @@
+"""
+Parameterized query templates served by the backend.
+
+Callers only choose a template and its parameters; SQL is never taken from
+the request. Parameters are bound by DuckDB (``$name`` placeholders), and each
+one is parsed with its declared type before it reaches the query.
+"""
+
+from datetime import date
+
+
+class QueryError(ValueError):
+    """Unknown template or invalid parameter value."""
+
+
+def _date(value: str) -> date:
+    return date.fromisoformat(value)
+
+
+QUERY_TEMPLATES = {
+    "transactions": {
+        "description": "Transactions created in a date range",
+        "sql": """
+            SELECT
+                transaction_id, order_id, customer_id, transaction_status, payment_method,
+                transaction_amount, tax_amount, shipping_amount, total_amount, successful_amount,
+                currency, country_code, sales_channel, transaction_recency, created_at
+            FROM main_dev.fct_shopify_transactions
+            WHERE created_at >= $start_date AND created_at < $end_date
+            ORDER BY created_at
+            LIMIT $limit
+        """,
+        "params": {
+            "start_date": (_date, "1970-01-01"),
+            "end_date": (_date, "2100-01-01"),
+            "limit": (int, "1000"),
+        },
+    },
+    "daily_stats": {
+        "description": "Daily totals per status from the transaction rollup",
+        "sql": """
+            SELECT
+                day,
+                transaction_status,
+                CAST(SUM(transaction_count) AS BIGINT) AS total_transactions,
+                SUM(transaction_amount) / NULLIF(SUM(amount_count), 0) AS avg_transaction_amount,
+                SUM(successful_amount) AS total_successful_amount
+            FROM main_dev.agg_shopify_transactions_daily
+            WHERE day >= $start_date AND day < $end_date
+            GROUP BY ALL
+            ORDER BY ALL
+        """,
+        "params": {
+            "start_date": (_date, "1970-01-01"),
+            "end_date": (_date, "2100-01-01"),
+        },
+    },
+    "country_stats": {
+        "description": "Totals per country and sales channel from the transaction rollup",
+        "sql": """
+            SELECT
+                country_code,
+                sales_channel,
+                CAST(SUM(transaction_count) AS BIGINT) AS total_transactions,
+                SUM(total_amount) AS total_amount,
+                SUM(successful_amount) AS total_successful_amount
+            FROM main_dev.agg_shopify_transactions_daily
+            WHERE day >= $start_date AND day < $end_date
+            GROUP BY ALL
+            ORDER BY ALL
+        """,
+        "params": {
+            "start_date": (_date, "1970-01-01"),
+            "end_date": (_date, "2100-01-01"),
+        },
+    },
+}
+
+
+def bind_params(name: str, raw_params: dict):
+    """
+    Resolve a template and convert the raw (string) request parameters.
+
+    Returns:
+        tuple: (sql, params) ready for ``cursor.execute``
+    """
+    template = QUERY_TEMPLATES.get(name)
+    if template is None:
+        raise QueryError(f"Unknown query '{name}'")
+
+    unknown = set(raw_params) - set(template["params"])
+    if unknown:
+        raise QueryError(f"Unknown parameter(s) for '{name}': {', '.join(sorted(unknown))}")
+
+    params = {}
+    for param, (parse, default) in template["params"].items():
+        raw = raw_params.get(param, default)
+        try:
+            params[param] = parse(raw)
+        except ValueError as e:
+            raise QueryError(f"Invalid value for '{param}': {raw}") from e
+
+    return template["sql"], params
@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+"""
+Local HTTP query service over the DuckDB marts (shopify_monolith.duckdb).
+
+Endpoints:
+    GET /health                         pool generation + cache stats
+    GET /queries                        available query templates
+    GET /query/<name>?<params>&format=  run a template; format is json (default),
+                                        ndjson or arrow (Arrow IPC stream)
+
+Results are read through a pool of read-only connections (see
+connection_pool.py), cached per snapshot generation, and streamed in record
+batches with chunked transfer encoding so large results never have to be
+materialized in memory.
+
+Run from the repository root:
+    python -m backend.server --db data/shopify_monolith.duckdb --port 8000
+"""
+
+import argparse
+import json
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlparse
+
+import pyarrow as pa
+
+from backend.connection_pool import ReadOnlyPool
+from backend.queries import QUERY_TEMPLATES, QueryError, bind_params
+from backend.result_cache import ResultCache
+
+BATCH_ROWS = 10_000
+CACHE_MAX_ROWS = 50_000  # larger results are streamed but not cached
+
+CONTENT_TYPES = {
+    "json": "application/json",
+    "ndjson": "application/x-ndjson",
+    "arrow": "application/vnd.apache.arrow.stream",
+}
+
+
+class _ChunkedWriter:
+    """File-like wrapper that writes HTTP/1.1 chunks (also used as a pyarrow sink)."""
+
+    def __init__(self, wfile):
+        self.wfile = wfile
+        self.closed = False
+
+    def write(self, data):
+        data = bytes(data)
+        if data:
+            self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+        return len(data)
+
+    def flush(self):
+        self.wfile.flush()
+
+    def close(self):
+        if not self.closed:
+            self.wfile.write(b"0\r\n\r\n")
+            self.closed = True
+
+
+def _write_batches(sink, fmt: str, schema: pa.Schema, batches):
+    """Serialize record batches to the sink in the requested format."""
+    if fmt == "arrow":
+        with pa.ipc.new_stream(sink, schema) as writer:
+            for batch in batches:
+                writer.write_batch(batch)
+        return
+
+    first = True
+    if fmt == "json":
+        sink.write(b"[")
+    for batch in batches:
+        lines = []
+        for row in batch.to_pylist():
+            encoded = json.dumps(row, default=str)
+            if fmt == "json":
+                encoded = encoded if first else "," + encoded
+            else:
+                encoded += "\n"
+            first = False
+            lines.append(encoded)
+        if lines:
+            sink.write("".join(lines).encode("utf-8"))
+    if fmt == "json":
+        sink.write(b"]")
+
+
+class QueryHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server_version = "ShopifyMonolithBackend/1.0"
+
+    # Set by make_server
+    pool: ReadOnlyPool = None
+    cache: ResultCache = None
+
+    def _send_json(self, status: HTTPStatus, payload: dict):
+        body = json.dumps(payload, default=str).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        parts = [p for p in url.path.split("/") if p]
+
+        if parts == ["health"]:
+            self._send_json(HTTPStatus.OK, {
+                "status": "ok",
+                "generation": self.pool.generation,
+                "cache": self.cache.stats(),
+            })
+        elif parts == ["queries"]:
+            self._send_json(HTTPStatus.OK, {
+                name: {"description": t["description"], "params": list(t["params"])}
+                for name, t in QUERY_TEMPLATES.items()
+            })
+        elif len(parts) == 2 and parts[0] == "query":
+            self._handle_query(parts[1], dict(parse_qsl(url.query)))
+        else:
+            self._send_json(HTTPStatus.NOT_FOUND, {"error": f"Unknown path {url.path}"})
+
+    def _handle_query(self, name: str, raw_params: dict):
+        self._streaming = False
+        fmt = raw_params.pop("format", "json")
+        if fmt not in CONTENT_TYPES:
+            self._send_json(HTTPStatus.BAD_REQUEST, {"error": f"Unsupported format '{fmt}'"})
+            return
+
+        try:
+            sql, params = bind_params(name, raw_params)
+        except QueryError as e:
+            self._send_json(HTTPStatus.BAD_REQUEST, {"error": str(e)})
+            return
+
+        # Picks up a newly committed snapshot (and thereby invalidates the cache)
+        self.pool.refresh()
+        cache_key = (name, tuple(sorted(params.items())))
+        generation = self.pool.generation
+        cached = self.cache.get(cache_key, generation)
+        if cached is not None:
+            self._start_stream(fmt, cache="hit")
+            sink = _ChunkedWriter(self.wfile)
+            _write_batches(sink, fmt, cached.schema, cached.to_batches())
+            sink.close()
+            return
+
+        try:
+            with self.pool.connection() as cursor:
+                reader = cursor.execute(sql, params).fetch_record_batch(BATCH_ROWS)
+
+                # Buffer up to CACHE_MAX_ROWS; if the result ends before that it
+                # is cached, otherwise the buffered head and the rest are streamed
+                head, rows = [], 0
+                exhausted = False
+                while rows <= CACHE_MAX_ROWS:
+                    try:
+                        batch = reader.read_next_batch()
+                    except StopIteration:
+                        exhausted = True
+                        break
+                    head.append(batch)
+                    rows += batch.num_rows
+
+                if exhausted:
+                    table = pa.Table.from_batches(head, schema=reader.schema)
+                    self.cache.put(cache_key, table, generation)
+                    batches = table.to_batches()
+                else:
+                    batches = _chain(head, reader)
+
+                self._start_stream(fmt, cache="miss")
+                sink = _ChunkedWriter(self.wfile)
+                _write_batches(sink, fmt, reader.schema, batches)
+                sink.close()
+        except Exception as e:
+            if not self._streaming:
+                self._send_json(HTTPStatus.INTERNAL_SERVER_ERROR, {"error": str(e)})
+            else:
+                # Headers are already out; cutting the connection is the only signal left
+                self.close_connection = True
+            self.log_error("Query %s failed: %s", name, e)
+
+    def _start_stream(self, fmt: str, cache: str):
+        self._streaming = True
+        self.send_response(HTTPStatus.OK)
+        self.send_header("Content-Type", CONTENT_TYPES[fmt])
+        self.send_header("Transfer-Encoding", "chunked")
+        self.send_header("X-Cache", cache)
+        self.send_header("X-Snapshot-Generation", str(self.pool.generation))
+        self.end_headers()
+
+
+def _chain(head, reader):
+    yield from head
+    yield from reader
+
+
+def make_server(db_path: str, host: str = "127.0.0.1", port: int = 8000, pool_size: int = 4,
+                cache_entries: int = 256, cache_ttl: float = 300.0) -> ThreadingHTTPServer:
+    """Build the HTTP server with its connection pool and result cache."""
+    handler = type("BoundQueryHandler", (QueryHandler,), {
+        "pool": ReadOnlyPool(db_path, size=pool_size),
+        "cache": ResultCache(max_entries=cache_entries, ttl_seconds=cache_ttl),
+    })
+    return ThreadingHTTPServer((host, port), handler)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Read-serving API over the DuckDB marts")
+    parser.add_argument("--db", default="data/shopify_monolith.duckdb", help="DuckDB file to serve")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--pool-size", type=int, default=4, help="Read-only connections")
+    parser.add_argument("--cache-entries", type=int, default=256)
+    parser.add_argument("--cache-ttl", type=float, default=300.0, help="Seconds")
+    args = parser.parse_args()
+
+    server = make_server(args.db, args.host, args.port, args.pool_size, args.cache_entries, args.cache_ttl)
+    print(f"🚀 Serving {args.db} on http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.RequestHandlerClass.pool.close()
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
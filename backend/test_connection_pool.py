@@ -0,0 +1,88 @@
+"""
+Tests for the snapshot connection pool.
+
+Run from the repository root:
+    python -m pytest backend
+"""
+
+import time
+
+import duckdb
+import pytest
+
+from backend.connection_pool import ReadOnlyPool
+
+
+def _write(db_path, value):
+    with duckdb.connect(str(db_path)) as con:
+        con.execute("CREATE OR REPLACE TABLE t AS SELECT ? AS v", [value])
+    # A new committed version needs a different mtime
+    time.sleep(0.01)
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    path = tmp_path / "marts.duckdb"
+    _write(path, 1)
+    return path
+
+
+@pytest.fixture
+def pool(db_path, tmp_path):
+    pool = ReadOnlyPool(str(db_path), size=2, snapshot_dir=str(tmp_path / "serving"), check_interval=0)
+    yield pool
+    pool.close()
+
+
+def test_serves_a_snapshot_while_the_writer_commits(db_path, pool):
+    with pool.connection() as cursor:
+        assert cursor.execute("SELECT v FROM t").fetchone()[0] == 1
+        # The live file is not held open, so a writer can still commit
+        _write(db_path, 2)
+
+    assert pool.refresh(force=True)
+    assert pool.generation == 2
+    with pool.connection() as cursor:
+        assert cursor.execute("SELECT v FROM t").fetchone()[0] == 2
+
+
+def test_leased_cursor_outlives_a_refresh(db_path, pool):
+    [old_snapshot] = pool.snapshot_dir.glob("*.duckdb")
+    with pool.connection() as cursor:
+        _write(db_path, 2)
+        pool.refresh(force=True)
+
+        # The old snapshot stays open while its cursor is leased
+        assert pool.open_generations() == [1, 2]
+        assert old_snapshot.exists()
+        assert cursor.execute("SELECT v FROM t").fetchone()[0] == 1
+
+    # Returning the last cursor retires generation 1 and removes its file
+    assert pool.open_generations() == [2]
+    assert not old_snapshot.exists()
+    assert len(list(pool.snapshot_dir.glob("*.duckdb"))) == 1
+
+
+def test_unleased_generations_are_retired_on_refresh(db_path, pool):
+    _write(db_path, 2)
+    pool.refresh(force=True)
+    assert pool.open_generations() == [2]
+
+
+def test_no_refresh_while_a_wal_exists(db_path, pool):
+    _write(db_path, 2)
+    wal = db_path.with_name(db_path.name + ".wal")
+    wal.write_bytes(b"")
+    try:
+        assert not pool.refresh(force=True)
+        assert pool.generation == 1
+    finally:
+        wal.unlink()
+    assert pool.refresh(force=True)
+
+
+def test_pool_size_bounds_concurrent_leases(pool):
+    with pool.connection(), pool.connection():
+        with pytest.raises(Exception):
+            with pool.connection(timeout=0.05):
+                pass
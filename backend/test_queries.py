@@ -0,0 +1,46 @@
+"""
+Tests for the query templates, on an in-memory DuckDB.
+
+Run from the repository root:
+    python -m pytest backend
+"""
+
+import sys
+from pathlib import Path
+
+import duckdb
+
+from backend.queries import bind_params
+
+DATA_ROOT = Path(__file__).resolve().parent.parent / "data"
+if str(DATA_ROOT) not in sys.path:
+    sys.path.append(str(DATA_ROOT))
+
+from rollups import FACT_TABLE, refresh_rollups, transaction_stats  # noqa: E402
+
+
+def test_daily_stats_average_matches_the_rollup_stats():
+    con = duckdb.connect()
+    try:
+        con.execute("CREATE SCHEMA main_dev")
+        con.execute(f"""
+            CREATE TABLE {FACT_TABLE} AS
+            SELECT * FROM (VALUES
+                ('a', 'completed', 'paypal', 'US', 'online', 10.0, 0.0, 0.0, 10.0, 10.0,
+                 TIMESTAMP '2024-01-01 10:00', TIMESTAMPTZ '2024-01-01 10:00:00+00'),
+                ('b', 'completed', 'paypal', 'US', 'online', NULL, 0.0, 0.0, NULL, NULL,
+                 TIMESTAMP '2024-01-01 11:00', TIMESTAMPTZ '2024-01-01 11:00:00+00')
+            ) t(transaction_id, transaction_status, payment_method, country_code, sales_channel,
+                transaction_amount, tax_amount, shipping_amount, total_amount, successful_amount,
+                created_at, updated_at)
+        """)
+        refresh_rollups(con)
+
+        sql, params = bind_params("daily_stats", {})
+        daily = con.execute(sql, params).fetchall()
+        stats = transaction_stats(con, group_by=["day", "transaction_status"])
+
+        assert [(row[2], row[3]) for row in daily] == [(2, 10.0)]
+        assert daily[0][3] == stats["avg_transaction_amount"][0]
+    finally:
+        con.close()
@@ -0,0 +1,45 @@
+"""
+Tests for the query result cache.
+
+Run from the repository root:
+    python -m pytest backend
+"""
+
+from backend.result_cache import ResultCache
+
+
+def test_hit_and_miss_counts():
+    cache = ResultCache()
+    assert cache.get("q", generation=1) is None
+    cache.put("q", "rows", generation=1)
+    assert cache.get("q", generation=1) == "rows"
+    assert cache.stats() == {"entries": 1, "generation": 1, "hits": 1, "misses": 1}
+
+
+def test_new_generation_drops_every_entry():
+    cache = ResultCache()
+    cache.put("a", 1, generation=1)
+    cache.put("b", 2, generation=1)
+    assert cache.get("a", generation=2) is None
+    assert cache.stats()["entries"] == 0
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = ResultCache(max_entries=2)
+    cache.put("a", 1, generation=1)
+    cache.put("b", 2, generation=1)
+    cache.get("a", generation=1)
+    cache.put("c", 3, generation=1)
+    assert cache.get("b", generation=1) is None
+    assert cache.get("a", generation=1) == 1
+    assert cache.get("c", generation=1) == 3
+
+
+def test_expired_entries_are_misses(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr("backend.result_cache.time.monotonic", lambda: now[0])
+    cache = ResultCache(ttl_seconds=10)
+    cache.put("a", 1, generation=1)
+    now[0] += 11
+    assert cache.get("a", generation=1) is None
+    assert cache.stats()["entries"] == 0
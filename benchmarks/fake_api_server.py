@@ -0,0 +1,512 @@
+#!/usr/bin/env python3
+"""
+Offline stand-in for the Shopify Admin GraphQL API and the Stripe REST API.
+
+Serves generated (or recorded) fixtures with the behaviour our sources rely on:
+- Shopify: field selection (only the requested fields are returned), cursor
+  pagination of products and nested connections, aliased product(id:) lookups,
+  calculated query cost with a leaky-bucket throttle (THROTTLED errors +
+  throttleStatus), optional MAX_COST_EXCEEDED enforcement
+- Stripe: list pagination (limit / starting_after / has_more)
+- Injectable latency, jitter and error rate for both
+
+Point the sources at it with:
+    SHOPIFY_API_URL=http://127.0.0.1:8765/admin/api/2025-07/graphql.json
+    STRIPE_API_BASE=http://127.0.0.1:8765/v1
+
+Run standalone:
+    python benchmarks/fake_api_server.py --products 5000 --latency-ms 80
+"""
+
+import argparse
+import base64
+import json
+import random
+import re
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlparse
+
+# Shopify's standard plan limits
+BUCKET_SIZE = 1000.0
+RESTORE_RATE = 50.0
+MAX_QUERY_COST = 1000
+
+VENDORS = ["Shop Monolith", "Hydrogen Vendor", "Snowdevil", "Alpine Co", "Northern Gear"]
+PRODUCT_TYPES = ["snowboard", "accessories", "apparel", "gift card", "wax"]
+STATUSES = ["ACTIVE", "ACTIVE", "ACTIVE", "DRAFT", "ARCHIVED"]
+
+
+# --- Fixtures -------------------------------------------------------------------
+def _ts(base: datetime, rng: random.Random, max_days: int = 365) -> str:
+    return (base - timedelta(seconds=rng.randint(0, max_days * 86400))).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+def generate_products(count: int, seed: int = 42) -> list:
+    """Products shaped like the GetProducts query response nodes."""
+    rng = random.Random(seed)
+    now = datetime(2025, 8, 1, tzinfo=timezone.utc)
+    products = []
+    for i in range(1, count + 1):
+        product_id = 9_754_834_000_000 + i
+        created = _ts(now, rng)
+        images = [
+            {
+                "id": f"gid://shopify/ProductImage/{product_id}{j}",
+                "altText": f"Image {j} of product {i}",
+                "originalSrc": f"https://cdn.example.com/products/{product_id}/{j}.png",
+                "width": rng.choice([1024, 2048, 3097]),
+                "height": rng.choice([1024, 2048, 3908]),
+            }
+            for j in range(rng.randint(1, 4))
+        ]
+        variants = [
+            {
+                "id": f"gid://shopify/ProductVariant/{product_id}{j}",
+                "title": f"Size {j}" if j else "Default Title",
+                "price": f"{rng.uniform(5, 1000):.2f}",
+                "position": j + 1,
+                "inventoryPolicy": rng.choice(["DENY", "CONTINUE"]),
+                "compareAtPrice": None,
+                "createdAt": created,
+                "updatedAt": created,
+                "taxable": True,
+                "barcode": None,
+                "sku": f"sku-{i}-{j}",
+                "image": {"id": images[0]["id"]},
+                "selectedOptions": [{"name": "Size", "value": f"Size {j}"}],
+            }
+            for j in range(rng.randint(1, 6))
+        ]
+        products.append({
+            "id": f"gid://shopify/Product/{product_id}",
+            "title": f"Product {i}",
+            "bodyHtml": "<p>" + " ".join(rng.choice(["fast", "light", "durable", "warm"]) for _ in range(40)) + "</p>",
+            "vendor": rng.choice(VENDORS),
+            "productType": rng.choice(PRODUCT_TYPES),
+            "createdAt": created,
+            "handle": f"product-{i}",
+            "updatedAt": created,
+            "publishedAt": created,
+            "templateSuffix": None,
+            "tags": rng.sample(["winter", "sale", "new", "premium", "kids"], k=2),
+            "status": rng.choice(STATUSES),
+            "options": [{"id": f"gid://shopify/ProductOption/{product_id}", "name": "Size",
+                         "position": 1, "values": [v["title"] for v in variants]}],
+            "variants": {"edges": [{"node": v} for v in variants]},
+            "images": {"edges": [{"node": img} for img in images]},
+            "featuredImage": images[0],
+        })
+    return products
+
+
+def generate_stripe_objects(customers: int, charges: int, invoices: int, seed: int = 42) -> dict:
+    """Stripe customers, charges and invoices with the fields we load."""
+    rng = random.Random(seed)
+    now = int(datetime(2025, 8, 1, tzinfo=timezone.utc).timestamp())
+    customer_objs = [
+        {"id": f"cus_{i:010d}", "object": "customer", "email": f"customer{i}@example.com",
+         "created": now - rng.randint(0, 365 * 86400), "currency": "usd", "delinquent": False}
+        for i in range(customers)
+    ]
+    charge_objs = []
+    for i in range(charges):
+        customer = rng.choice(customer_objs)["id"] if customer_objs else None
+        charge_objs.append({
+            "id": f"ch_{i:012d}", "object": "charge", "amount": rng.randint(500, 100_000),
+            "currency": "usd", "customer": customer, "created": now - rng.randint(0, 365 * 86400),
+            "payment_intent": f"pi_{i:012d}", "status": rng.choice(["succeeded", "succeeded", "failed"]),
+            "paid": True, "refunded": False, "metadata": {"order_id": f"ORD_{i}"},
+        })
+    invoice_objs = [
+        {"id": f"in_{i:012d}", "object": "invoice", "customer": rng.choice(customer_objs)["id"] if customer_objs else None,
+         "amount_due": rng.randint(500, 50_000), "currency": "usd", "status": "paid",
+         "created": now - rng.randint(0, 365 * 86400)}
+        for i in range(invoices)
+    ]
+    return {"customers": customer_objs, "charges": charge_objs, "invoices": invoice_objs}
+
+
+# --- Shopify GraphQL ------------------------------------------------------------
+# Just enough GraphQL for our queries: aliases, arguments, nested selections
+_TOKEN_RE = re.compile(r'"(?:[^"\\]|\\.)*"|\$?\w+|[{}():\[\]!=]')
+
+
+def parse_query(query: str) -> list:
+    """Root selection of a query as (alias, name, args, children) tuples."""
+    tokens = _TOKEN_RE.findall(query)
+    i = 0
+    # Skip "query Name($var: Type, ...)"
+    while tokens[i] != "{":
+        if tokens[i] == "(":
+            while tokens[i] != ")":
+                i += 1
+        i += 1
+    fields, _ = _parse_selection(tokens, i)
+    return fields
+
+
+def _parse_selection(tokens: list, i: int) -> tuple:
+    fields = []
+    i += 1  # "{"
+    while tokens[i] != "}":
+        alias = name = tokens[i]
+        i += 1
+        if tokens[i] == ":":
+            name = tokens[i + 1]
+            i += 2
+        args = {}
+        if tokens[i] == "(":
+            i += 1
+            while tokens[i] != ")":
+                args[tokens[i]] = tokens[i + 2]
+                i += 3
+            i += 1
+        children = None
+        if tokens[i] == "{":
+            children, i = _parse_selection(tokens, i)
+        fields.append((alias, name, args, children))
+    return fields, i + 1
+
+
+def _arg(args: dict, name: str, variables: dict, default=None):
+    value = args.get(name)
+    if value is None or value == "null":
+        return default
+    if value.startswith("$"):
+        value = variables.get(value[1:])
+        return default if value is None else value
+    return json.loads(value)
+
+
+def _node_fields(connection_children: list) -> list:
+    for _, name, _, children in connection_children:
+        if name == "edges":
+            for _, child, _, node_children in children:
+                if child == "node":
+                    return node_children
+    return []
+
+
+def requested_query_cost(fields: list, variables: dict) -> int:
+    """
+    Shopify's calculated query cost of a selection.
+
+    Scalars cost 0 and objects 1; a connection costs 2 plus ``first`` times the
+    cost of its node, so nested connections multiply.
+    """
+    cost = 0
+    for _, name, args, children in fields:
+        if children is None or name == "pageInfo":
+            continue
+        if "first" in args:
+            cost += 2 + int(_arg(args, "first", variables, 0)) * (1 + requested_query_cost(_node_fields(children), variables))
+        else:
+            cost += 1 + requested_query_cost(children, variables)
+    return cost
+
+
+def actual_query_cost(fields: list, result: dict) -> int:
+    """Cost of what was actually returned (Shopify refunds the difference)."""
+    cost = 0
+    for alias, name, args, children in fields:
+        value = result.get(alias) if isinstance(result, dict) else None
+        if children is None or name == "pageInfo" or value is None:
+            continue
+        if "first" in args:
+            node_fields = _node_fields(children)
+            edges = next((value.get(a, []) for a, n, _, _ in children if n == "edges"), [])
+            cost += 2 + sum(1 + actual_query_cost(node_fields, edge.get("node")) for edge in edges)
+        elif isinstance(value, list):
+            cost += 1 + sum(actual_query_cost(children, v) for v in value)
+        else:
+            cost += 1 + actual_query_cost(children, value)
+    return cost
+
+
+def _cursor(position: int) -> str:
+    return base64.b64encode(str(position).encode()).decode()
+
+
+def resolve(node, fields: list, variables: dict):
+    """Project a fixture object onto a selection (connections are paginated)."""
+    if node is None:
+        return None
+    if isinstance(node, list):
+        return [resolve(n, fields, variables) for n in node]
+
+    result = {}
+    for alias, name, args, children in fields:
+        value = node.get(name)
+        if children is None:
+            result[alias] = value
+        elif isinstance(value, dict) and "edges" in value:
+            result[alias] = resolve_connection([e["node"] for e in value["edges"]], args, children, variables)
+        else:
+            result[alias] = resolve(value, children, variables)
+    return result
+
+
+def resolve_connection(nodes: list, args: dict, fields: list, variables: dict) -> dict:
+    first = int(_arg(args, "first", variables, 50))
+    after = _arg(args, "after", variables)
+    start = int(base64.b64decode(after).decode()) if after else 0
+    page = nodes[start:start + first]
+    end = start + len(page)
+
+    result = {}
+    for alias, name, _, children in fields:
+        if name == "pageInfo":
+            info = {"hasNextPage": end < len(nodes), "endCursor": _cursor(end)}
+            result[alias] = {a: info.get(n) for a, n, _, _ in children}
+        elif name == "edges":
+            result[alias] = [
+                {a: resolve(node, c, variables) if n == "node" else _cursor(start + k + 1) for a, n, _, c in children}
+                for k, node in enumerate(page)
+            ]
+    return result
+
+
+class LeakyBucket:
+    def __init__(self, size: float = BUCKET_SIZE, restore_rate: float = RESTORE_RATE):
+        self.size = size
+        self.restore_rate = restore_rate
+        self.available = size
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.available = min(self.size, self.available + (now - self._updated) * self.restore_rate)
+        self._updated = now
+
+    def try_take(self, requested: float) -> bool:
+        with self._lock:
+            self._refill()
+            if self.available < requested:
+                return False
+            self.available -= requested
+            return True
+
+    def refund(self, amount: float):
+        with self._lock:
+            self.available = min(self.size, self.available + amount)
+
+    def status(self) -> dict:
+        with self._lock:
+            self._refill()
+            return {"maximumAvailable": self.size, "currentlyAvailable": round(self.available, 1),
+                    "restoreRate": self.restore_rate}
+
+
+# --- HTTP handler -----------------------------------------------------------------
+class FakeApiHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    # Set by make_server
+    state = None
+
+    def log_message(self, fmt, *args):
+        if self.state.verbose:
+            super().log_message(fmt, *args)
+
+    def _send_json(self, status, payload, headers=None):
+        body = json.dumps(payload).encode("utf-8")
+        with self.state.lock:
+            self.state.response_bytes += len(body)
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _inject_faults(self) -> bool:
+        """Apply latency/jitter; return True if an error response was sent."""
+        st = self.state
+        with st.lock:
+            st.requests += 1
+        delay = st.latency + (st.rng.uniform(-st.jitter, st.jitter) if st.jitter else 0)
+        if delay > 0:
+            time.sleep(delay)
+        if st.error_rate and st.rng.random() < st.error_rate:
+            with st.lock:
+                st.injected_errors += 1
+            self._send_json(HTTPStatus.INTERNAL_SERVER_ERROR, {"errors": [{"message": "Injected error"}]})
+            return True
+        return False
+
+    def do_POST(self):
+        path = urlparse(self.path).path
+        length = int(self.headers.get("Content-Length", 0))
+        body = json.loads(self.rfile.read(length) or b"{}")
+
+        if not re.fullmatch(r"/admin/api/[\w-]+/graphql\.json", path):
+            self._send_json(HTTPStatus.NOT_FOUND, {"errors": [{"message": f"Unknown path {path}"}]})
+            return
+        if self._inject_faults():
+            return
+        self._send_json(HTTPStatus.OK, self.state.graphql(body.get("query", ""), body.get("variables") or {}))
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        parts = [p for p in url.path.split("/") if p]
+
+        if parts == ["stats"]:
+            self._send_json(HTTPStatus.OK, self.state.stats())
+            return
+        if len(parts) != 2 or parts[0] != "v1" or parts[1] not in self.state.stripe:
+            self._send_json(HTTPStatus.NOT_FOUND, {"error": {"message": f"Unknown path {url.path}"}})
+            return
+        if self._inject_faults():
+            return
+        self._send_json(HTTPStatus.OK, self.state.stripe_list(parts[1], dict(parse_qsl(url.query))))
+
+
+class FakeApiState:
+    """Fixtures, throttle bucket and counters shared by all handler threads."""
+
+    def __init__(self, products, stripe, latency_ms=0.0, jitter_ms=0.0, error_rate=0.0,
+                 enforce_max_cost=False, seed=42, verbose=False):
+        self.products = products
+        self.products_by_id = {p["id"]: p for p in products}
+        self.stripe = stripe
+        self.latency = latency_ms / 1000
+        self.jitter = jitter_ms / 1000
+        self.error_rate = error_rate
+        self.enforce_max_cost = enforce_max_cost
+        self.verbose = verbose
+        self.rng = random.Random(seed)
+        self.bucket = LeakyBucket()
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.throttled = 0
+        self.injected_errors = 0
+        self.response_bytes = 0
+
+    def graphql(self, query: str, variables: dict) -> dict:
+        fields = parse_query(query)
+        requested = requested_query_cost(fields, variables)
+        cost = {"requestedQueryCost": requested}
+
+        if requested > MAX_QUERY_COST and self.enforce_max_cost:
+            return {"errors": [{"message": f"Query cost is {requested}, which exceeds the single query "
+                                           f"max cost limit ({MAX_QUERY_COST}).",
+                                "extensions": {"code": "MAX_COST_EXCEEDED", "cost": requested,
+                                               "maxCost": MAX_QUERY_COST}}]}
+
+        data = {}
+        for alias, name, args, children in fields:
+            if name == "products":
+                data[alias] = resolve_connection(self.products, args, children, variables)
+            elif name == "product":
+                data[alias] = resolve(self.products_by_id.get(_arg(args, "id", variables)), children, variables)
+            else:
+                return {"errors": [{"message": f"Field '{name}' doesn't exist on type 'QueryRoot'"}]}
+        actual = actual_query_cost(fields, data)
+
+        # Without max-cost enforcement an oversized query could never fit in the
+        # bucket, so it is charged its actual cost (capped at the bucket) instead
+        charge = requested if requested <= MAX_QUERY_COST else min(actual, self.bucket.size)
+        if not self.bucket.try_take(charge):
+            with self.lock:
+                self.throttled += 1
+            return {"errors": [{"message": "Throttled", "extensions": {"code": "THROTTLED"}}],
+                    "extensions": {"cost": {"requestedQueryCost": charge, "actualQueryCost": None,
+                                            "throttleStatus": self.bucket.status()}}}
+        self.bucket.refund(max(charge - actual, 0))
+
+        return {
+            "data": data,
+            "extensions": {"cost": {**cost, "actualQueryCost": actual, "throttleStatus": self.bucket.status()}},
+        }
+
+    def stripe_list(self, resource: str, params: dict) -> dict:
+        items = self.stripe[resource]
+        if "created[gte]" in params:
+            items = [item for item in items if item["created"] >= int(params["created[gte]"])]
+        limit = min(int(params.get("limit", 10)), 100)
+        start = 0
+        if "starting_after" in params:
+            ids = [item["id"] for item in items]
+            start = ids.index(params["starting_after"]) + 1
+        page = items[start:start + limit]
+        return {"object": "list", "url": f"/v1/{resource}", "data": page,
+                "has_more": start + limit < len(items)}
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {"requests": self.requests, "throttled": self.throttled,
+                    "injected_errors": self.injected_errors, "response_bytes": self.response_bytes}
+
+
+def make_server(host: str = "127.0.0.1", port: int = 0, products: int = 1000, customers: int = 500,
+                charges: int = 2000, invoices: int = 500, fixtures: str = None, **state_kwargs):
+    """
+    Build the fake API server (port 0 picks a free port; see ``server.server_address``).
+
+    Args:
+        fixtures: Optional JSON file with recorded {"products": [...], "stripe": {...}}
+            fixtures; generated fixtures are used for anything it does not contain.
+    """
+    recorded = {}
+    if fixtures:
+        with open(fixtures) as f:
+            recorded = json.load(f)
+
+    state = FakeApiState(
+        products=recorded.get("products") or generate_products(products),
+        stripe={**generate_stripe_objects(customers, charges, invoices), **recorded.get("stripe", {})},
+        **state_kwargs,
+    )
+    handler = type("BoundFakeApiHandler", (FakeApiHandler,), {"state": state})
+    return ThreadingHTTPServer((host, port), handler)
+
+
+def start_in_thread(**kwargs):
+    """Start a fake server on a background thread; returns (server, base_url)."""
+    server = make_server(**kwargs)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    host, port = server.server_address
+    return server, f"http://{host}:{port}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake Shopify GraphQL + Stripe REST server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--products", type=int, default=1000)
+    parser.add_argument("--customers", type=int, default=500)
+    parser.add_argument("--charges", type=int, default=2000)
+    parser.add_argument("--invoices", type=int, default=500)
+    parser.add_argument("--fixtures", help="JSON file with recorded fixtures")
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--jitter-ms", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests answered with 500")
+    parser.add_argument("--enforce-max-cost", action="store_true", help="Reject queries above the 1000 point limit")
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+
+    server = make_server(
+        host=args.host, port=args.port, products=args.products, customers=args.customers,
+        charges=args.charges, invoices=args.invoices, fixtures=args.fixtures,
+        latency_ms=args.latency_ms, jitter_ms=args.jitter_ms, error_rate=args.error_rate,
+        enforce_max_cost=args.enforce_max_cost, verbose=args.verbose,
+    )
+    print(f"🚀 Fake Shopify/Stripe API on http://{args.host}:{args.port}")
+    print(f"   SHOPIFY_API_URL=http://{args.host}:{args.port}/admin/api/2025-07/graphql.json")
+    print(f"   STRIPE_API_BASE=http://{args.host}:{args.port}/v1")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,477 @@
+#!/usr/bin/env python3
+"""
+End-to-end throughput benchmarks for the pipelines, run fully offline.
+
+Benchmarks:
+    extract_shopify     Shopify products extraction against the fake API (rows/s, requests/s)
+    extract_stripe      Stripe customers/charges/invoices extraction against the fake API
+    dlt_load            dlt extract + normalize + load of Shopify products into DuckDB
+    synthetic           SDV synthetic generation (pipeline/synthetic_data_generator.py)
+    synthetic_worker    Job latency: cold process per job vs the warm synthetic worker
+    dbt_build           Full and incremental dbt builds of the transaction models
+
+Results are saved as JSON under benchmarks/results/ so runs can be compared:
+    python benchmarks/run_benchmarks.py
+    python benchmarks/run_benchmarks.py --only extract_shopify,dlt_load --products 5000
+    python benchmarks/run_benchmarks.py --compare benchmarks/results/baseline.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import traceback
+from datetime import datetime, timezone
+from pathlib import Path
+
+BENCH_ROOT = Path(__file__).resolve().parent
+REPO_ROOT = BENCH_ROOT.parent
+DLT_ROOT = REPO_ROOT / "dlt"
+PIPELINE_ROOT = REPO_ROOT / "pipeline"
+DBT_PROJECT_DIR = REPO_ROOT / "data"
+RESULTS_DIR = BENCH_ROOT / "results"
+
+for p in (BENCH_ROOT, DLT_ROOT, PIPELINE_ROOT):
+    if str(p) not in sys.path:
+        sys.path.append(str(p))
+
+import fake_api_server  # noqa: E402
+
+# For each metric: True if higher is better (used by --compare)
+HIGHER_IS_BETTER = {
+    "rows_per_sec": True,
+    "requests_per_sec": True,
+    "seconds": False,
+    "extract_seconds": False,
+    "normalize_seconds": False,
+    "load_seconds": False,
+    "fit_seconds": False,
+    "sample_seconds": False,
+    "cold_job_seconds": False,
+    "warm_first_job_seconds": False,
+    "warm_job_seconds": False,
+    "full_build_seconds": False,
+    "response_bytes_per_row": False,
+    "incremental_build_seconds": False,
+}
+
+
+class FakeApi:
+    """Fake Shopify/Stripe server wired into the source env vars for the duration of a benchmark."""
+
+    def __init__(self, args):
+        self.server, base_url = fake_api_server.start_in_thread(
+            products=args.products, customers=args.customers, charges=args.charges,
+            invoices=args.invoices, fixtures=args.fixtures, latency_ms=args.latency_ms,
+            jitter_ms=args.jitter_ms, error_rate=args.error_rate, enforce_max_cost=args.enforce_max_cost,
+        )
+        self._env = {
+            "SHOPIFY_API_URL": f"{base_url}/admin/api/2025-07/graphql.json",
+            "STRIPE_API_BASE": f"{base_url}/v1",
+            "STRIPE_API_KEY": "sk_test_fake",
+        }
+        self._saved = {}
+
+    def __enter__(self):
+        for k, v in self._env.items():
+            self._saved[k] = os.environ.get(k)
+            os.environ[k] = v
+        return self
+
+    def __exit__(self, *exc):
+        for k, v in self._saved.items():
+            if v is None:
+                os.environ.pop(k, None)
+            else:
+                os.environ[k] = v
+        self.server.shutdown()
+        self.server.server_close()
+        return False
+
+    def stats(self) -> dict:
+        return self.server.RequestHandlerClass.state.stats()
+
+
+def _rate(count, seconds):
+    return round(count / seconds, 2) if seconds > 0 else None
+
+
+def _product_fields(args):
+    return args.product_fields.split(",") if args.product_fields else None
+
+
+# --- Benchmarks ---------------------------------------------------------------------
+def bench_extract_shopify(args) -> dict:
+    from sources.shopify_source import get_products
+
+    with FakeApi(args) as api:
+        started = time.perf_counter()
+        rows = sum(1 for _ in get_products(fields=_product_fields(args)))
+        seconds = time.perf_counter() - started
+        stats = api.stats()
+
+    return {
+        "rows": rows,
+        "seconds": round(seconds, 4),
+        "rows_per_sec": _rate(rows, seconds),
+        "requests": stats["requests"],
+        "requests_per_sec": _rate(stats["requests"], seconds),
+        "throttled_requests": stats["throttled"],
+        "response_bytes_per_row": round(stats["response_bytes"] / rows, 1) if rows else None,
+    }
+
+
+def bench_extract_stripe(args) -> dict:
+    from sources.stripe_source import get_charges, get_customers, get_invoices
+
+    with FakeApi(args) as api:
+        started = time.perf_counter()
+        rows = sum(1 for resource in (get_customers(), get_charges(), get_invoices()) for _ in resource)
+        seconds = time.perf_counter() - started
+        stats = api.stats()
+
+    return {
+        "rows": rows,
+        "seconds": round(seconds, 4),
+        "rows_per_sec": _rate(rows, seconds),
+        "requests": stats["requests"],
+        "requests_per_sec": _rate(stats["requests"], seconds),
+    }
+
+
+def bench_dlt_load(args) -> dict:
+    import dlt
+    from sources.shopify_source import shopify_source
+    from pipelines import execution_profiles
+
+    settings = execution_profiles.apply_profile(execution_profiles.resolve_profile(args.execution_profile))
+
+    with FakeApi(args), tempfile.TemporaryDirectory() as tmp:
+        destination_con = execution_profiles.duckdb_connection(str(Path(tmp) / "bench.duckdb"), settings)
+        pipeline = dlt.pipeline(
+            pipeline_name="bench_shopify",
+            pipelines_dir=str(Path(tmp) / "pipelines"),
+            destination=dlt.destinations.duckdb(destination_con),
+            dataset_name="shopify",
+        )
+
+        started = time.perf_counter()
+        pipeline.extract(shopify_source(fields=_product_fields(args)), table_name="products")
+        extracted = time.perf_counter()
+        normalize_info = pipeline.normalize()
+        normalized = time.perf_counter()
+        pipeline.load()
+        loaded = time.perf_counter()
+        destination_con.close()
+
+    rows = sum(v for k, v in normalize_info.row_counts.items() if not k.startswith("_dlt"))
+    return {
+        "rows": rows,
+        "extract_seconds": round(extracted - started, 4),
+        "normalize_seconds": round(normalized - extracted, 4),
+        "load_seconds": round(loaded - normalized, 4),
+        "seconds": round(loaded - started, 4),
+        "rows_per_sec": _rate(rows, loaded - started),
+        "execution_profile": settings["profile"],
+    }
+
+
+def _seed_products_db(db_path: str, products: int) -> int:
+    """Create shopify.products shaped like the dlt load (scalar columns only); returns the row count."""
+    import duckdb
+    import pandas as pd
+
+    seed = pd.DataFrame([
+        {
+            "id": p["id"], "title": p["title"], "vendor": p["vendor"], "product_type": p["productType"],
+            "created_at": p["createdAt"], "updated_at": p["updatedAt"], "status": p["status"],
+            "handle": p["handle"], "variant_count": len(p["variants"]["edges"]),
+        }
+        for p in fake_api_server.generate_products(products)
+    ])
+    seed["created_at"] = pd.to_datetime(seed["created_at"])
+    seed["updated_at"] = pd.to_datetime(seed["updated_at"])
+
+    con = duckdb.connect(db_path)
+    con.execute("CREATE SCHEMA shopify")
+    con.execute("CREATE TABLE shopify.products AS SELECT * FROM seed")
+    con.close()
+    return len(seed)
+
+
+def bench_synthetic(args) -> dict:
+    from synthetic_data_generator import generate_synthetic_data
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = str(Path(tmp) / "synthetic.duckdb")
+        seed_rows = _seed_products_db(db_path, args.products)
+
+        started = time.perf_counter()
+        result = generate_synthetic_data(["shopify.products"], db_path=db_path, num_rows=args.synthetic_rows)
+        seconds = time.perf_counter() - started
+
+    if result.get("shopify.products") is None:
+        raise RuntimeError("Synthetic generation failed for shopify.products")
+    return {
+        "rows": args.synthetic_rows,
+        "seed_rows": seed_rows,
+        "seconds": round(seconds, 4),
+        "rows_per_sec": _rate(args.synthetic_rows, seconds),
+    }
+
+
+# One cold job: a fresh interpreter importing SDV, fitting, sampling and saving
+COLD_JOB = """
+import sys
+sys.path.append({pipeline_root!r})
+from synthetic_data_generator import generate_synthetic_data, save_synthetic_data_to_duckdb
+data = generate_synthetic_data(["shopify.products"], db_path={db_path!r}, num_rows={rows})
+save_synthetic_data_to_duckdb(data, db_path={db_path!r})
+"""
+
+
+def bench_synthetic_worker(args) -> dict:
+    """Job latency of a cold process per job versus the warm synthetic worker."""
+    import socket
+    import statistics
+    import requests
+    from synthetic_worker import submit_job
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = str(Path(tmp) / "synthetic.duckdb")
+        _seed_products_db(db_path, args.products)
+
+        cold = []
+        script = COLD_JOB.format(pipeline_root=str(PIPELINE_ROOT), db_path=db_path, rows=args.synthetic_rows)
+        for _ in range(args.worker_jobs):
+            started = time.perf_counter()
+            subprocess.run([sys.executable, "-c", script], check=True, capture_output=True)
+            cold.append(time.perf_counter() - started)
+
+        with socket.socket() as sock:
+            sock.bind(("127.0.0.1", 0))
+            port = sock.getsockname()[1]
+        url = f"http://127.0.0.1:{port}"
+        worker = subprocess.Popen([sys.executable, str(PIPELINE_ROOT / "synthetic_worker.py"), "--port", str(port)],
+                                  cwd=PIPELINE_ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            # Worker startup (imports) is a one-off cost and not part of job latency
+            started = time.perf_counter()
+            while True:
+                try:
+                    requests.get(f"{url}/health", timeout=1).raise_for_status()
+                    break
+                except requests.RequestException:
+                    if worker.poll() is not None or time.perf_counter() - started > 300:
+                        raise RuntimeError("Synthetic worker did not start")
+                    time.sleep(0.2)
+            startup = time.perf_counter() - started
+
+            warm = []
+            for _ in range(args.worker_jobs + 1):
+                started = time.perf_counter()
+                submit_job(url, ["shopify.products"], num_rows=args.synthetic_rows, db_path=db_path)
+                warm.append(time.perf_counter() - started)
+        finally:
+            worker.terminate()
+            worker.wait()
+
+    cold_median = statistics.median(cold)
+    warm_median = statistics.median(warm[1:])
+    return {
+        "jobs": args.worker_jobs,
+        "rows": args.synthetic_rows,
+        "cold_job_seconds": round(cold_median, 4),
+        "worker_startup_seconds": round(startup, 4),
+        "warm_first_job_seconds": round(warm[0], 4),
+        "warm_job_seconds": round(warm_median, 4),
+        "warm_speedup": round(cold_median / warm_median, 2) if warm_median > 0 else None,
+    }
+
+
+def _write_raw_transactions(con, table: str, start: int, count: int):
+    con.execute(f"""
+        INSERT INTO public.{table}
+        SELECT
+            'TXN_{table}_' || i AS transaction_id,
+            'ORD_' || i AS order_id,
+            'CUST_' || (i % 5000) AS customer_id,
+            ['pending', 'completed', 'failed'][1 + i % 3] AS transaction_status,
+            ['credit_card', 'paypal', 'shop_pay'][1 + i % 3] AS payment_method,
+            round(10 + (i * 7919 % 100000) / 100.0, 2) AS transaction_amount,
+            round(5 + (i % 50), 2) AS tax_amount,
+            round(2 + (i % 20), 2) AS shipping_amount,
+            'USD' AS currency,
+            TIMESTAMP '2025-01-01' + INTERVAL (i % 200) DAY AS created_at,
+            now() AS updated_at,
+            ['US', 'CA', 'UK'][1 + i % 3] AS country_code,
+            ['online', 'in_store'][1 + i % 2] AS sales_channel
+        FROM range({start}, {start + count}) t(i)
+    """)
+
+
+def bench_dbt_build(args) -> dict:
+    import duckdb
+
+    with tempfile.TemporaryDirectory() as tmp:
+        raw_db = Path(tmp) / "raw.duckdb"
+        env = {
+            **os.environ,
+            "DBT_BENCH_DB_PATH": str(Path(tmp) / "bench.duckdb"),
+            "DBT_BENCH_RAW_DB_PATH": str(raw_db),
+        }
+
+        con = duckdb.connect(str(raw_db))
+        con.execute("CREATE SCHEMA public")
+        per_table = args.transactions // 2
+        for table in ("transactions_table_1", "transactions_table_2"):
+            con.execute(f"""
+                CREATE TABLE public.{table} (
+                    transaction_id VARCHAR, order_id VARCHAR, customer_id VARCHAR,
+                    transaction_status VARCHAR, payment_method VARCHAR, transaction_amount DOUBLE,
+                    tax_amount DOUBLE, shipping_amount DOUBLE, currency VARCHAR,
+                    created_at TIMESTAMP, updated_at TIMESTAMP WITH TIME ZONE,
+                    country_code VARCHAR, sales_channel VARCHAR
+                )
+            """)
+            _write_raw_transactions(con, table, 0, per_table)
+        con.close()
+
+        cmd = ["dbt", "run", "--target", "bench", "--profiles-dir", str(DBT_PROJECT_DIR),
+               "--target-path", str(Path(tmp) / "target"),
+               "--select", "source:shopify_raw.transactions_table_1+", "source:shopify_raw.transactions_table_2+"]
+
+        started = time.perf_counter()
+        subprocess.run(cmd + ["--full-refresh"], cwd=DBT_PROJECT_DIR, env=env, check=True, capture_output=True)
+        full_seconds = time.perf_counter() - started
+
+        # Simulate one day of changes: 1% new rows in each source table
+        daily = max(per_table // 100, 1)
+        con = duckdb.connect(str(raw_db))
+        for table in ("transactions_table_1", "transactions_table_2"):
+            _write_raw_transactions(con, table, per_table, daily)
+        con.close()
+
+        started = time.perf_counter()
+        subprocess.run(cmd, cwd=DBT_PROJECT_DIR, env=env, check=True, capture_output=True)
+        incremental_seconds = time.perf_counter() - started
+
+    return {
+        "rows": args.transactions,
+        "incremental_rows": daily * 2,
+        "full_build_seconds": round(full_seconds, 4),
+        "incremental_build_seconds": round(incremental_seconds, 4),
+        "rows_per_sec": _rate(args.transactions, full_seconds),
+    }
+
+
+BENCHMARKS = {
+    "extract_shopify": bench_extract_shopify,
+    "extract_stripe": bench_extract_stripe,
+    "dlt_load": bench_dlt_load,
+    "synthetic": bench_synthetic,
+    "synthetic_worker": bench_synthetic_worker,
+    "dbt_build": bench_dbt_build,
+}
+
+
+# --- Results ------------------------------------------------------------------------
+def _git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(current: dict, baseline: dict, threshold: float) -> list:
+    """List of regressions larger than ``threshold`` (fraction) versus the baseline."""
+    regressions = []
+    for name, result in current["results"].items():
+        base = baseline.get("results", {}).get(name)
+        if not base or "error" in result or "error" in base:
+            continue
+        for metric, higher_is_better in HIGHER_IS_BETTER.items():
+            new, old = result.get(metric), base.get(metric)
+            if not new or not old:
+                continue
+            change = (new - old) / old
+            if (higher_is_better and change < -threshold) or (not higher_is_better and change > threshold):
+                regressions.append(f"{name}.{metric}: {old} -> {new} ({change:+.1%})")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline pipeline throughput benchmarks")
+    parser.add_argument("--only", help=f"Comma separated subset of: {', '.join(BENCHMARKS)}")
+    parser.add_argument("--products", type=int, default=1000)
+    parser.add_argument("--customers", type=int, default=500)
+    parser.add_argument("--charges", type=int, default=2000)
+    parser.add_argument("--invoices", type=int, default=500)
+    parser.add_argument("--transactions", type=int, default=200_000, help="Raw rows for dbt_build")
+    parser.add_argument("--synthetic-rows", type=int, default=1000)
+    parser.add_argument("--worker-jobs", type=int, default=3, help="Jobs per side for synthetic_worker")
+    parser.add_argument("--fixtures", help="Recorded fixtures JSON for the fake API")
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--jitter-ms", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--enforce-max-cost", action=argparse.BooleanOptionalAction, default=True,
+                        help="Reject Shopify queries above the 1000 point limit, as Shopify does")
+    parser.add_argument("--product-fields", help="Comma separated Shopify product projection (e.g. title,variants.price)")
+    parser.add_argument("--execution-profile", default="auto",
+                        help="Execution profile for dlt_load (small / large / backfill / auto)")
+    parser.add_argument("--output", help="Result file (default: benchmarks/results/<timestamp>.json)")
+    parser.add_argument("--compare", help="Baseline result file to check for regressions")
+    parser.add_argument("--threshold", type=float, default=0.10, help="Allowed regression (fraction)")
+    args = parser.parse_args()
+
+    selected = args.only.split(",") if args.only else list(BENCHMARKS)
+    unknown = set(selected) - set(BENCHMARKS)
+    if unknown:
+        parser.error(f"Unknown benchmark(s): {', '.join(sorted(unknown))}")
+
+    run = {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "git_commit": _git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "args": vars(args),
+        },
+        "results": {},
+    }
+
+    for name in selected:
+        print(f"⏱️  Running {name}...")
+        try:
+            result = BENCHMARKS[name](args)
+            print(f"✅ {name}: {result}")
+        except Exception as e:
+            traceback.print_exc()
+            result = {"error": f"{type(e).__name__}: {e}"}
+            print(f"❌ {name} failed: {e}")
+        run["results"][name] = result
+
+    output = Path(args.output) if args.output else RESULTS_DIR / f"{datetime.now(timezone.utc):%Y%m%dT%H%M%SZ}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(run, indent=2, default=str))
+    print(f"📄 Results saved to {output}")
+
+    if args.compare:
+        baseline = json.loads(Path(args.compare).read_text())
+        regressions = compare(run, baseline, args.threshold)
+        if regressions:
+            print("❌ Regressions versus baseline:")
+            for r in regressions:
+                print(f"   {r}")
+            sys.exit(1)
+        print("✅ No regressions versus baseline")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,16 @@
 -- Fact table for Shopify transactions with calculated fields
 -- References the base table from staging/shopify/base
+-- Incremental: only rows updated since the last run are rebuilt. Rows created in the
+-- last 31 days are always reprocessed so transaction_recency does not go stale.
+
+{{
+    config(
+        materialized='incremental',
+        unique_key='transaction_id',
+        incremental_strategy='delete+insert',
+        on_schema_change='append_new_columns'
+    )
+}}
 
 select 
   transaction_id,
@@ -38,4 +49,8 @@ select
     when payment_method = 'paypal' then 'digital_wallet'
     else 'shop_pay'
   end as payment_category
-from {{ ref('shopify_transactions_base') }} 
\ No newline at end of file
+from {{ ref('shopify_transactions_base') }}
+{% if is_incremental() %}
+where updated_at > (select coalesce(max(updated_at), '1970-01-01'::timestamp) from {{ this }})
+   or created_at >= current_timestamp - interval '31 days'
+{% endif %} 
\ No newline at end of file
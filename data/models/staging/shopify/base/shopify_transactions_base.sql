@@ -1,5 +1,15 @@
 -- Base transactions table that pulls from source tables
 -- References actual source tables from shopify_airflow database
+-- Incremental: each run only picks up rows updated since the last run, per source table
+
+{{
+    config(
+        materialized='incremental',
+        unique_key='transaction_id',
+        incremental_strategy='delete+insert',
+        on_schema_change='append_new_columns'
+    )
+}}
 
 with source_transactions_1 as (
     select 
@@ -18,6 +28,13 @@ with source_transactions_1 as (
         sales_channel,
         'transactions_table_1' as source_table
     from {{ source('shopify_raw', 'transactions_table_1') }}
+    {% if is_incremental() %}
+    where updated_at > (
+        select coalesce(max(updated_at), '1970-01-01'::timestamp)
+        from {{ this }}
+        where source_table = 'transactions_table_1'
+    )
+    {% endif %}
 ),
 
 source_transactions_2 as (
@@ -37,6 +54,13 @@ source_transactions_2 as (
         sales_channel,
         'transactions_table_2' as source_table
     from {{ source('shopify_raw', 'transactions_table_2') }}
+    {% if is_incremental() %}
+    where updated_at > (
+        select coalesce(max(updated_at), '1970-01-01'::timestamp)
+        from {{ this }}
+        where source_table = 'transactions_table_2'
+    )
+    {% endif %}
 ),
 
 combined_base_transactions as (
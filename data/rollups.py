@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+"""
+Pre-aggregated transaction rollups maintained at load time.
+
+Dashboards ask for the same totals, status counts and averages many times a
+day. Instead of scanning main_dev.fct_shopify_transactions on every call, we
+keep a rollup at day x status x payment_method x country_code x sales_channel
+grain and refresh only the days touched by each new load batch.
+"""
+
+from datetime import date, datetime
+
+import duckdb
+
+FACT_TABLE = "main_dev.fct_shopify_transactions"
+ROLLUP_TABLE = "main_dev.agg_shopify_transactions_daily"
+STATE_TABLE = "main_dev.agg_rollup_state"
+ROLLUP_NAME = "agg_shopify_transactions_daily"
+
+# Grain of the rollup (day is derived from created_at)
+DIMENSIONS = ["day", "transaction_status", "payment_method", "country_code", "sales_channel"]
+
+TRANSACTION_STATUSES = ["completed", "pending", "failed"]
+
+
+def _ensure_tables(conn: duckdb.DuckDBPyConnection):
+    conn.execute("CREATE SCHEMA IF NOT EXISTS main_dev")
+    conn.execute(f"""
+        CREATE TABLE IF NOT EXISTS {ROLLUP_TABLE} (
+            day DATE,
+            transaction_status VARCHAR,
+            payment_method VARCHAR,
+            country_code VARCHAR,
+            sales_channel VARCHAR,
+            transaction_count BIGINT,
+            amount_count BIGINT,
+            transaction_amount DOUBLE,
+            tax_amount DOUBLE,
+            shipping_amount DOUBLE,
+            total_amount DOUBLE,
+            successful_amount DOUBLE
+        )
+    """)
+    conn.execute(f"""
+        CREATE TABLE IF NOT EXISTS {STATE_TABLE} (
+            rollup_name VARCHAR PRIMARY KEY,
+            watermark TIMESTAMP WITH TIME ZONE
+        )
+    """)
+
+
+def refresh_rollups(conn: duckdb.DuckDBPyConnection) -> int:
+    """
+    Fold the latest load batch into the rollup table.
+
+    The batch is every fact row updated at or after the stored watermark. The
+    days those rows fall on are re-aggregated from the fact table and swapped
+    in, so status changes on existing transactions are reflected without double
+    counting, and untouched days are never rescanned. Re-aggregating a day is
+    idempotent, so rows sharing the watermark timestamp are simply counted again
+    on the next run instead of being skipped when they arrive late.
+
+    Returns:
+        int: Number of days refreshed
+    """
+    _ensure_tables(conn)
+
+    row = conn.execute(
+        f"SELECT watermark FROM {STATE_TABLE} WHERE rollup_name = ?", [ROLLUP_NAME]
+    ).fetchone()
+    watermark = row[0] if row else None
+
+    batch_filter = "updated_at >= ?" if watermark is not None else "TRUE"
+    params = [watermark] if watermark is not None else []
+
+    conn.execute("BEGIN TRANSACTION")
+    try:
+        conn.execute(f"""
+            CREATE OR REPLACE TEMP TABLE _rollup_days AS
+            SELECT DISTINCT CAST(created_at AS DATE) AS day
+            FROM {FACT_TABLE}
+            WHERE {batch_filter}
+        """, params)
+
+        days, new_watermark = conn.execute(f"""
+            SELECT
+                (SELECT COUNT(*) FROM _rollup_days),
+                (SELECT MAX(updated_at) FROM {FACT_TABLE} WHERE {batch_filter})
+        """, params).fetchone()
+
+        if days:
+            conn.execute(f"DELETE FROM {ROLLUP_TABLE} WHERE day IN (SELECT day FROM _rollup_days)")
+            conn.execute(f"""
+                INSERT INTO {ROLLUP_TABLE} BY NAME
+                SELECT
+                    CAST(created_at AS DATE) AS day,
+                    transaction_status,
+                    payment_method,
+                    country_code,
+                    sales_channel,
+                    COUNT(*) AS transaction_count,
+                    COUNT(transaction_amount) AS amount_count,
+                    SUM(transaction_amount) AS transaction_amount,
+                    SUM(tax_amount) AS tax_amount,
+                    SUM(shipping_amount) AS shipping_amount,
+                    SUM(total_amount) AS total_amount,
+                    SUM(successful_amount) AS successful_amount
+                FROM {FACT_TABLE}
+                WHERE created_at >= (SELECT MIN(day) FROM _rollup_days)
+                  AND created_at < (SELECT MAX(day) FROM _rollup_days) + INTERVAL 1 DAY
+                  AND CAST(created_at AS DATE) IN (SELECT day FROM _rollup_days)
+                GROUP BY ALL
+            """)
+            conn.execute(
+                f"INSERT OR REPLACE INTO {STATE_TABLE} VALUES (?, ?)",
+                [ROLLUP_NAME, new_watermark],
+            )
+
+        conn.execute("DROP TABLE _rollup_days")
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+
+    print(f"✅ Refreshed {days} day(s) in {ROLLUP_TABLE}")
+    return days
+
+
+def _is_day_aligned(value) -> bool:
+    if isinstance(value, str):
+        # "2024-01-01" parses to midnight, "2024-01-01 12:00" does not
+        value = datetime.fromisoformat(value)
+    if value is None or (isinstance(value, date) and not isinstance(value, datetime)):
+        return True
+    return value == datetime.combine(value.date(), datetime.min.time(), value.tzinfo)
+
+
+def _rollup_exists(conn: duckdb.DuckDBPyConnection) -> bool:
+    """True once the rollup table has been built."""
+    schema, table = ROLLUP_TABLE.split(".")
+    return conn.execute(
+        "SELECT count(*) FROM duckdb_tables() WHERE schema_name = ? AND table_name = ?",
+        [schema, table],
+    ).fetchone()[0] > 0
+
+
+def can_use_rollup(group_by=(), filters=None, start_date=None, end_date=None) -> bool:
+    """The rollup can answer a request if every column it touches is part of its grain."""
+    columns = set(group_by) | set((filters or {}).keys())
+    return columns <= set(DIMENSIONS) and _is_day_aligned(start_date) and _is_day_aligned(end_date)
+
+
+def transaction_stats(conn: duckdb.DuckDBPyConnection, group_by=(), filters=None,
+                      start_date=None, end_date=None):
+    """
+    Transaction totals, status counts and averages.
+
+    Answered from the rollup table when the requested grain allows it (and it has
+    been built), otherwise from the fact table. Never writes, so it works on a
+    read-only connection.
+
+    Args:
+        conn: DuckDB connection to shopify_monolith.duckdb
+        group_by: Columns to group by (e.g. ["day", "country_code"])
+        filters: Equality filters, {column: value}
+        start_date: Inclusive lower bound on created_at
+        end_date: Exclusive upper bound on created_at
+
+    Returns:
+        pd.DataFrame: One row per group
+    """
+    group_by = list(group_by)
+    filters = filters or {}
+    use_rollup = can_use_rollup(group_by, filters, start_date, end_date) and _rollup_exists(conn)
+
+    if use_rollup:
+        source = ROLLUP_TABLE
+        count, successful = "CAST(SUM(transaction_count) AS BIGINT)", "SUM(successful_amount)"
+        # Like AVG(): transactions without an amount are not part of the average
+        average = "SUM(transaction_amount) / NULLIF(SUM(amount_count), 0)"
+        status_count = "CAST(SUM(transaction_count) FILTER (WHERE transaction_status = '{}') AS BIGINT)"
+        day_column = "day"
+        select_group = group_by
+    else:
+        source = FACT_TABLE
+        count, successful = "COUNT(*)", "SUM(successful_amount)"
+        average = "AVG(transaction_amount)"
+        status_count = "COUNT(*) FILTER (WHERE transaction_status = '{}')"
+        day_column = "created_at"
+        select_group = [
+            "CAST(created_at AS DATE) AS day" if col == "day" else col for col in group_by
+        ]
+
+    where, params = [], []
+    for col, value in filters.items():
+        where.append(f"{'CAST(created_at AS DATE)' if col == 'day' and not use_rollup else col} = ?")
+        params.append(value)
+    if start_date is not None:
+        where.append(f"{day_column} >= ?")
+        params.append(start_date)
+    if end_date is not None:
+        where.append(f"{day_column} < ?")
+        params.append(end_date)
+
+    measures = [
+        f"COALESCE({count}, 0) AS total_transactions",
+        *[f"COALESCE({status_count.format(s)}, 0) AS {s}_transactions" for s in TRANSACTION_STATUSES],
+        f"{average} AS avg_transaction_amount",
+        f"COALESCE({successful}, 0) AS total_successful_amount",
+    ]
+
+    query = f"SELECT {', '.join(select_group + measures)} FROM {source}"
+    if where:
+        query += " WHERE " + " AND ".join(where)
+    if group_by:
+        query += " GROUP BY ALL ORDER BY ALL"
+
+    return conn.execute(query, params).fetchdf()
+
+
+if __name__ == "__main__":
+    conn = duckdb.connect("shopify_monolith.duckdb")
+    try:
+        refresh_rollups(conn)
+    finally:
+        conn.close()
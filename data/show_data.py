@@ -6,11 +6,13 @@ Script to display sample data from the shopify_transactions_base table
 import duckdb
 import pandas as pd
 
+from rollups import transaction_stats
+
 def show_transactions_data():
     """Display sample data from the shopify_transactions_base table"""
     
-    # Connect to the DuckDB database
-    conn = duckdb.connect('shopify_monolith.duckdb')
+    # Connect to the DuckDB database (read-only; the rollups are refreshed by the pipeline)
+    conn = duckdb.connect('shopify_monolith.duckdb', read_only=True)
     
     try:
         # Query the shopify_transactions_base table
@@ -44,20 +46,8 @@ def show_transactions_data():
         print(df.to_string(index=False))
         print("\n" + "=" * 80)
         
-        # Show some statistics
-        stats_query = """
-        SELECT 
-            COUNT(*) as total_transactions,
-            COUNT(CASE WHEN transaction_status = 'completed' THEN 1 END) as completed_transactions,
-            COUNT(CASE WHEN transaction_status = 'pending' THEN 1 END) as pending_transactions,
-            COUNT(CASE WHEN transaction_status = 'failed' THEN 1 END) as failed_transactions,
-            AVG(transaction_amount) as avg_transaction_amount,
-            SUM(CASE WHEN transaction_status = 'completed' THEN transaction_amount ELSE 0 END) as total_successful_amount
-        FROM main_dev.fct_shopify_transactions
-        """
-        
-        stats_result = conn.execute(stats_query)
-        stats_df = stats_result.fetchdf()
+        # Show some statistics (served from the daily rollup when available)
+        stats_df = transaction_stats(conn)
         
         print("\nTransaction Statistics:")
         print("=" * 40)
@@ -0,0 +1,191 @@
+"""
+Row-hash change detection for the Shopify pipelines.
+
+Every extracted row gets a stable content hash (nested variants, images and
+options included). Hashes from the previous successful load live in a side
+table next to the data, so a full extraction only hands inserted, updated or
+deleted rows to the load step instead of rewriting the whole table.
+"""
+
+import hashlib
+import json
+from datetime import datetime, timezone
+from pathlib import Path
+
+import duckdb
+
+HASH_TABLE = "_row_hashes"
+DELETED_FLAG = "_deleted"
+
+
+def compute_row_hash(row: dict) -> str:
+    """
+    Stable SHA-256 hash of a row.
+
+    Keys are sorted at every nesting level so the hash does not depend on the
+    order Shopify returns fields in. dlt bookkeeping columns (``_dlt_*``) are
+    ignored.
+    """
+    payload = {k: v for k, v in row.items() if not k.startswith("_dlt_")}
+    canonical = json.dumps(payload, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class ChangeDetector:
+    """
+    Compares extracted rows against the stored hashes of one table.
+
+    Usage:
+        detector = ChangeDetector("../data.duckdb", "shopify", "products")
+        yield from detector.filter(rows)    # inserted + updated rows
+        yield from detector.deletions()     # tombstones for vanished rows
+        ... load ...
+        detector.commit()                   # only after a successful load
+    """
+
+    def __init__(self, db_path: str, dataset: str, table: str, primary_key: str = "id"):
+        self.db_path = db_path
+        self.dataset = dataset
+        self.table = table
+        self.primary_key = primary_key
+        self.stats = {"inserted": 0, "updated": 0, "deleted": 0, "unchanged": 0}
+        self._stale = []
+        self._previous = self._load_previous_hashes()
+        self._seen = set()
+        self._changed = {}
+        self._deleted = []
+
+    def _load_previous_hashes(self) -> dict:
+        """
+        {row id: stored hash} of the rows in the table (empty on first run).
+
+        Hashes are only trusted for ids the table still holds: a table that was
+        dropped or replaced (e.g. by the synthetic generator) is reloaded. Rows in
+        the table without a hash map to None, so a full extraction that no longer
+        returns them tombstones them. Hashes of rows missing from the table are
+        dropped on ``commit``.
+        """
+        if not Path(self.db_path).exists():
+            # Database file does not exist yet -> everything is an insert
+            return {}
+        # Raises while another run holds the write lock rather than treating every row as new
+        con = duckdb.connect(self.db_path, read_only=True)
+
+        try:
+            try:
+                ids = [row[0] for row in con.execute(
+                    f"SELECT DISTINCT CAST({self.primary_key} AS VARCHAR) FROM {self.dataset}.{self.table}"
+                ).fetchall()]
+            except duckdb.CatalogException:
+                ids = []
+            try:
+                hashes = dict(con.execute(
+                    f"SELECT row_id, row_hash FROM {self.dataset}.{HASH_TABLE} WHERE table_name = ?",
+                    [self.table],
+                ).fetchall())
+            except duckdb.CatalogException:
+                hashes = {}
+        finally:
+            con.close()
+
+        self._stale = [row_id for row_id in hashes.keys() - set(ids)]
+        return {row_id: hashes.get(row_id) for row_id in ids}
+
+    def filter(self, rows):
+        """Yield only rows that are new or whose content hash changed."""
+        for row in rows:
+            row_id = row[self.primary_key]
+            row_hash = compute_row_hash(row)
+            self._seen.add(row_id)
+
+            previous = self._previous.get(row_id)
+            if previous == row_hash:
+                self.stats["unchanged"] += 1
+                continue
+
+            self.stats["updated" if row_id in self._previous else "inserted"] += 1
+            self._changed[row_id] = row_hash
+            yield row
+
+    def keep(self, row_ids):
+        """
+        Treat rows as present without loading them (e.g. quarantined by validation).
+
+        Their previously loaded version and hash stay as they are instead of being
+        reported as deleted.
+        """
+        for row_id in row_ids:
+            if row_id in self._previous:
+                self._seen.add(row_id)
+                self.stats["unchanged"] += 1
+
+    def deletions(self):
+        """
+        Yield tombstones for rows present in the last load but missing now.
+
+        Only call this after ``filter`` has consumed a *full* extraction,
+        otherwise rows outside the extracted window are reported as deleted.
+        """
+        for row_id in self._previous.keys() - self._seen:
+            self.stats["deleted"] += 1
+            self._deleted.append(row_id)
+            yield {self.primary_key: row_id, DELETED_FLAG: True}
+
+    def forget(self, row_ids):
+        """
+        Drop the hashes of rows deleted outside a full extraction (e.g. by a
+        products/delete webhook) on ``commit``.
+        """
+        for row_id in row_ids:
+            self.stats["deleted"] += 1
+            self._deleted.append(row_id)
+
+    def commit(self):
+        """
+        Apply this run's hash delta to the side table. Call after the load succeeded.
+
+        Only changed and deleted rows are touched, so an unchanged catalog costs
+        nothing here either.
+        """
+        if not self._changed and not self._deleted and not self._stale:
+            return
+
+        con = duckdb.connect(self.db_path)
+        try:
+            con.execute(f"CREATE SCHEMA IF NOT EXISTS {self.dataset}")
+            con.execute(
+                f"""
+                CREATE TABLE IF NOT EXISTS {self.dataset}.{HASH_TABLE} (
+                    table_name VARCHAR NOT NULL,
+                    row_id VARCHAR NOT NULL,
+                    row_hash VARCHAR NOT NULL,
+                    hashed_at TIMESTAMP WITH TIME ZONE NOT NULL
+                )
+                """
+            )
+            con.execute("BEGIN TRANSACTION")
+            con.executemany(
+                f"DELETE FROM {self.dataset}.{HASH_TABLE} WHERE table_name = ? AND row_id = ?",
+                [(self.table, row_id) for row_id in [*self._changed, *self._deleted, *self._stale]],
+            )
+            if self._changed:
+                now = datetime.now(timezone.utc)
+                con.executemany(
+                    f"INSERT INTO {self.dataset}.{HASH_TABLE} VALUES (?, ?, ?, ?)",
+                    [(self.table, row_id, row_hash, now) for row_id, row_hash in self._changed.items()],
+                )
+            con.execute("COMMIT")
+        finally:
+            con.close()
+
+    @property
+    def has_changes(self) -> bool:
+        s = self.stats
+        return bool(s["inserted"] or s["updated"] or s["deleted"])
+
+    def summary(self) -> str:
+        s = self.stats
+        return (
+            f"{self.dataset}.{self.table}: {s['inserted']} inserted, {s['updated']} updated, "
+            f"{s['deleted']} deleted, {s['unchanged']} unchanged"
+        )
@@ -0,0 +1,212 @@
+"""
+Execution profiles for the dlt pipelines.
+
+A profile sizes extract parallelism, normalize / load workers, the data
+writer's buffer and file-rotation limits, and the DuckDB destination's
+``threads`` / ``memory_limit``:
+
+    small      laptops and tiny pods
+    large      a dedicated multi-core pod for the daily runs
+    backfill   big one-off reloads: large files, every core, most of the memory
+    auto       sized from the detected CPU count and (cgroup) memory limit
+
+Pick one with ``--execution-profile`` or PIPELINE_EXECUTION_PROFILE (default
+auto). dlt settings already present in the environment (e.g.
+NORMALIZE__WORKERS) win over the profile, unless an earlier profile of the
+same process set them.
+"""
+
+import math
+import os
+from pathlib import Path
+
+import duckdb
+
+MB = 1024 * 1024
+GB = 1024 * MB
+
+PROFILES = {
+    "small": {
+        "extract_workers": 2,
+        "normalize_workers": 1,
+        "load_workers": 2,
+        "buffer_max_items": 5_000,
+        "file_max_items": 100_000,
+        "file_max_bytes": 32 * MB,
+        "duckdb_threads": 2,
+        "duckdb_memory_limit": "1GB",
+    },
+    "large": {
+        "extract_workers": 8,
+        "normalize_workers": 4,
+        "load_workers": 4,
+        "buffer_max_items": 20_000,
+        "file_max_items": 500_000,
+        "file_max_bytes": 128 * MB,
+        "duckdb_threads": 8,
+        "duckdb_memory_limit": "8GB",
+    },
+    "backfill": {
+        "extract_workers": 16,
+        "normalize_workers": 8,
+        "load_workers": 8,
+        "buffer_max_items": 50_000,
+        "file_max_items": 1_000_000,
+        "file_max_bytes": 256 * MB,
+        "duckdb_threads": 16,
+        "duckdb_memory_limit": "24GB",
+    },
+}
+
+# Profile setting -> dlt config environment variable
+DLT_ENV = {
+    "extract_workers": "EXTRACT__WORKERS",
+    "normalize_workers": "NORMALIZE__WORKERS",
+    "load_workers": "LOAD__WORKERS",
+    "buffer_max_items": "DATA_WRITER__BUFFER_MAX_ITEMS",
+    "file_max_items": "DATA_WRITER__FILE_MAX_ITEMS",
+    "file_max_bytes": "DATA_WRITER__FILE_MAX_BYTES",
+}
+
+# dlt config environment variable -> value apply_profile exported, so a later
+# profile in the same process does not mistake it for a user override
+_exported = {}
+
+
+def _read(path: str):
+    try:
+        return Path(path).read_text().strip()
+    except OSError:
+        return None
+
+
+def detect_cpus() -> int:
+    """Usable CPUs: affinity mask capped by the cgroup CPU quota."""
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cpus = os.cpu_count() or 1
+
+    quota = None
+    cpu_max = _read("/sys/fs/cgroup/cpu.max")  # cgroup v2: "<quota> <period>" or "max <period>"
+    if cpu_max and not cpu_max.startswith("max"):
+        q, period = cpu_max.split()
+        quota = int(q) / int(period)
+    else:  # cgroup v1
+        q, period = _read("/sys/fs/cgroup/cpu/cpu.cfs_quota_us"), _read("/sys/fs/cgroup/cpu/cpu.cfs_period_us")
+        if q and period and int(q) > 0:
+            quota = int(q) / int(period)
+
+    if quota:
+        cpus = min(cpus, max(1, math.ceil(quota)))
+    return max(1, cpus)
+
+
+def detect_memory_bytes() -> int:
+    """Usable memory: the cgroup limit if there is one, else physical memory."""
+    physical = os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES")
+
+    limit = _read("/sys/fs/cgroup/memory.max")  # cgroup v2
+    if limit is None:
+        limit = _read("/sys/fs/cgroup/memory/memory.limit_in_bytes")  # cgroup v1
+    if limit and limit.isdigit():
+        # v1 reports a huge number when unlimited
+        return min(int(limit), physical)
+    return physical
+
+
+def auto_profile(cpus: int = None, memory_bytes: int = None) -> dict:
+    """Profile sized from the machine (or the given CPU count / memory)."""
+    cpus = cpus or detect_cpus()
+    memory_bytes = memory_bytes or detect_memory_bytes()
+    memory_gb = memory_bytes / GB
+
+    # Normalize runs in processes; leave a core for the main process and
+    # roughly 1 GB of headroom per worker
+    normalize_workers = max(1, min(cpus - 1, int(memory_gb // 1), 16))
+    buffer_max_items = 5_000 if memory_gb < 4 else 20_000 if memory_gb < 16 else 50_000
+
+    return {
+        # Extraction is I/O bound (API calls), so threads can exceed cores
+        "extract_workers": min(cpus * 2, 32),
+        "normalize_workers": normalize_workers,
+        "load_workers": max(1, min(cpus, 8)),
+        "buffer_max_items": buffer_max_items,
+        # Rotate files so several normalize workers get work on a single resource
+        "file_max_items": buffer_max_items * 20,
+        "file_max_bytes": (32 if memory_gb < 4 else 128 if memory_gb < 32 else 256) * MB,
+        "duckdb_threads": cpus,
+        # DuckDB shares the box with the normalize workers
+        "duckdb_memory_limit": f"{max(1, int(memory_gb * 0.6))}GB",
+    }
+
+
+def resolve_profile(name: str = None) -> dict:
+    """
+    Settings of a named profile.
+
+    Args:
+        name: small | large | backfill | auto (defaults to PIPELINE_EXECUTION_PROFILE, then auto)
+
+    Returns:
+        dict: Profile settings plus "profile", "detected_cpus" and "detected_memory_bytes"
+    """
+    name = (name or os.getenv("PIPELINE_EXECUTION_PROFILE") or "auto").lower()
+    if name == "auto":
+        settings = auto_profile()
+    elif name in PROFILES:
+        settings = dict(PROFILES[name])
+    else:
+        raise ValueError(f"Unknown execution profile '{name}' (expected auto, {', '.join(PROFILES)})")
+
+    return {
+        "profile": name,
+        "detected_cpus": detect_cpus(),
+        "detected_memory_bytes": detect_memory_bytes(),
+        **settings,
+    }
+
+
+def apply_profile(settings: dict) -> dict:
+    """
+    Export the profile as dlt config environment variables (call before creating the pipeline).
+
+    Variables set by the user are left alone and reported as the effective value;
+    ones exported by an earlier call are replaced.
+
+    Returns:
+        dict: Effective settings (what the run will actually use)
+    """
+    effective = dict(settings)
+    overridden = []
+    for key, env_var in DLT_ENV.items():
+        if env_var in os.environ and os.environ[env_var] != _exported.get(env_var):
+            effective[key] = os.environ[env_var]
+            overridden.append(env_var)
+        else:
+            os.environ[env_var] = _exported[env_var] = str(settings[key])
+    effective["env_overrides"] = overridden
+    return effective
+
+
+def duckdb_connection(db_path: str, settings: dict) -> duckdb.DuckDBPyConnection:
+    """
+    DuckDB connection for the dlt destination with the profile's threads / memory_limit.
+
+    Settings are applied with SET rather than as connect() config, so other
+    connections to the same file in this process (change detection,
+    quarantine) can still be opened with the defaults.
+    """
+    con = duckdb.connect(db_path)
+    con.execute(f"SET threads = {int(settings['duckdb_threads'])}")
+    con.execute(f"SET memory_limit = '{settings['duckdb_memory_limit']}'")
+    return con
+
+
+def describe(settings: dict) -> str:
+    return (
+        f"{settings['profile']} profile: extract={settings['extract_workers']} "
+        f"normalize={settings['normalize_workers']} load={settings['load_workers']} "
+        f"buffer={settings['buffer_max_items']} file_max_items={settings['file_max_items']} "
+        f"duckdb threads={settings['duckdb_threads']} memory_limit={settings['duckdb_memory_limit']}"
+    )
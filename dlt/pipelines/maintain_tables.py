@@ -0,0 +1,367 @@
+"""
+Post-load maintenance of the hot DuckDB analytic tables.
+
+Loads append (dlt merges, dbt delete+insert) in arrival order, so the rows
+of any date range end up spread over every row group and the zone maps
+(per row group min/max) of ``created_at`` / ``updated_at`` prune nothing.
+This stage, run after the loads:
+
+- re-sorts the rows appended out of order by its time column, so date-range
+  filters skip most row groups. Only the unsorted tail is rewritten, from the
+  first stored row newer than the oldest appended one; a table in order is
+  left alone
+- re-encodes low-cardinality text columns with a closed domain as ENUM
+  (one byte per value instead of a dictionary-compressed string)
+- reports the row groups a last-week filter reads, the database file and
+  block usage, and scan time before and after
+
+Loads cast incoming text into the existing column type, so a value outside
+an ENUM fails the load. Only domains that every write path validates before
+writing get an ENUM (e.g. Shopify's ProductStatus, checked by the validator
+of the polling and the webhook loads). dbt ``accepted_values`` tests run
+after ``dbt run`` has inserted the rows, so dbt-built columns stay text and
+are listed as candidates in the report, like open domains (vendor, currency).
+
+Usage (from dlt/):
+    python -m pipelines.maintain_tables [--tables shopify.products] [--dry-run]
+"""
+
+import argparse
+import hashlib
+import os
+import statistics
+import time
+from pathlib import Path
+
+import duckdb
+
+from pipelines.telemetry import RunTelemetry
+from sources.shopify_source import PRODUCT_STATUSES
+
+REPO_ROOT = Path(__file__).resolve().parents[2]
+
+# Columns with more distinct values than this (or mostly unique ones) are never ENUM candidates
+MAX_ENUM_VALUES = 255
+MAX_DISTINCT_RATIO = 0.1
+SCAN_REPEATS = 3
+
+
+def hot_tables(dataset_name: str = None) -> list:
+    """
+    The tables maintained after each run.
+
+    Args:
+        dataset_name: Dataset of the shop's dlt tables; default SHOPIFY_DATASET_NAME, then "shopify"
+
+    Returns:
+        list: dicts with the database file, table, sort column and the closed
+              domains every write path of the table validates
+    """
+    dataset = dataset_name or os.getenv("SHOPIFY_DATASET_NAME", "shopify")
+    return [
+        {
+            "db_path": os.getenv("MAINTAIN_DLT_DB_PATH", str(REPO_ROOT / "data.duckdb")),
+            "table": f"{dataset}.products",
+            "sort_column": "updated_at",
+            # Both the polling and the webhook load quarantine products with another status
+            "domains": {"status": PRODUCT_STATUSES},
+        },
+        {
+            "db_path": os.getenv("MAINTAIN_DBT_DB_PATH", str(REPO_ROOT / "data" / "shopify_monolith.duckdb")),
+            "table": "main_dev.fct_shopify_transactions",
+            "sort_column": "created_at",
+            "domains": {},
+        },
+    ]
+
+
+def _quote(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+
+def _literal(value: str) -> str:
+    return "'" + value.replace("'", "''") + "'"
+
+
+class TableMaintainer:
+    """
+    Sorts one table on its time column and ENUM-encodes its closed-domain columns.
+
+    Usage:
+        report = TableMaintainer(con, "shopify.products", "updated_at", {"status": ("ACTIVE", ...)}).run()
+    """
+
+    def __init__(self, con: duckdb.DuckDBPyConnection, table: str, sort_column: str,
+                 domains: dict = None, dry_run: bool = False):
+        self.con = con
+        self.schema, self.name = table.split(".", 1)
+        self.table = f"{_quote(self.schema)}.{_quote(self.name)}"
+        self.sort_column = sort_column
+        self.domains = domains or {}
+        self.dry_run = dry_run
+
+    def _columns(self) -> dict:
+        return dict(self.con.execute(
+            "SELECT column_name, data_type FROM duckdb_columns() "
+            "WHERE database_name = current_database() AND schema_name = ? AND table_name = ?",
+            [self.schema, self.name],
+        ).fetchall())
+
+    def exists(self) -> bool:
+        return bool(self._columns())
+
+    def storage(self) -> dict:
+        """
+        Database file and block usage, and the row groups a last-week filter reads (after a checkpoint).
+
+        DuckDB keeps the blocks a rewrite frees in the file and reuses them for
+        later writes, so the file does not shrink; ``free_bytes`` shows them.
+        """
+        self.con.execute("CHECKPOINT")
+        block_size, used_blocks, free_blocks = self.con.execute(
+            "SELECT block_size, used_blocks, free_blocks FROM pragma_database_size() "
+            "WHERE database_name = current_database()"
+        ).fetchone()
+        db_file = self.con.execute(
+            "SELECT path FROM duckdb_databases() WHERE database_name = current_database()"
+        ).fetchone()[0]
+
+        # A row group is skipped when the max of its zone map is older than the filter, so for a
+        # one-sided range the row groups holding matching rows are exactly the ones read
+        sort = _quote(self.sort_column)
+        sort_type = self._columns()[self.sort_column]
+        row_groups, row_groups_read = self.con.execute(f"""
+            SELECT count(DISTINCT row_group_id),
+                   count(DISTINCT row_group_id) FILTER (
+                       WHERE coalesce(TRY_CAST(regexp_extract(stats, 'Max: ([^\\]]+)\\]', 1) AS {sort_type})
+                                      >= (SELECT max({sort}) - INTERVAL 7 DAY FROM {self.table}), true))
+            FROM pragma_storage_info({_literal(f'{self.schema}.{self.name}')})
+            WHERE column_name = ? AND stats LIKE '%Max: %'
+        """, [self.sort_column]).fetchone()
+        return {
+            "file_bytes": os.path.getsize(db_file) if db_file else 0,
+            "used_bytes": used_blocks * block_size,
+            "free_bytes": free_blocks * block_size,
+            "row_groups": row_groups,
+            "row_groups_read": row_groups_read,
+        }
+
+    def scan_seconds(self, columns: list) -> float:
+        """Median time of the typical queries: last week by the sort column, then group-bys on ``columns``."""
+        sort = _quote(self.sort_column)
+        newest = self.con.execute(f"SELECT max({sort}) FROM {self.table}").fetchone()[0]
+        queries = []
+        if newest is not None:
+            queries.append((f"SELECT count(*) FROM {self.table} WHERE {sort} >= ?::TIMESTAMP - INTERVAL 7 DAY", [newest]))
+        queries += [(f"SELECT {_quote(c)}, count(*) FROM {self.table} GROUP BY ALL", []) for c in columns]
+
+        timings = []
+        for _ in range(SCAN_REPEATS):
+            started = time.perf_counter()
+            for sql, params in queries:
+                self.con.execute(sql, params).fetchall()
+            timings.append(time.perf_counter() - started)
+        return statistics.median(timings)
+
+    def low_cardinality_columns(self) -> dict:
+        """{column: sorted distinct values} of the text columns with few enough values for an ENUM."""
+        text_columns = [c for c, data_type in self._columns().items() if data_type == "VARCHAR"]
+        if not text_columns:
+            return {}
+        rows = self.con.execute(f"SELECT count(*) FROM {self.table}").fetchone()[0]
+        estimates = self.con.execute(
+            f"SELECT {', '.join(f'approx_count_distinct({_quote(c)})' for c in text_columns)} FROM {self.table}"
+        ).fetchone()
+
+        candidates = {}
+        for column, distinct in zip(text_columns, estimates):
+            if 0 < distinct <= MAX_ENUM_VALUES and distinct <= max(1, rows * MAX_DISTINCT_RATIO):
+                values = self.con.execute(
+                    f"SELECT DISTINCT {_quote(column)} FROM {self.table} WHERE {_quote(column)} IS NOT NULL ORDER BY 1"
+                ).fetchall()
+                candidates[column] = [v[0] for v in values]
+        return candidates
+
+    def unsorted_from(self):
+        """
+        First row id of the part that has to be rewritten to put the table in order (None if it is).
+
+        Merges delete in place and append at the end, so the table is a sorted
+        prefix plus an appended tail. Only the tail and the prefix rows newer
+        than the oldest tail row have to move; NULLs sort first.
+        """
+        sort = _quote(self.sort_column)
+        tail_start = self.con.execute(f"""
+            SELECT min(r) FROM (
+                SELECT rowid AS r, {sort} AS v, lag({sort}) OVER (ORDER BY rowid) AS prev FROM {self.table}
+            ) WHERE (v IS NULL AND prev IS NOT NULL) OR v < prev
+        """).fetchone()[0]
+        if tail_start is None:
+            return None
+        tail_min, tail_nulls = self.con.execute(
+            f"SELECT min({sort}), count(*) - count({sort}) FROM {self.table} WHERE rowid >= ?", [tail_start]
+        ).fetchone()
+        moved = f"{sort} IS NOT NULL" if tail_nulls else f"{sort} > ?"
+        first_moved = self.con.execute(
+            f"SELECT min(rowid) FROM {self.table} WHERE rowid < ? AND {moved}",
+            [tail_start] if tail_nulls else [tail_start, tail_min],
+        ).fetchone()[0]
+        return tail_start if first_moved is None else first_moved
+
+    def _enum_type(self, column: str, domain: tuple) -> str:
+        """ENUM type for a domain, created once per distinct domain (name includes its hash)."""
+        digest = hashlib.md5("\x00".join(domain).encode()).hexdigest()[:8]
+        name = f"{self.name}__{column}_{digest}"
+        exists = self.con.execute(
+            "SELECT count(*) FROM duckdb_types() WHERE database_name = current_database() "
+            "AND schema_name = ? AND type_name = ?",
+            [self.schema, name],
+        ).fetchone()[0]
+        if not exists:
+            values = ", ".join(_literal(v) for v in domain)
+            self.con.execute(f"CREATE TYPE {_quote(self.schema)}.{_quote(name)} AS ENUM ({values})")
+        return f"{_quote(self.schema)}.{_quote(name)}"
+
+    def encode_enums(self, candidates: dict) -> tuple:
+        """ENUM-encode the candidates with a closed domain covering every stored value."""
+        encoded, open_domain = [], []
+        for column, values in candidates.items():
+            domain = self.domains.get(column)
+            if domain is None or not set(values) <= set(domain):
+                open_domain.append(column)
+                continue
+            if not self.dry_run:
+                enum_type = self._enum_type(column, tuple(domain))
+                self.con.execute(f"ALTER TABLE {self.table} ALTER COLUMN {_quote(column)} TYPE {enum_type}")
+            encoded.append(column)
+        return encoded, open_domain
+
+    def sort_rows(self, from_rowid: int = 0) -> int:
+        """
+        Rewrite the rows from ``from_rowid`` on in sort-column order (atomically;
+        constraints and column types are kept). Returns the number of rows rewritten.
+        """
+        self.con.execute(f"CREATE OR REPLACE TEMP TABLE _sorted AS SELECT * FROM {self.table} "
+                         f"WHERE rowid >= ? ORDER BY {_quote(self.sort_column)} NULLS FIRST", [from_rowid])
+        rewritten = self.con.execute("SELECT count(*) FROM _sorted").fetchone()[0]
+        self.con.execute("BEGIN TRANSACTION")
+        try:
+            self.con.execute(f"DELETE FROM {self.table} WHERE rowid >= ?", [from_rowid])
+            self.con.execute(f"INSERT INTO {self.table} SELECT * FROM _sorted")
+            self.con.execute("COMMIT")
+        except Exception:
+            self.con.execute("ROLLBACK")
+            raise
+        finally:
+            self.con.execute("DROP TABLE IF EXISTS _sorted")
+        # Deleted row groups are only reclaimed (and the new ones written compressed) on checkpoint
+        self.con.execute("CHECKPOINT")
+        return rewritten
+
+    def run(self) -> dict:
+        """Maintain the table; returns the before / after report."""
+        started = time.perf_counter()
+        columns = self._columns()
+        if self.sort_column not in columns:
+            raise ValueError(f"{self.schema}.{self.name} has no column '{self.sort_column}'")
+
+        candidates = self.low_cardinality_columns()
+        before = self.storage()
+        scan_before = self.scan_seconds(list(candidates))
+
+        encoded, open_domain = self.encode_enums(candidates)
+        unsorted_from = self.unsorted_from()
+        rewritten = 0
+        if not self.dry_run and encoded:
+            # ALTER TYPE rewrote every row group once; a full sort compacts the leftovers too
+            rewritten = self.sort_rows()
+        elif not self.dry_run and unsorted_from is not None:
+            rewritten = self.sort_rows(unsorted_from)
+
+        after = self.storage()
+        scan_after = self.scan_seconds(list(candidates))
+        return {
+            "table": f"{self.schema}.{self.name}",
+            "rows": self.con.execute(f"SELECT count(*) FROM {self.table}").fetchone()[0],
+            "sort_column": self.sort_column,
+            "was_sorted": unsorted_from is None,
+            "rows_rewritten": rewritten,
+            "enum_columns": encoded,
+            "enum_candidates": open_domain,
+            **{f"{key}_before": value for key, value in before.items()},
+            **{f"{key}_after": value for key, value in after.items()},
+            "scan_seconds_before": round(scan_before, 4),
+            "scan_seconds_after": round(scan_after, 4),
+            "dry_run": self.dry_run,
+            "seconds": round(time.perf_counter() - started, 3),
+        }
+
+
+def maintain(tables: list = None, dry_run: bool = False, dataset_name: str = None) -> list:
+    """
+    Maintain the hot tables whose database file and table exist.
+
+    Args:
+        tables: Subset of table names (e.g. ["shopify.products"]); default every hot table
+        dry_run: Measure and report without changing anything
+        dataset_name: Dataset of the shop's dlt tables (see hot_tables)
+
+    Returns:
+        list: One report per maintained table
+    """
+    reports = []
+    for spec in hot_tables(dataset_name):
+        if tables and spec["table"] not in tables:
+            continue
+        if not Path(spec["db_path"]).exists():
+            print(f"⏭️ {spec['db_path']} not found, skipping {spec['table']}")
+            continue
+
+        with duckdb.connect(spec["db_path"]) as con:
+            maintainer = TableMaintainer(con, spec["table"], spec["sort_column"], spec["domains"], dry_run=dry_run)
+            if not maintainer.exists():
+                print(f"⏭️ {spec['table']} not found in {spec['db_path']}, skipping")
+                continue
+            reports.append(maintainer.run())
+    return reports
+
+
+def _mb(value: int) -> str:
+    return f"{value / 1024 / 1024:.2f} MB"
+
+
+def run(tables: list = None, dry_run: bool = False, dataset_name: str = None) -> list:
+    """Run the maintenance with telemetry and print the before / after report."""
+    # Per-shop runs keep their own metrics file and Pushgateway group
+    dataset = dataset_name or os.getenv("SHOPIFY_DATASET_NAME", "shopify")
+    with RunTelemetry("maintenance" if dataset == "shopify" else f"maintenance_{dataset}") as telemetry:
+        with telemetry.stage("maintain"):
+            reports = maintain(tables, dry_run=dry_run, dataset_name=dataset_name)
+        for report in reports:
+            telemetry.tables[report["table"]] = {"rows": report["rows_rewritten"], "bytes": 0}
+        telemetry.extra["maintenance"] = reports
+
+    for r in reports:
+        order = ("already in order" if r["was_sorted"] else
+                 f"{r['rows_rewritten']} rows rewritten" if r["rows_rewritten"] else "out of order")
+        print(f"🧹 {r['table']} ({r['rows']} rows, sorted by {r['sort_column']}, {order})")
+        print(f"   last-week filter reads: {r['row_groups_read_before']}/{r['row_groups_before']} row groups"
+              f" -> {r['row_groups_read_after']}/{r['row_groups_after']}")
+        print(f"   file: {_mb(r['file_bytes_before'])} -> {_mb(r['file_bytes_after'])}"
+              f" (used {_mb(r['used_bytes_after'])}, free for reuse {_mb(r['free_bytes_after'])})")
+        print(f"   scan: {r['scan_seconds_before'] * 1000:.1f} ms -> {r['scan_seconds_after'] * 1000:.1f} ms")
+        if r["enum_columns"]:
+            print(f"   ENUM{' (dry run)' if r['dry_run'] else ''}: {', '.join(r['enum_columns'])}")
+        if r["enum_candidates"]:
+            print(f"   low cardinality, no declared domain: {', '.join(r['enum_candidates'])}")
+    print("✅ Table maintenance finished!")
+    return reports
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Sort and ENUM-encode the hot DuckDB tables")
+    parser.add_argument("--tables", help="Comma separated subset, e.g. shopify.products")
+    parser.add_argument("--dry-run", action="store_true", help="Only measure and report")
+    parser.add_argument("--dataset", help="Dataset of the shop's dlt tables (default SHOPIFY_DATASET_NAME)")
+    args = parser.parse_args()
+    run(tables=args.tables.split(",") if args.tables else None, dry_run=args.dry_run, dataset_name=args.dataset)
@@ -0,0 +1,217 @@
+"""
+Low-overhead profiling for the pipeline entry points.
+
+A profiled run writes three files next to the other run logs
+(``logs/profiles`` unless PIPELINE_PROFILE_DIR is set):
+
+    <name>-<run_id>.collapsed    stack samples in collapsed format, ready for
+                                 flamegraph.pl / speedscope / inferno
+    <name>-<run_id>.alloc.txt    top-N allocation sites from tracemalloc
+    <name>-<run_id>.spans.json   wall time of each phase span
+
+Stacks are sampled from a background thread via ``sys._current_frames`` so the
+profiled code is not instrumented. tracemalloc does hook every allocation, so
+even with a single frame allocation-heavy Python code runs several times
+slower while profiled; only profile a small sampled fraction of production runs.
+
+Profiling is enabled by ``--profile`` on the command line, or from the
+environment (for the Airflow tasks):
+    PIPELINE_PROFILE=1                    profile every run
+    PIPELINE_PROFILE_SAMPLE_RATE=0.05     profile ~5% of runs
+"""
+
+import json
+import os
+import random
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+
+DEFAULT_OUTPUT_DIR = Path(__file__).resolve().parents[2] / "logs" / "profiles"
+DEFAULT_INTERVAL = 0.01  # seconds between stack samples (100 Hz)
+DEFAULT_TOP_N = 25
+
+
+def should_profile(flag: bool = False) -> bool:
+    """Whether this run should be profiled (CLI flag, PIPELINE_PROFILE or the sample rate)."""
+    if flag or os.getenv("PIPELINE_PROFILE", "").lower() in ("1", "true", "yes"):
+        return True
+    rate = float(os.getenv("PIPELINE_PROFILE_SAMPLE_RATE", "0") or 0)
+    return rate > 0 and random.random() < rate
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    # ';' separates frames and ' ' separates the count in the collapsed format
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})".replace(";", ":").replace(" ", "_")
+
+
+class _NullProfiler:
+    """Used when profiling is off; spans are no-ops."""
+
+    enabled = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    @contextmanager
+    def span(self, name: str):
+        yield
+
+
+_NULL = _NullProfiler()
+_active = None
+
+
+def active():
+    """Profiler of the run in progress, or a no-op profiler."""
+    return _active or _NULL
+
+
+def span(name: str):
+    """Time a phase of the active profiled run (no-op when not profiling)."""
+    return active().span(name)
+
+
+class Profiler:
+    """
+    Sampling CPU profiler + tracemalloc allocation tracker + phase spans.
+
+    Usage:
+        with profile_run("shopify", enabled=args.profile):
+            with span("extract"):
+                ...
+    """
+
+    enabled = True
+
+    def __init__(self, name: str, output_dir: str = None, interval: float = None,
+                 top_n: int = None, trace_frames: int = None):
+        self.name = name
+        self.output_dir = Path(output_dir or os.getenv("PIPELINE_PROFILE_DIR", DEFAULT_OUTPUT_DIR))
+        self.interval = interval or float(os.getenv("PIPELINE_PROFILE_INTERVAL", DEFAULT_INTERVAL))
+        self.top_n = top_n or int(os.getenv("PIPELINE_PROFILE_TOP_N", DEFAULT_TOP_N))
+        self.trace_frames = trace_frames or int(os.getenv("PIPELINE_PROFILE_TRACE_FRAMES", 1))
+        self.run_id = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+
+        self.samples = Counter()
+        self.sample_count = 0
+        self.spans = []
+        self._span_stack = []
+        self._stop = threading.Event()
+        self._thread = None
+        self._started = None
+        self._snapshot = None
+        self._peak_traced = 0
+        self._owns_tracemalloc = False
+
+    # --- Context management -----------------------------------------------
+    def __enter__(self):
+        global _active
+        _active = self
+        self._started = time.perf_counter()
+        self._owns_tracemalloc = not tracemalloc.is_tracing()
+        if self._owns_tracemalloc:
+            tracemalloc.start(self.trace_frames)
+        self._thread = threading.Thread(target=self._sample_loop, name="profiler-sampler", daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        global _active
+        self._stop.set()
+        self._thread.join()
+        self._snapshot = tracemalloc.take_snapshot()
+        self._peak_traced = tracemalloc.get_traced_memory()[1]
+        if self._owns_tracemalloc:
+            tracemalloc.stop()
+        _active = None
+        self.spans.append({"name": "total", "seconds": time.perf_counter() - self._started, "depth": 0})
+        self.write()
+        return False
+
+    @contextmanager
+    def span(self, name: str):
+        """Time a phase; samples taken inside it are prefixed with the span name."""
+        self._span_stack.append(name)
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.spans.append({
+                "name": "/".join(self._span_stack),
+                "seconds": time.perf_counter() - started,
+                "depth": len(self._span_stack),
+            })
+            self._span_stack.pop()
+
+    # --- Sampling -----------------------------------------------------------
+    def _sample_loop(self):
+        own_ident = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            threads = {t.ident: t.name for t in threading.enumerate()}
+            phase = "/".join(self._span_stack) or "-"
+            for ident, frame in sys._current_frames().items():
+                if ident == own_ident:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_label(frame))
+                    frame = frame.f_back
+                thread_name = threads.get(ident, str(ident)).replace(" ", "_")
+                self.samples[";".join([phase, thread_name] + stack[::-1])] += 1
+            self.sample_count += 1
+
+    # --- Output -------------------------------------------------------------
+    def allocation_report(self) -> str:
+        """Top-N allocation sites by size still allocated at the end of the run."""
+        stats = self._snapshot.statistics("traceback" if self.trace_frames > 1 else "lineno")
+        total = sum(s.size for s in stats)
+        lines = [
+            f"Top {self.top_n} allocation sites for {self.name} run {self.run_id}",
+            f"Still allocated: {total / 1024 / 1024:.1f} MiB in {sum(s.count for s in stats)} blocks",
+            f"Peak traced: {self._peak_traced / 1024 / 1024:.1f} MiB",
+            "",
+        ]
+        for rank, stat in enumerate(stats[:self.top_n], 1):
+            lines.append(f"#{rank}: {stat.size / 1024:.1f} KiB in {stat.count} blocks")
+            for line in stat.traceback.format():
+                lines.append(f"    {line}")
+        return "\n".join(lines) + "\n"
+
+    def write(self):
+        """Write the collapsed stacks, the allocation report and the spans."""
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        prefix = self.output_dir / f"{self.name}-{self.run_id}"
+
+        with open(f"{prefix}.collapsed", "w") as f:
+            for stack, count in self.samples.most_common():
+                f.write(f"{stack} {count}\n")
+        Path(f"{prefix}.alloc.txt").write_text(self.allocation_report())
+        Path(f"{prefix}.spans.json").write_text(json.dumps({
+            "name": self.name,
+            "run_id": self.run_id,
+            "interval_seconds": self.interval,
+            "samples": self.sample_count,
+            "spans": self.spans,
+        }, indent=2))
+        print(f"🔬 Profile written to {prefix}.*")
+
+
+def profile_run(name: str, enabled: bool = False, **kwargs):
+    """
+    Profiler for an entry point, or a no-op if this run is not profiled.
+
+    Args:
+        name: Used in the output file names (e.g. "shopify")
+        enabled: Force profiling on (``--profile``); otherwise the env switches decide
+    """
+    return Profiler(name, **kwargs) if should_profile(enabled) else _NULL
@@ -0,0 +1,465 @@
+"""
+Incremental reconciliation of Stripe charges against store / Shopify orders.
+
+Runs after the Stripe and Shopify loads, inside DuckDB:
+- charges: ``stripe_data.stripe_charges`` (the Stripe pipeline's Postgres
+  destination, attached read-only from DATABASE_URL, or a local copy)
+- orders: the store's ``transactions`` (customers linked through
+  ``customers.stripe_customer_id``) and the ``orders`` of every Shopify
+  dataset, e.g. ``shopify.orders`` or ``shopify_<shop>.orders`` (customers
+  linked by email)
+
+The reconciliation schema is shared by every shop, so one run covers all of
+them (the Airflow payments DAG passes every shop's dataset).
+
+Charges are hash-joined to orders in three passes, each only over what is
+still unmatched:
+    payment_reference   charge.payment_intent = transactions.stripe_payment_intent_id
+    order_reference     charge.metadata.order_id = order number / name
+    customer_amount     same Stripe customer, currency and amount, within the time tolerance
+
+Each run only reads rows loaded or changed since the per-source watermark,
+plus the rows earlier runs left unmatched, so its cost follows the new data
+rather than the history. The watermark is on when a row arrived, not when the
+payment happened: the dlt load time (``_dlt_load_id``) for dlt-loaded tables
+(charges, ``shopify.orders``) and ``updated_at`` for the store tables, so late
+or changed rows are never skipped. Both dlt tables are merge-loaded, so a row
+only gets a new load id when it is loaded again (charges: inside the Stripe
+source's update window). Unmatched rows older than RECONCILE_RETRY_DAYS are
+not re-checked, even when they are reloaded. Results accumulate in
+``reconciliation.matches`` (keyed by charge) and ``reconciliation.exceptions``
+(charges and orders still unmatched once the tolerance has passed; resolved
+automatically if a later run matches them). Unmatched rows still inside the
+tolerance wait in ``reconciliation._pending``.
+
+Usage (from dlt/):
+    python -m pipelines.reconcile_payments
+    python -m pipelines.reconcile_payments --shopify-datasets shopify_shop_a,shopify_shop_b
+"""
+
+import argparse
+import os
+from datetime import datetime, timedelta, timezone
+
+import duckdb
+
+from pipelines.telemetry import RunTelemetry
+
+DB_PATH = "../data.duckdb"
+DATASET = "reconciliation"
+MATCHES_TABLE = "matches"
+EXCEPTIONS_TABLE = "exceptions"
+STATE_TABLE = "_state"
+PENDING_TABLE = "_pending"
+
+TOLERANCE_HOURS = float(os.getenv("RECONCILE_TOLERANCE_HOURS", "24"))
+RETRY_DAYS = int(os.getenv("RECONCILE_RETRY_DAYS", "30"))
+
+# Match passes in order of confidence: (rule, join condition)
+MATCH_RULES = [
+    ("payment_reference", "c.payment_ref = o.payment_ref"),
+    ("order_reference", "c.order_ref = o.order_ref"),
+    ("customer_amount", "c.customer_ref = o.customer_ref AND c.currency = o.currency "
+                        "AND c.amount_minor = o.amount_minor AND {time_diff} <= {tolerance}"),
+]
+
+# Stripe amounts are in the currency's minor unit, except for these
+ZERO_DECIMAL_CURRENCIES = ("BIF", "CLP", "DJF", "GNF", "JPY", "KMF", "KRW", "MGA",
+                           "PYG", "RWF", "UGX", "VND", "VUV", "XAF", "XOF", "XPF")
+
+TIME_DIFF = "abs(epoch(c.occurred_at) - epoch(o.occurred_at))"
+
+
+def _ts(value: datetime) -> str:
+    return f"TIMESTAMP '{value.strftime('%Y-%m-%d %H:%M:%S.%f')}'"
+
+
+def _changed_at(columns: dict, alias: str, fallback: str) -> str:
+    """When a row was loaded or last changed: the dlt load time, else updated_at, else ``fallback``."""
+    if "_dlt_load_id" in columns:
+        return f"CAST(to_timestamp(CAST({alias}._dlt_load_id AS DOUBLE)) AS TIMESTAMP)"
+    if "updated_at" in columns:
+        return f"CAST({alias}.updated_at AS TIMESTAMP)"
+    return fallback
+
+
+def _minor_units(amount: str, currency: str) -> str:
+    zero_decimal = ", ".join(f"'{c}'" for c in ZERO_DECIMAL_CURRENCIES)
+    return (f"CAST(round(CAST({amount} AS DECIMAL(18, 2)) * "
+            f"CASE WHEN upper({currency}) IN ({zero_decimal}) THEN 1 ELSE 100 END) AS BIGINT)")
+
+
+class PaymentReconciler:
+    """
+    Matches newly loaded charges and orders and maintains the match index and exceptions.
+
+    Usage:
+        stats = PaymentReconciler("../data.duckdb").run()
+    """
+
+    def __init__(self, db_path: str = DB_PATH, tolerance_hours: float = TOLERANCE_HOURS,
+                 retry_days: int = RETRY_DAYS, postgres_url: str = None, shopify_datasets: list = None):
+        self.db_path = db_path
+        self.tolerance = timedelta(hours=tolerance_hours)
+        self.retry_days = retry_days
+        self.postgres_url = postgres_url if postgres_url is not None else os.getenv("DATABASE_URL")
+        # Each dataset is an order source of its own ("shopify" keeps its ids and watermark)
+        self.shopify_datasets = shopify_datasets or [os.getenv("SHOPIFY_DATASET_NAME", "shopify")]
+        self.stats = {}
+        self._load_id_sources = set()  # sources watermarked on _dlt_load_id
+
+    # --- Sources ------------------------------------------------------------------
+    def _connect(self) -> duckdb.DuckDBPyConnection:
+        con = duckdb.connect(self.db_path)
+        con.execute("SET TimeZone = 'UTC'")
+        if self.postgres_url:
+            con.execute("INSTALL postgres")
+            con.execute("LOAD postgres")
+            con.execute(f"ATTACH '{self.postgres_url}' AS pg (TYPE postgres, READ_ONLY)")
+        return con
+
+    @staticmethod
+    def _columns(con, table: str):
+        """Column -> type of a table, or None if it does not exist."""
+        try:
+            return {row[0]: row[1] for row in con.execute(f"DESCRIBE {table}").fetchall()}
+        except duckdb.Error:
+            return None
+
+    def _find(self, con, candidates: list):
+        """First existing table of the candidates, with its columns."""
+        for table in candidates:
+            columns = self._columns(con, table)
+            if columns is not None:
+                return table, columns
+        return None, None
+
+    def _create_source_views(self, con) -> dict:
+        """Normalized charges_src / orders_src views; returns {source: table} of the sources found."""
+        charges, charge_columns = self._find(con, [
+            os.getenv("RECONCILE_CHARGES_TABLE") or "stripe_data.stripe_charges", "pg.stripe_data.stripe_charges",
+        ])
+        if charges is None:
+            return {}
+        self._load_id_sources = {"stripe"} if "_dlt_load_id" in charge_columns else set()
+
+        created = charge_columns.get("created", "")
+        occurred_at = "to_timestamp(c.created)" if "INT" in created.upper() else "c.created"
+        order_ref = "c.metadata__order_id" if "metadata__order_id" in charge_columns else "NULL"
+        con.execute(f"""
+            CREATE OR REPLACE TEMP VIEW charges_src AS
+            SELECT CAST(c.id AS VARCHAR) AS charge_id, 'stripe' AS source,
+                   c.payment_intent AS payment_ref,
+                   CAST({order_ref} AS VARCHAR) AS order_ref,
+                   c.customer AS customer_ref,
+                   upper(c.currency) AS currency,
+                   CAST(c.amount AS BIGINT) AS amount_minor,
+                   CAST({occurred_at} AS TIMESTAMP) AS occurred_at,
+                   {_changed_at(charge_columns, "c", f"CAST({occurred_at} AS TIMESTAMP)")} AS changed_at
+            FROM {charges} c
+            WHERE c.status = 'succeeded'
+        """)
+
+        customers, _ = self._find(con, ["store.customers", "pg.public.customers"])
+        transactions, transaction_columns = self._find(con, ["store.transactions", "pg.public.transactions"])
+
+        selects, sources = [], {"stripe": charges}
+        if transactions:
+            customer_join = f"LEFT JOIN {customers} cu ON cu.id = t.customer_id" if customers else ""
+            customer_ref = "cu.stripe_customer_id" if customers else "NULL"
+            selects.append(f"""
+                SELECT 'store:' || t.order_number AS order_id, 'store' AS order_source,
+                       t.stripe_payment_intent_id AS payment_ref, t.order_number AS order_ref,
+                       {customer_ref} AS customer_ref, upper(t.currency) AS currency,
+                       {_minor_units('t.total_amount', 't.currency')} AS amount_minor,
+                       CAST(t.created_at AS TIMESTAMP) AS occurred_at,
+                       {_changed_at(transaction_columns, "t", "CAST(t.created_at AS TIMESTAMP)")} AS changed_at
+                FROM {transactions} t {customer_join}
+                WHERE t.payment_status IN ('paid', 'refunded')
+            """)
+            sources["store"] = transactions
+        for dataset in self.shopify_datasets:
+            shopify_orders, order_columns = self._find(con, [f"{dataset}.orders"])
+            if shopify_orders is None:
+                continue
+            customer_join = f"LEFT JOIN {customers} cu ON lower(cu.email) = lower(o.email)" if customers else ""
+            customer_ref = "cu.stripe_customer_id" if customers else "NULL"
+            selects.append(f"""
+                SELECT '{dataset}:' || CAST(o.id AS VARCHAR) AS order_id, '{dataset}' AS order_source,
+                       NULL AS payment_ref, o.name AS order_ref,
+                       {customer_ref} AS customer_ref, upper(o.currency) AS currency,
+                       {_minor_units('o.total_price', 'o.currency')} AS amount_minor,
+                       CAST(o.created_at AS TIMESTAMP) AS occurred_at,
+                       {_changed_at(order_columns, "o", "CAST(o.created_at AS TIMESTAMP)")} AS changed_at
+                FROM {shopify_orders} o {customer_join}
+                WHERE o.financial_status IN ('paid', 'partially_refunded', 'refunded')
+            """)
+            sources[dataset] = shopify_orders
+            if "_dlt_load_id" in order_columns:
+                self._load_id_sources.add(dataset)
+        if not selects:
+            return {}
+
+        con.execute("CREATE OR REPLACE TEMP VIEW orders_src AS " + " UNION ALL ".join(selects))
+        return sources
+
+    # --- Persistent tables ----------------------------------------------------------
+    def _create_tables(self, con):
+        con.execute(f"CREATE SCHEMA IF NOT EXISTS {DATASET}")
+        con.execute(f"""
+            CREATE TABLE IF NOT EXISTS {DATASET}.{MATCHES_TABLE} (
+                charge_id VARCHAR PRIMARY KEY,
+                order_id VARCHAR NOT NULL,
+                order_source VARCHAR NOT NULL,
+                match_rule VARCHAR NOT NULL,
+                amount_diff_minor BIGINT,
+                time_diff_seconds DOUBLE,
+                charge_occurred_at TIMESTAMP,
+                order_occurred_at TIMESTAMP,
+                matched_at TIMESTAMP NOT NULL
+            )
+        """)
+        con.execute(f"""
+            CREATE TABLE IF NOT EXISTS {DATASET}.{EXCEPTIONS_TABLE} (
+                kind VARCHAR NOT NULL,          -- unmatched_charge | unmatched_order
+                ref VARCHAR NOT NULL,           -- charge_id / order_id
+                source VARCHAR,
+                customer_ref VARCHAR,
+                currency VARCHAR,
+                amount_minor BIGINT,
+                occurred_at TIMESTAMP,
+                first_seen_at TIMESTAMP NOT NULL,
+                last_checked_at TIMESTAMP NOT NULL,
+                resolved_at TIMESTAMP,
+                PRIMARY KEY (kind, ref)
+            )
+        """)
+        con.execute(f"""
+            CREATE TABLE IF NOT EXISTS {DATASET}.{PENDING_TABLE} (
+                kind VARCHAR NOT NULL,          -- unmatched_charge | unmatched_order
+                ref VARCHAR NOT NULL,
+                occurred_at TIMESTAMP,
+                first_seen_at TIMESTAMP NOT NULL,
+                PRIMARY KEY (kind, ref)
+            )
+        """)
+        con.execute(f"""
+            CREATE TABLE IF NOT EXISTS {DATASET}.{STATE_TABLE} (
+                source VARCHAR PRIMARY KEY,     -- stripe | store | <shopify dataset>
+                watermark TIMESTAMP NOT NULL,   -- newest changed_at read
+                updated_at TIMESTAMP NOT NULL
+            )
+        """)
+
+    def _watermark(self, con, source: str):
+        row = con.execute(f"SELECT watermark FROM {DATASET}.{STATE_TABLE} WHERE source = ?", [source]).fetchone()
+        return row[0] if row else None
+
+    # --- Run --------------------------------------------------------------------------
+    def _load_candidates(self, con, kind: str, src: str, key: str, source_column: str,
+                         watermarks: dict, retry_start: datetime):
+        """
+        Rows of one side to match this run: rows loaded or changed since their
+        source's watermark, plus rows earlier runs left unmatched (pending, or
+        open exceptions from the retry window). Rows already matched, and
+        exceptions older than the retry window, are left out.
+
+        Returns:
+            tuple: (candidate count, {source: newest changed_at read})
+        """
+        # A dlt load is committed at once, so rows of the watermark's load were all read;
+        # rows sharing an updated_at may have been committed after the last run
+        changed = " OR ".join(
+            f"({source_column} = '{source}'"
+            + (f" AND changed_at {'>' if source in self._load_id_sources else '>='} {_ts(watermark)})" if watermark else ")")
+            for source, watermark in watermarks.items()
+        )
+        table = "new_charges" if src == "charges_src" else "new_orders"
+        con.execute(f"""
+            CREATE OR REPLACE TEMP TABLE {table} AS
+            SELECT s.* FROM {src} s
+            ANTI JOIN (
+                SELECT ref FROM {DATASET}.{EXCEPTIONS_TABLE} WHERE kind = '{kind}'
+            ) e ON e.ref = s.{key} AND s.occurred_at <= {_ts(retry_start)}
+            WHERE {changed}
+            UNION
+            SELECT s.* FROM {src} s
+            SEMI JOIN (
+                SELECT ref FROM {DATASET}.{PENDING_TABLE} WHERE kind = '{kind}'
+                UNION ALL
+                SELECT ref FROM {DATASET}.{EXCEPTIONS_TABLE} WHERE kind = '{kind}' AND resolved_at IS NULL
+            ) r ON r.ref = s.{key}
+            WHERE s.occurred_at > {_ts(retry_start)}
+        """)
+        # Read before dropping matched rows, so rows that change after their match move the watermark too
+        newest = dict(con.execute(f"SELECT {source_column}, max(changed_at) FROM {table} GROUP BY 1").fetchall())
+        con.execute(f"DELETE FROM {table} WHERE {key} IN (SELECT {key} FROM {DATASET}.{MATCHES_TABLE})")
+        return con.execute(f"SELECT count(*) FROM {table}").fetchone()[0], newest
+
+    def _match(self, con) -> dict:
+        """Greedy one-to-one matching, pass by pass; each pair is the closest in time on both sides."""
+        con.execute("""
+            CREATE OR REPLACE TEMP TABLE run_matches (
+                charge_id VARCHAR, order_id VARCHAR, match_rule VARCHAR,
+                amount_diff_minor BIGINT, time_diff_seconds DOUBLE
+            )
+        """)
+        counts = {}
+        for rule, condition in MATCH_RULES:
+            condition = condition.format(time_diff=TIME_DIFF, tolerance=self.tolerance.total_seconds())
+            counts[rule] = 0
+            while True:
+                inserted = con.execute(f"""
+                    INSERT INTO run_matches
+                    SELECT charge_id, order_id, '{rule}', amount_diff_minor, time_diff_seconds
+                    FROM (
+                        SELECT c.charge_id, o.order_id,
+                               c.amount_minor - o.amount_minor AS amount_diff_minor,
+                               {TIME_DIFF} AS time_diff_seconds,
+                               row_number() OVER (PARTITION BY c.charge_id ORDER BY {TIME_DIFF}, o.order_id) AS charge_rank,
+                               row_number() OVER (PARTITION BY o.order_id ORDER BY {TIME_DIFF}, c.charge_id) AS order_rank
+                        FROM (SELECT * FROM new_charges ANTI JOIN run_matches USING (charge_id)) c
+                        JOIN (SELECT * FROM new_orders ANTI JOIN run_matches USING (order_id)) o
+                            ON {condition}
+                    )
+                    WHERE charge_rank = 1 AND order_rank = 1
+                """).fetchone()[0]
+                counts[rule] += inserted
+                # Mutual-best pairs only; repeat so runners-up get their next choice
+                if not inserted:
+                    break
+        return counts
+
+    def run(self) -> dict:
+        """Reconcile newly loaded rows; returns the run stats."""
+        now = datetime.now(timezone.utc).replace(tzinfo=None)
+        settled_before = now - self.tolerance
+        retry_start = now - timedelta(days=self.retry_days)
+
+        con = self._connect()
+        try:
+            sources = self._create_source_views(con)
+            if not sources:
+                self.stats = {"skipped": "no Stripe charges or order tables found"}
+                return self.stats
+            self._create_tables(con)
+
+            watermarks = {source: self._watermark(con, source) for source in sources}
+            new_charges, newest_charges = self._load_candidates(
+                con, "unmatched_charge", "charges_src", "charge_id", "source",
+                {"stripe": watermarks["stripe"]}, retry_start)
+            new_orders, newest_orders = self._load_candidates(
+                con, "unmatched_order", "orders_src", "order_id", "order_source",
+                {source: watermark for source, watermark in watermarks.items() if source != "stripe"}, retry_start)
+
+            matched = self._match(con)
+
+            con.execute("BEGIN TRANSACTION")
+            con.execute(f"""
+                INSERT INTO {DATASET}.{MATCHES_TABLE}
+                SELECT r.charge_id, r.order_id, o.order_source, r.match_rule, r.amount_diff_minor,
+                       r.time_diff_seconds, c.occurred_at, o.occurred_at, {_ts(now)}
+                FROM run_matches r
+                JOIN new_charges c USING (charge_id)
+                JOIN new_orders o USING (order_id)
+            """)
+            resolved = con.execute(f"""
+                UPDATE {DATASET}.{EXCEPTIONS_TABLE} e SET resolved_at = {_ts(now)}
+                WHERE e.resolved_at IS NULL AND (
+                    (e.kind = 'unmatched_charge' AND e.ref IN (SELECT charge_id FROM run_matches))
+                    OR (e.kind = 'unmatched_order' AND e.ref IN (SELECT order_id FROM run_matches))
+                )
+            """).fetchone()[0]
+
+            # Still unmatched once the tolerance has passed -> exception (or re-checked exception);
+            # still inside it -> pending, re-read next run
+            con.execute(f"""
+                DELETE FROM {DATASET}.{PENDING_TABLE}
+                WHERE (kind = 'unmatched_charge' AND ref IN (SELECT charge_id FROM run_matches))
+                   OR (kind = 'unmatched_order' AND ref IN (SELECT order_id FROM run_matches))
+            """)
+            new_exceptions = 0
+            for kind, table, key, source in (
+                ("unmatched_charge", "new_charges", "charge_id", "'stripe'"),
+                ("unmatched_order", "new_orders", "order_id", "order_source"),
+            ):
+                new_exceptions += con.execute(f"""
+                    SELECT count(*) FROM {table} s
+                    ANTI JOIN run_matches USING ({key})
+                    ANTI JOIN {DATASET}.{EXCEPTIONS_TABLE} e ON e.kind = '{kind}' AND e.ref = s.{key}
+                    WHERE s.occurred_at <= {_ts(settled_before)}
+                """).fetchone()[0]
+                con.execute(f"""
+                    INSERT INTO {DATASET}.{EXCEPTIONS_TABLE}
+                    SELECT '{kind}', s.{key}, {source}, s.customer_ref, s.currency, s.amount_minor,
+                           s.occurred_at, {_ts(now)}, {_ts(now)}, NULL
+                    FROM {table} s ANTI JOIN run_matches USING ({key})
+                    WHERE s.occurred_at <= {_ts(settled_before)}
+                    ON CONFLICT (kind, ref) DO UPDATE SET last_checked_at = excluded.last_checked_at
+                """)
+                con.execute(f"""
+                    DELETE FROM {DATASET}.{PENDING_TABLE}
+                    WHERE kind = '{kind}' AND ref IN (SELECT {key} FROM {table} WHERE occurred_at <= {_ts(settled_before)})
+                """)
+                con.execute(f"""
+                    INSERT INTO {DATASET}.{PENDING_TABLE}
+                    SELECT '{kind}', s.{key}, s.occurred_at, {_ts(now)}
+                    FROM {table} s ANTI JOIN run_matches USING ({key})
+                    WHERE s.occurred_at > {_ts(settled_before)}
+                    ON CONFLICT (kind, ref) DO NOTHING
+                """)
+
+            # Every row up to the newest changed_at read has been seen (updated_at ties are re-read next run)
+            for source, newest in {**newest_charges, **newest_orders}.items():
+                if newest is not None and (watermarks[source] is None or newest > watermarks[source]):
+                    con.execute(f"INSERT OR REPLACE INTO {DATASET}.{STATE_TABLE} VALUES (?, ?, ?)",
+                                [source, newest, now])
+            con.execute("COMMIT")
+
+            open_exceptions = dict(con.execute(f"""
+                SELECT kind, count(*) FROM {DATASET}.{EXCEPTIONS_TABLE} WHERE resolved_at IS NULL GROUP BY kind
+            """).fetchall())
+        finally:
+            con.close()
+
+        self.stats = {
+            "sources": list(sources.values()),
+            "new_charges": new_charges,
+            "new_orders": new_orders,
+            "matched": matched,
+            "new_exceptions": new_exceptions,
+            "resolved_exceptions": resolved,
+            "open_exceptions": open_exceptions,
+        }
+        return self.stats
+
+    def summary(self) -> str:
+        s = self.stats
+        if "skipped" in s:
+            return f"Reconciliation skipped: {s['skipped']}"
+        matched = ", ".join(f"{rule} {n}" for rule, n in s["matched"].items())
+        return (
+            f"{s['new_charges']} charges / {s['new_orders']} orders checked; matched {sum(s['matched'].values())} "
+            f"({matched}); {s['new_exceptions']} new exceptions, {s['resolved_exceptions']} resolved, "
+            f"{sum(s['open_exceptions'].values())} open"
+        )
+
+
+def run(db_path: str = DB_PATH, shopify_datasets: list = None) -> dict:
+    """Run the reconciliation stage with telemetry (default Shopify dataset: SHOPIFY_DATASET_NAME, then shopify)."""
+    reconciler = PaymentReconciler(db_path, shopify_datasets=shopify_datasets)
+    with RunTelemetry("reconciliation") as telemetry:
+        with telemetry.stage("reconcile"):
+            stats = reconciler.run()
+        telemetry.extra["reconciliation"] = stats
+
+    print(f"🔗 {reconciler.summary()}")
+    return stats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Reconcile Stripe charges against store / Shopify orders")
+    parser.add_argument("--db-path", default=DB_PATH)
+    parser.add_argument("--shopify-datasets", help="Comma separated Shopify datasets, e.g. shopify_shop_a,shopify_shop_b")
+    args = parser.parse_args()
+    run(args.db_path, args.shopify_datasets.split(",") if args.shopify_datasets else None)
@@ -1,17 +1,110 @@
+import argparse
 import dlt
 import os
-from sources.shopify_source import shopify_source
+from sources.shopify_source import PRODUCT_COLUMNS, PRODUCT_DBT_MODEL, PRODUCT_RULES, shopify_source
+from sources.shopify_query import ProductsQuery, product_fields_from_env
+from pipelines.change_detection import ChangeDetector
+from pipelines.validation import BatchValidator, build_contract
+from pipelines.telemetry import RunTelemetry
+from pipelines.profiling import profile_run
+from pipelines import execution_profiles
+
+DB_PATH = "../data.duckdb"
+DATASET_NAME = "shopify"
+TABLE_NAME = "products"
+
+def projection_dataset(dataset_name: str) -> str:
+    """Dataset a projected run (SHOPIFY_PRODUCT_FIELDS) loads into instead of the full one."""
+    return dataset_name if dataset_name.endswith("_projection") else f"{dataset_name}_projection"
+
+def resolve_dataset(dataset_name: str = None) -> str:
+    """
+    Dataset a run loads into: SHOPIFY_DATASET_NAME, then "shopify", and
+    "<dataset>_projection" for projected runs. Also the run's telemetry name.
+    """
+    dataset_name = dataset_name or os.getenv("SHOPIFY_DATASET_NAME", DATASET_NAME)
+    return projection_dataset(dataset_name) if product_fields_from_env() else dataset_name
+
+def run(profile: bool = False, execution_profile: str = None, shop_name: str = None, dataset_name: str = None):
+    """
+    Run the Shopify products pipeline.
+
+    Args:
+        profile: Profile this run (PIPELINE_PROFILE / PIPELINE_PROFILE_SAMPLE_RATE also enable it)
+        execution_profile: small | large | backfill | auto (default: PIPELINE_EXECUTION_PROFILE, then auto)
+        shop_name: Shop to extract (default: SHOPIFY_SHOP_NAME)
+        dataset_name: Dataset to load into (default: SHOPIFY_DATASET_NAME, then "shopify");
+            projected runs load into "<dataset>_projection"
+    """
+    with profile_run("shopify", enabled=profile):
+        return _run(execution_profile, shop_name, dataset_name)
+
+def _run(execution_profile: str = None, shop_name: str = None, dataset_name: str = None):
+    # Per-shop DAGs load each shop into its own dataset (and pipeline state).
+    # A projection only has some of the columns: merged into the full table it
+    # would NULL the rest, and its hashes would not match the full rows. It is
+    # loaded as a snapshot of its own, without change detection or tombstones
+    dataset_name = resolve_dataset(dataset_name)
+    fields = product_fields_from_env()
+
+    # Hash every valid row and only load the ones that changed (reads the
+    # stored hashes before the destination connection below is opened)
+    change_detector = None if fields else ChangeDetector(DB_PATH, dataset_name, TABLE_NAME)
+
+    # Worker counts, writer buffers and DuckDB threads / memory sized for this machine
+    settings = execution_profiles.apply_profile(execution_profiles.resolve_profile(execution_profile))
+    print(f"⚙️ {execution_profiles.describe(settings)}")
+    destination_con = execution_profiles.duckdb_connection(DB_PATH, settings)
 
-def run():
-    
     pipeline = dlt.pipeline(
-        pipeline_name="data",
-        destination=dlt.destinations.duckdb("../data.duckdb"),
-        dataset_name="shopify",
+        pipeline_name="data" if dataset_name == DATASET_NAME else f"data_{dataset_name}",
+        destination=dlt.destinations.duckdb(destination_con),
+        dataset_name=dataset_name,
     )
 
-    load_info = pipeline.run(shopify_source(), table_name="products")
+    # Check every extracted row against the contract of the selected columns
+    # (SHOPIFY_PRODUCT_FIELDS may project some away); failures are quarantined
+    plan = ProductsQuery(PRODUCT_COLUMNS, fields)
+    print(f"🔎 Products query: {plan.describe()}")
+    rules = [rule for rule in PRODUCT_RULES if rule[1].split(".")[0] in plan.columns]
+    validator = BatchValidator(TABLE_NAME, build_contract(plan.columns, PRODUCT_DBT_MODEL, rules))
+
+    # Named after the dataset, so per-shop runs do not overwrite each other's metrics
+    with RunTelemetry(dataset_name) as telemetry, destination_con:
+        telemetry.extra["execution_profile"] = settings
+        telemetry.extra["products_query"] = {"fields": list(plan.selection), "min_page_size": plan.min_page_size,
+                                             "max_page_size": plan.max_page_size}
+        with telemetry.stage("extract"):
+            pipeline.extract(shopify_source(change_detector, validator, shop_name=shop_name), table_name=TABLE_NAME)
+        # Quarantine does not depend on the load, so record it even if the load fails
+        validator.commit(DB_PATH, dataset_name)
+        with telemetry.stage("normalize"):
+            normalize_info = pipeline.normalize()
+        with telemetry.stage("load"):
+            load_info = pipeline.load()
+
+        telemetry.record_normalize_info(normalize_info)
+        telemetry.record_load_info(load_info)
+        telemetry.extra["validation"] = validator.stats
+        if change_detector is not None:
+            change_detector.commit()
+            telemetry.extra["change_detection"] = change_detector.stats
+
+    print(f"🧪 {validator.summary()}")
+    if change_detector is None:
+        print(f"✅ Shopify pipeline finished! (projection loaded into {dataset_name}.{TABLE_NAME})")
+        # The dbt sources read the full table, which a projection does not touch
+        return []
+    print(f"📊 {change_detector.summary()}")
     print("✅ Shopify pipeline finished!")
 
+    # Downstream steps (e.g. the dbt run) only need to react to changed tables
+    return [TABLE_NAME] if change_detector.has_changes else []
+
 if __name__ == "__main__":
-    run()
+    parser = argparse.ArgumentParser(description="Shopify products pipeline")
+    parser.add_argument("--profile", action="store_true", help="Write a CPU/allocation profile to logs/profiles")
+    parser.add_argument("--execution-profile", choices=["auto", *execution_profiles.PROFILES],
+                        help="Worker / buffer / DuckDB sizing (default: PIPELINE_EXECUTION_PROFILE or auto)")
+    args = parser.parse_args()
+    run(profile=args.profile, execution_profile=args.execution_profile)
@@ -1,16 +1,54 @@
+import argparse
 import dlt
 from sources.stripe_source import stripe_source
+from pipelines.telemetry import RunTelemetry
+from pipelines.profiling import profile_run
+from pipelines import execution_profiles
+
+def run(profile: bool = False, execution_profile: str = None):
+    """
+    Run the Stripe pipeline.
+
+    Args:
+        profile: Profile this run (PIPELINE_PROFILE / PIPELINE_PROFILE_SAMPLE_RATE also enable it)
+        execution_profile: small | large | backfill | auto (default: PIPELINE_EXECUTION_PROFILE, then auto)
+    """
+    with profile_run("stripe", enabled=profile):
+        _run(execution_profile)
+
+def _run(execution_profile: str = None):
+    # Only the dlt worker / writer settings apply; the destination is Postgres
+    settings = execution_profiles.apply_profile(execution_profiles.resolve_profile(execution_profile))
+    for key in ("duckdb_threads", "duckdb_memory_limit"):
+        settings.pop(key)
+    print(f"⚙️ {settings['profile']} profile: extract={settings['extract_workers']} "
+          f"normalize={settings['normalize_workers']} load={settings['load_workers']}")
 
-def run():
     pipeline = dlt.pipeline(
         pipeline_name="stripe_pipeline",
         destination="postgres",
         dataset_name="stripe_data"
     )
 
-    load_info = pipeline.run(stripe_source())
+    with RunTelemetry("stripe") as telemetry:
+        telemetry.extra["execution_profile"] = settings
+        with telemetry.stage("extract"):
+            pipeline.extract(stripe_source())
+        with telemetry.stage("normalize"):
+            normalize_info = pipeline.normalize()
+        with telemetry.stage("load"):
+            load_info = pipeline.load()
+
+        telemetry.record_normalize_info(normalize_info)
+        telemetry.record_load_info(load_info)
+
     print("✅ Stripe pipeline finished!")
     print(load_info)
 
 if __name__ == "__main__":
-    run()
+    parser = argparse.ArgumentParser(description="Stripe pipeline")
+    parser.add_argument("--profile", action="store_true", help="Write a CPU/allocation profile to logs/profiles")
+    parser.add_argument("--execution-profile", choices=["auto", *execution_profiles.PROFILES],
+                        help="Worker / buffer / DuckDB sizing (default: PIPELINE_EXECUTION_PROFILE or auto)")
+    args = parser.parse_args()
+    run(profile=args.profile, execution_profile=args.execution_profile)
@@ -0,0 +1,226 @@
+"""
+Structured per-run telemetry for the dlt pipelines.
+
+A run records extract / normalize / load timings, rows and bytes per table,
+HTTP request counts and latency histograms, Shopify throttle waits and peak
+RSS. When the run finishes it is appended as one JSON line to ``runs.jsonl``
+and written as an OpenMetrics text file that the Airflow task can push to a
+Pushgateway (or that a node_exporter textfile collector can pick up).
+
+Sources report HTTP activity through ``active()``, which returns the telemetry
+of the run in progress (or a no-op recorder outside of a run).
+"""
+
+import json
+import os
+import resource
+import sys
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+
+import requests
+
+from pipelines import profiling
+
+DEFAULT_OUTPUT_DIR = Path(__file__).resolve().parents[2] / "logs" / "telemetry"
+
+# Upper bounds (seconds) of the HTTP latency histogram buckets
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, float("inf"))
+
+
+def _peak_rss_bytes() -> int:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+class _NullTelemetry:
+    """Recorder used when no run is active; every call is a no-op."""
+
+    def record_request(self, *args, **kwargs):
+        pass
+
+    def record_throttle_wait(self, *args, **kwargs):
+        pass
+
+
+_NULL = _NullTelemetry()
+_active = None
+
+
+def active():
+    """Telemetry of the run in progress, or a no-op recorder."""
+    return _active or _NULL
+
+
+class RunTelemetry:
+    """
+    Collects metrics for one pipeline run.
+
+    Usage:
+        with RunTelemetry("shopify") as telemetry:
+            with telemetry.stage("extract"):
+                pipeline.extract(...)
+            ...
+            telemetry.record_load_info(load_info)
+    """
+
+    def __init__(self, pipeline_name: str, output_dir: str = None):
+        self.pipeline_name = pipeline_name
+        self.output_dir = Path(output_dir or os.getenv("PIPELINE_TELEMETRY_DIR", DEFAULT_OUTPUT_DIR))
+        self.run_id = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+        self.status = "running"
+
+        self.stages = {}
+        self.tables = {}
+        self.extra = {}
+        self.http = {
+            "requests": 0,
+            "errors": 0,
+            "latency_sum": 0.0,
+            "latency_buckets": [0] * len(LATENCY_BUCKETS),
+        }
+        self.throttle = {"waits": 0, "wait_seconds": 0.0}
+        self._started = None
+
+    # --- Context management -----------------------------------------------
+    def __enter__(self):
+        global _active
+        _active = self
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        global _active
+        _active = None
+        self.status = "failed" if exc_type else "success"
+        self.stages.setdefault("total", time.perf_counter() - self._started)
+        self.emit()
+        return False
+
+    @contextmanager
+    def stage(self, name: str):
+        """Time one pipeline stage (extract, normalize, load, ...); also a profiling span."""
+        started = time.perf_counter()
+        try:
+            with profiling.span(name):
+                yield
+        finally:
+            self.stages[name] = time.perf_counter() - started
+
+    # --- Recording ----------------------------------------------------------
+    def record_request(self, duration: float, ok: bool = True):
+        self.http["requests"] += 1
+        self.http["latency_sum"] += duration
+        if not ok:
+            self.http["errors"] += 1
+        for i, bound in enumerate(LATENCY_BUCKETS):
+            if duration <= bound:
+                self.http["latency_buckets"][i] += 1
+                break
+
+    def record_throttle_wait(self, seconds: float):
+        self.throttle["waits"] += 1
+        self.throttle["wait_seconds"] += seconds
+
+    def record_normalize_info(self, normalize_info):
+        """Rows per table from dlt's NormalizeInfo."""
+        for table, rows in (normalize_info.row_counts or {}).items():
+            if table.startswith("_dlt"):
+                continue
+            self.tables.setdefault(table, {"rows": 0, "bytes": 0})["rows"] += rows
+
+    def record_load_info(self, load_info):
+        """Bytes per table from the completed load jobs in dlt's LoadInfo."""
+        for package in load_info.load_packages:
+            for job in package.jobs.get("completed_jobs", []):
+                table = job.job_file_info.table_name
+                if table.startswith("_dlt"):
+                    continue
+                self.tables.setdefault(table, {"rows": 0, "bytes": 0})["bytes"] += job.file_size
+
+    # --- Output -------------------------------------------------------------
+    def to_dict(self) -> dict:
+        return {
+            "pipeline": self.pipeline_name,
+            "run_id": self.run_id,
+            "status": self.status,
+            "stage_seconds": self.stages,
+            "tables": self.tables,
+            "http": {
+                **self.http,
+                "latency_bucket_bounds": [str(b) for b in LATENCY_BUCKETS],
+            },
+            "throttle": self.throttle,
+            "peak_rss_bytes": _peak_rss_bytes(),
+            **self.extra,
+        }
+
+    def to_openmetrics(self) -> str:
+        p = self.pipeline_name
+        lines = []
+
+        def metric(name, kind, help_text, samples):
+            lines.append(f"# TYPE {name} {kind}")
+            lines.append(f"# HELP {name} {help_text}")
+            for suffix, labels, value in samples:
+                label_str = ",".join(f'{k}="{v}"' for k, v in {"pipeline": p, **labels}.items())
+                lines.append(f"{name}{suffix}{{{label_str}}} {value}")
+
+        metric("pipeline_stage_seconds", "gauge", "Duration of each pipeline stage",
+               [("", {"stage": s}, round(v, 6)) for s, v in self.stages.items()])
+        metric("pipeline_table_rows", "gauge", "Rows loaded per table",
+               [("", {"table": t}, v["rows"]) for t, v in self.tables.items()])
+        metric("pipeline_table_bytes", "gauge", "Bytes of load files per table",
+               [("", {"table": t}, v["bytes"]) for t, v in self.tables.items()])
+
+        cumulative, buckets = 0, []
+        for bound, count in zip(LATENCY_BUCKETS, self.http["latency_buckets"]):
+            cumulative += count
+            buckets.append(("_bucket", {"le": "+Inf" if bound == float("inf") else bound}, cumulative))
+        metric("pipeline_http_request_seconds", "histogram", "Latency of source API requests",
+               buckets + [("_count", {}, self.http["requests"]),
+                          ("_sum", {}, round(self.http["latency_sum"], 6))])
+        metric("pipeline_http_errors", "gauge", "Failed source API requests",
+               [("", {}, self.http["errors"])])
+        metric("pipeline_throttle_wait_seconds", "gauge", "Time spent waiting on API throttling",
+               [("", {}, round(self.throttle["wait_seconds"], 6))])
+        metric("pipeline_peak_rss_bytes", "gauge", "Peak resident set size of the run",
+               [("", {}, _peak_rss_bytes())])
+        metric("pipeline_success", "gauge", "1 if the last run succeeded",
+               [("", {}, int(self.status == "success"))])
+
+        lines.append("# EOF")
+        return "\n".join(lines) + "\n"
+
+    def emit(self):
+        """Append the run to runs.jsonl and write <pipeline>.prom."""
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        with open(self.output_dir / "runs.jsonl", "a") as f:
+            f.write(json.dumps(self.to_dict(), default=str) + "\n")
+        (self.output_dir / f"{self.pipeline_name}.prom").write_text(self.to_openmetrics())
+        print(f"📈 Telemetry written to {self.output_dir}")
+
+
+def push_metrics(pipeline_name: str, gateway_url: str = None, output_dir: str = None):
+    """
+    Push the last run's OpenMetrics file to a Prometheus Pushgateway.
+
+    Args:
+        pipeline_name: Name used when the run was recorded
+        gateway_url: Pushgateway base URL (defaults to PROMETHEUS_PUSHGATEWAY_URL)
+        output_dir: Telemetry directory (defaults to PIPELINE_TELEMETRY_DIR)
+    """
+    gateway_url = gateway_url or os.getenv("PROMETHEUS_PUSHGATEWAY_URL")
+    if not gateway_url:
+        return
+    output_dir = Path(output_dir or os.getenv("PIPELINE_TELEMETRY_DIR", DEFAULT_OUTPUT_DIR))
+    body = (output_dir / f"{pipeline_name}.prom").read_bytes()
+    response = requests.put(
+        f"{gateway_url.rstrip('/')}/metrics/job/dlt_pipeline/pipeline/{pipeline_name}",
+        data=body,
+        headers={"Content-Type": "text/plain; version=0.0.4"},
+    )
+    response.raise_for_status()
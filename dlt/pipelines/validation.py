@@ -0,0 +1,271 @@
+"""
+In-process validation of extracted rows before they are loaded.
+
+Checks come from two places that already describe the data:
+- the column hints declared on the dlt resource (``nullable: False`` ->
+  not_null, ``data_type: timestamp`` -> parseable timestamp)
+- the dbt tests declared for the matching model in
+  ``data/models/staging/shopify/base/shopify_base.yml`` (unique, not_null,
+  accepted_values), matched by the snake_case name dlt gives each column
+
+plus value rules declared next to the resource (e.g. non-negative prices).
+
+Rows are checked in Arrow batches with vectorized DuckDB / pyarrow compute
+expressions. Rows that fail any check are kept out of the load and written,
+with the failed checks, to ``<dataset>._quarantine`` instead of aborting the
+run; dbt tests no longer find bad batches hours after the load.
+"""
+
+import json
+import re
+from collections import Counter, namedtuple
+from datetime import datetime, timezone
+from pathlib import Path
+
+import duckdb
+import pyarrow as pa
+import pyarrow.compute as pc
+import yaml
+
+from pipelines.change_detection import DELETED_FLAG
+
+QUARANTINE_TABLE = "_quarantine"
+DBT_SCHEMA_PATH = Path(__file__).resolve().parents[2] / "data" / "models" / "staging" / "shopify" / "base" / "shopify_base.yml"
+DEFAULT_BATCH_SIZE = 1000
+
+# kind: not_null | unique | timestamp | accepted_values | non_negative
+# column: row key, or a dotted path into nested values (lists are flattened)
+Check = namedtuple("Check", ["kind", "column", "values"], defaults=[None])
+
+
+def _snake_case(name: str) -> str:
+    """camelCase -> snake_case, as dlt's default naming convention does."""
+    return re.sub(r"(?<=[a-z0-9])([A-Z])", r"_\1", name).lower()
+
+
+def dbt_column_tests(model: str, schema_path: Path = DBT_SCHEMA_PATH) -> dict:
+    """{column: [tests]} declared for a model in a dbt schema file."""
+    with open(schema_path) as f:
+        schema = yaml.safe_load(f) or {}
+    for m in schema.get("models", []):
+        if m.get("name") == model:
+            return {c["name"]: c.get("tests") or c.get("data_tests") or [] for c in m.get("columns", [])}
+    return {}
+
+
+def build_contract(columns: dict, dbt_model: str = None, rules: list = None,
+                   schema_path: Path = DBT_SCHEMA_PATH) -> list:
+    """
+    Checks for a resource from its column hints, its dbt model tests and extra rules.
+
+    Args:
+        columns: The ``columns`` hints of the dlt resource
+        dbt_model: dbt model whose column tests apply (e.g. "shopify_products_base")
+        rules: Extra (kind, column[, values]) rules, e.g. [("non_negative", "variants.edges.node.price")]
+
+    Returns:
+        list: Check tuples
+    """
+    checks = []
+    for name, hints in columns.items():
+        if name == DELETED_FLAG:
+            continue
+        if hints.get("nullable") is False:
+            checks.append(Check("not_null", name))
+        if hints.get("data_type") == "timestamp":
+            checks.append(Check("timestamp", name))
+
+    if dbt_model:
+        by_snake_name = {_snake_case(name): name for name in columns if name != DELETED_FLAG}
+        for dbt_column, tests in dbt_column_tests(dbt_model, schema_path).items():
+            column = by_snake_name.get(dbt_column)
+            if column is None:
+                continue
+            for test in tests:
+                if test == "unique":
+                    checks.append(Check("unique", column))
+                elif test == "not_null":
+                    checks.append(Check("not_null", column))
+                elif isinstance(test, dict) and "accepted_values" in test:
+                    checks.append(Check("accepted_values", column, tuple(test["accepted_values"]["values"])))
+
+    for kind, column, *values in rules or []:
+        checks.append(Check(kind, column, tuple(values[0]) if values else None))
+
+    # The resource hints and the dbt tests often declare the same thing
+    return list(dict.fromkeys(checks))
+
+
+def _extract(row: dict, path: str):
+    """Value at a dotted path; lists along the way are flattened into a list of values."""
+    values, is_list = [row], False
+    for key in path.split("."):
+        next_values = []
+        for value in values:
+            if isinstance(value, list):
+                is_list = True
+                next_values.extend(v.get(key) for v in value if isinstance(v, dict))
+            elif isinstance(value, dict):
+                next_values.append(value.get(key))
+        values = next_values
+        if values and isinstance(values[0], list):
+            values, is_list = [v for sub in values for v in (sub or [])], True
+    if not is_list:
+        return values[0] if values else None
+    return [v for v in values if v is not None]
+
+
+def _as_text(value):
+    if value is None:
+        return None
+    return value.isoformat() if hasattr(value, "isoformat") else str(value)
+
+
+def _quote(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+
+class BatchValidator:
+    """
+    Streams rows through the contract in Arrow batches.
+
+    Usage:
+        validator = BatchValidator("products", build_contract(PRODUCT_COLUMNS, "shopify_products_base"))
+        yield from validator.validate(rows)     # valid rows only
+        ... load ...
+        validator.commit(db_path, dataset)      # write quarantined rows
+    """
+
+    def __init__(self, table: str, checks: list, primary_key: str = "id", batch_size: int = DEFAULT_BATCH_SIZE):
+        self.table = table
+        self.checks = checks
+        self.primary_key = primary_key
+        self.batch_size = batch_size
+        self.stats = {"checked": 0, "passed": 0, "quarantined": 0, "failures": Counter()}
+        self.quarantined = []  # (row_id, failures, row)
+        self._seen = {c.column: set() for c in checks if c.kind == "unique"}
+        self._con = duckdb.connect()
+        self._sql = self._build_sql()
+
+    def _build_sql(self) -> str:
+        conditions = []
+        for check in self.checks:
+            col = _quote(check.column)
+            label = f"{check.kind}:{check.column}".replace("'", "''")
+            if check.kind == "not_null":
+                condition = f"{col} IS NULL"
+            elif check.kind == "timestamp":
+                condition = f"{col} IS NOT NULL AND TRY_CAST({col} AS TIMESTAMPTZ) IS NULL"
+            elif check.kind == "accepted_values":
+                values = ", ".join("'" + str(v).replace("'", "''") + "'" for v in check.values)
+                condition = f"{col} IS NOT NULL AND {col} NOT IN ({values})"
+            elif check.kind == "unique":
+                # Duplicates within the batch, or of a key seen in an earlier batch
+                condition = f"__dup_rank_{len(conditions)} > 1 OR {_quote('__seen:' + check.column)}"
+            elif check.kind == "non_negative":
+                condition = f"len(list_filter({col}, x -> coalesce(TRY_CAST(x AS DOUBLE) < 0, true))) > 0"
+            else:
+                raise ValueError(f"Unknown check kind '{check.kind}'")
+            conditions.append((check, f"CASE WHEN {condition} THEN '{label}' END"))
+
+        windows = [
+            f"row_number() OVER (PARTITION BY {_quote(check.column)} ORDER BY __row) AS __dup_rank_{i}"
+            for i, (check, _) in enumerate(conditions) if check.kind == "unique"
+        ]
+        failures = ", ".join(expr for _, expr in conditions) or "NULL"
+        source = f"(SELECT *, {', '.join(windows)} FROM batch)" if windows else "batch"
+        return f"SELECT list_filter([{failures}], x -> x IS NOT NULL) AS failures FROM {source} ORDER BY __row"
+
+    def _to_arrow(self, rows: list) -> pa.Table:
+        arrays = {"__row": pa.array(range(len(rows)), pa.int64())}
+        for column in dict.fromkeys(c.column for c in self.checks):
+            values = [_extract(row, column) for row in rows]
+            if any(isinstance(v, list) for v in values):
+                arrays[column] = pa.array([[_as_text(x) for x in v] if isinstance(v, list) else [] for v in values],
+                                          pa.list_(pa.string()))
+            else:
+                arrays[column] = pa.array([_as_text(v) for v in values], pa.string())
+        for column, seen in self._seen.items():
+            arrays[f"__seen:{column}"] = pc.fill_null(
+                pc.is_in(arrays[column], value_set=pa.array(list(seen), pa.string())), False
+            )
+        return pa.table(arrays)
+
+    def _check_batch(self, rows: list) -> list:
+        """Failed check labels for each row of the batch."""
+        batch = self._to_arrow(rows)
+        self._con.register("batch", batch)
+        try:
+            failures = self._con.execute(self._sql).to_arrow_table().column("failures").to_pylist()
+        finally:
+            self._con.unregister("batch")
+
+        for column, seen in self._seen.items():
+            seen.update(v for v in batch.column(column).to_pylist() if v is not None)
+        return failures
+
+    def validate(self, rows, batch_size: int = None):
+        """Yield the rows that pass every check; failing rows are held for quarantine."""
+        batch_size = batch_size or self.batch_size
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= batch_size:
+                yield from self._split(batch)
+                batch = []
+        if batch:
+            yield from self._split(batch)
+
+    def _split(self, batch: list):
+        for row, failures in zip(batch, self._check_batch(batch)):
+            self.stats["checked"] += 1
+            if failures:
+                self.stats["quarantined"] += 1
+                self.stats["failures"].update(failures)
+                self.quarantined.append((row.get(self.primary_key), failures, row))
+            else:
+                self.stats["passed"] += 1
+                yield row
+
+    @property
+    def quarantined_ids(self) -> set:
+        return {row_id for row_id, _, _ in self.quarantined if row_id is not None}
+
+    def commit(self, db_path: str, dataset: str):
+        """Append this run's quarantined rows to ``<dataset>._quarantine``."""
+        if not self.quarantined:
+            return
+
+        con = duckdb.connect(db_path)
+        try:
+            con.execute(f"CREATE SCHEMA IF NOT EXISTS {dataset}")
+            con.execute(
+                f"""
+                CREATE TABLE IF NOT EXISTS {dataset}.{QUARANTINE_TABLE} (
+                    table_name VARCHAR NOT NULL,
+                    row_id VARCHAR,
+                    failures VARCHAR[] NOT NULL,
+                    payload JSON,
+                    quarantined_at TIMESTAMP WITH TIME ZONE NOT NULL
+                )
+                """
+            )
+            now = datetime.now(timezone.utc)
+            con.executemany(
+                f"INSERT INTO {dataset}.{QUARANTINE_TABLE} VALUES (?, ?, ?, ?, ?)",
+                [
+                    (self.table, None if row_id is None else str(row_id), failures,
+                     json.dumps(row, default=str), now)
+                    for row_id, failures, row in self.quarantined
+                ],
+            )
+        finally:
+            con.close()
+
+    def summary(self) -> str:
+        s = self.stats
+        top = ", ".join(f"{label} x{n}" for label, n in s["failures"].most_common(5))
+        return (
+            f"{self.table}: {s['passed']} passed, {s['quarantined']} quarantined"
+            + (f" ({top})" if top else "")
+        )
@@ -0,0 +1,751 @@
+"""
+Near-real-time Shopify ingestion from webhooks.
+
+The receiver verifies each webhook's HMAC, appends the event to a durable
+local log (fsynced before Shopify gets its 200) and flushes micro-batches to
+its own staging DuckDB file (webhooks.duckdb) every WEBHOOK_FLUSH_SECONDS or
+WEBHOOK_FLUSH_EVENTS events. The log offset only advances once a batch is
+staged, and staging ignores seqs it already has, so events survive restarts,
+failed flushes and a crash between the two.
+
+Every WEBHOOK_MERGE_SECONDS the receiver folds the staged events into
+data.duckdb (``merge_staged``) through the same dlt merge resources,
+validation and row hashes as the polling pipeline (sources/shopify_webhooks.py).
+Rows older than the loaded version, by ``updated_at``, are skipped. While a
+dlt, dbt or maintenance run holds the data.duckdb write lock the merge fails
+fast, the events stay staged and the next tick retries. The tables a merge
+changed are recorded in staging for the DAG's dbt run.
+
+Endpoints:
+    POST /webhooks/shopify   Shopify webhook target (products/*, orders/*, refunds/create)
+    GET  /metrics            OpenMetrics: received/flushed/merged counts, pending, lag
+    GET  /health             same numbers as JSON
+
+Run from the dlt directory:
+    python -m pipelines.webhook_receiver serve --port 8788
+    python -m pipelines.webhook_receiver replay samples/webhooks/*.json
+    python -m pipelines.webhook_receiver merge
+
+The daily polling pipeline still runs and reconciles anything a webhook missed.
+"""
+
+import argparse
+import base64
+import hashlib
+import hmac
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import Counter, deque
+from datetime import datetime, timezone
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import duckdb
+import requests
+
+DEFAULT_LOG_PATH = Path(__file__).resolve().parents[2] / "logs" / "webhooks" / "events.jsonl"
+DEFAULT_STAGING_PATH = Path(__file__).resolve().parents[2] / "webhooks.duckdb"
+STAGING_TABLE = "webhook_events"
+CHANGES_TABLE = "webhook_changes"
+LOCK_TIMEOUT_SECONDS = float(os.getenv("WEBHOOK_LOCK_TIMEOUT_SECONDS", "60"))
+FLUSH_SECONDS = float(os.getenv("WEBHOOK_FLUSH_SECONDS", "5"))
+FLUSH_EVENTS = int(os.getenv("WEBHOOK_FLUSH_EVENTS", "500"))
+MERGE_SECONDS = float(os.getenv("WEBHOOK_MERGE_SECONDS", "60"))  # 0 leaves merging to the merge command
+MAX_LOG_BYTES = 64 * 1024 * 1024  # truncate the log once fully flushed and larger than this
+DEDUP_WINDOW = 10_000  # recent webhook ids remembered to drop Shopify's retries
+
+
+def sign(body: bytes, secret: str) -> str:
+    """Shopify's X-Shopify-Hmac-Sha256 value for a request body."""
+    digest = hmac.new(secret.encode("utf-8"), body, hashlib.sha256).digest()
+    return base64.b64encode(digest).decode("ascii")
+
+
+def verify_hmac(body: bytes, header_value: str, secret: str) -> bool:
+    if not secret or not header_value:
+        return False
+    return hmac.compare_digest(sign(body, secret), header_value)
+
+
+def _lag_by_topic(events: list) -> dict:
+    """{topic: max seconds from Shopify's trigger (else our receipt) until now}."""
+    now = datetime.now(timezone.utc)
+    lag = {}
+    for event in events:
+        sent = event.get("triggered_at") or event["received_at"]
+        try:
+            seconds = (now - datetime.fromisoformat(sent.replace("Z", "+00:00"))).total_seconds()
+        except ValueError:
+            continue
+        lag[event["topic"]] = max(lag.get(event["topic"], 0.0), seconds)
+    return lag
+
+
+def _is_lock_error(error: BaseException) -> bool:
+    """True if another process holds the DuckDB file (dlt wraps the IOException)."""
+    while error is not None:
+        if isinstance(error, duckdb.IOException):
+            return True
+        error = error.__cause__ or error.__context__
+    return False
+
+
+class EventLog:
+    """
+    Append-only JSONL event log with a flushed-offset file.
+
+    Every line is {"seq", "webhook_id", "topic", "triggered_at", "received_at", "payload"}.
+    ``<log>.offset`` holds the last seq staged.
+    """
+
+    def __init__(self, path: str = None, fsync: bool = True):
+        self.path = Path(path or os.getenv("WEBHOOK_LOG_PATH", DEFAULT_LOG_PATH))
+        self.offset_path = self.path.with_suffix(".offset")
+        self.fsync = fsync
+        self.lock = threading.Lock()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+
+        self.flushed_seq = int(self.offset_path.read_text().strip() or 0) if self.offset_path.exists() else 0
+        self.last_seq = self.flushed_seq
+        self.pending = []
+        self.recent_ids = deque(maxlen=DEDUP_WINDOW)
+
+        # Recover events logged but not yet staged before the last shutdown
+        if self.path.exists():
+            with open(self.path) as f:
+                for line in f:
+                    try:
+                        event = json.loads(line)
+                    except ValueError:
+                        continue  # torn write from a crash mid-append
+                    self.last_seq = max(self.last_seq, event["seq"])
+                    self.recent_ids.append(event.get("webhook_id"))
+                    if event["seq"] > self.flushed_seq:
+                        self.pending.append(event)
+        self._file = open(self.path, "a")
+
+    def append(self, topic: str, payload: dict, webhook_id: str = None, triggered_at: str = None):
+        """Durably append an event; returns None if the webhook id was already logged."""
+        with self.lock:
+            if webhook_id and webhook_id in self.recent_ids:
+                return None
+            self.last_seq += 1
+            event = {
+                "seq": self.last_seq,
+                "webhook_id": webhook_id,
+                "topic": topic,
+                "triggered_at": triggered_at,
+                "received_at": datetime.now(timezone.utc).isoformat(),
+                "payload": payload,
+            }
+            self._file.write(json.dumps(event, separators=(",", ":")) + "\n")
+            self._file.flush()
+            if self.fsync:
+                os.fsync(self._file.fileno())
+            self.recent_ids.append(webhook_id)
+            self.pending.append(event)
+            return event
+
+    def take(self, limit: int = None) -> list:
+        """Oldest pending events (not removed until ``commit``)."""
+        with self.lock:
+            return list(self.pending[:limit])
+
+    def commit(self, seq: int):
+        """Mark everything up to ``seq`` as staged."""
+        with self.lock:
+            tmp = self.offset_path.with_suffix(".offset.tmp")
+            tmp.write_text(str(seq))
+            os.replace(tmp, self.offset_path)
+            self.flushed_seq = seq
+            self.pending = [e for e in self.pending if e["seq"] > seq]
+
+            # Nothing left to recover from the log -> start it over once it gets big
+            if not self.pending and self.path.stat().st_size > MAX_LOG_BYTES:
+                self._file.close()
+                self._file = open(self.path, "w")
+
+    def close(self):
+        self._file.close()
+
+
+class StagingStore:
+    """
+    Flushed webhook events waiting for ``merge_staged``, in their own DuckDB file,
+    and the tables merges changed since the DAG's last dbt run.
+
+    The receiver, the merge command and the DAG each hold the file for a few
+    milliseconds and retry while another process has it open (up to
+    WEBHOOK_LOCK_TIMEOUT_SECONDS).
+    """
+
+    def __init__(self, path: str = None, lock_timeout: float = LOCK_TIMEOUT_SECONDS):
+        self.path = Path(path or os.getenv("WEBHOOK_STAGING_DB_PATH", DEFAULT_STAGING_PATH))
+        self.lock_timeout = lock_timeout
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+
+    def _connect(self) -> duckdb.DuckDBPyConnection:
+        deadline = time.monotonic() + self.lock_timeout
+        while True:
+            try:
+                con = duckdb.connect(str(self.path))
+                break
+            except duckdb.IOException:
+                # The other process has the file open right now
+                if time.monotonic() >= deadline:
+                    raise
+                time.sleep(0.1)
+        con.execute(
+            f"""
+            CREATE TABLE IF NOT EXISTS {STAGING_TABLE} (
+                seq BIGINT PRIMARY KEY,
+                webhook_id VARCHAR,
+                topic VARCHAR NOT NULL,
+                triggered_at VARCHAR,
+                received_at VARCHAR NOT NULL,
+                payload JSON NOT NULL
+            )
+            """
+        )
+        con.execute(f"CREATE TABLE IF NOT EXISTS {CHANGES_TABLE} (table_name VARCHAR PRIMARY KEY, merged_at VARCHAR)")
+        return con
+
+    def stage(self, events: list):
+        """Add events; seqs that are already staged are ignored."""
+        con = self._connect()
+        try:
+            con.executemany(
+                f"INSERT OR IGNORE INTO {STAGING_TABLE} VALUES (?, ?, ?, ?, ?, ?)",
+                [
+                    (e["seq"], e.get("webhook_id"), e["topic"], e.get("triggered_at"), e["received_at"],
+                     json.dumps(e["payload"]))
+                    for e in events
+                ],
+            )
+        finally:
+            con.close()
+
+    def events(self) -> list:
+        """Staged events in seq order, shaped like event log entries."""
+        con = self._connect()
+        try:
+            rows = con.execute(
+                f"SELECT seq, webhook_id, topic, triggered_at, received_at, payload FROM {STAGING_TABLE} ORDER BY seq"
+            ).fetchall()
+        finally:
+            con.close()
+        return [
+            {"seq": seq, "webhook_id": webhook_id, "topic": topic, "triggered_at": triggered_at,
+             "received_at": received_at, "payload": json.loads(payload)}
+            for seq, webhook_id, topic, triggered_at, received_at, payload in rows
+        ]
+
+    def last_seq(self) -> int:
+        con = self._connect()
+        try:
+            return con.execute(f"SELECT COALESCE(MAX(seq), 0) FROM {STAGING_TABLE}").fetchone()[0]
+        finally:
+            con.close()
+
+    def oldest_received_at(self):
+        """received_at of the oldest event not merged yet (None if staging is empty)."""
+        con = self._connect()
+        try:
+            row = con.execute(f"SELECT received_at FROM {STAGING_TABLE} ORDER BY seq LIMIT 1").fetchone()
+        finally:
+            con.close()
+        return row[0] if row else None
+
+    def discard(self, seq: int, changed_tables: list = ()):
+        """Remove everything up to ``seq`` once it is merged, and record the tables the merge changed."""
+        con = self._connect()
+        try:
+            con.execute("BEGIN TRANSACTION")
+            con.execute(f"DELETE FROM {STAGING_TABLE} WHERE seq <= ?", [seq])
+            merged_at = datetime.now(timezone.utc).isoformat()
+            for table in changed_tables:
+                con.execute(f"INSERT OR REPLACE INTO {CHANGES_TABLE} VALUES (?, ?)", [table, merged_at])
+            con.execute("COMMIT")
+        finally:
+            con.close()
+
+    def take_changes(self) -> list:
+        """Tables merges changed since the last call (for the dbt run), oldest first."""
+        con = self._connect()
+        try:
+            con.execute("BEGIN TRANSACTION")
+            tables = [row[0] for row in con.execute(
+                f"SELECT table_name FROM {CHANGES_TABLE} ORDER BY merged_at, table_name"
+            ).fetchall()]
+            con.execute(f"DELETE FROM {CHANGES_TABLE}")
+            con.execute("COMMIT")
+        finally:
+            con.close()
+        return tables
+
+
+class WebhookReceiver:
+    """Event log + micro-batch flusher to the staging file + merge loop into data.duckdb + lag metrics."""
+
+    def __init__(self, secret: str, log: EventLog, flush_seconds: float = FLUSH_SECONDS,
+                 flush_events: int = FLUSH_EVENTS, staging: StagingStore = None,
+                 merge_seconds: float = 0, db_path: str = None, dataset_name: str = None):
+        self.secret = secret
+        self.log = log
+        self.flush_seconds = flush_seconds
+        self.flush_events = flush_events
+        self.staging = staging or StagingStore()
+        self.merge_seconds = merge_seconds
+        self.db_path = db_path
+        self.dataset_name = dataset_name
+
+        # A fresh event log must not reuse the seqs of events still waiting to be merged
+        self.log.last_seq = max(self.log.last_seq, self.staging.last_seq())
+
+        self.metrics = {
+            "received": Counter(),
+            "flushed": Counter(),
+            "duplicates": 0,
+            "ignored": 0,
+            "hmac_failures": 0,
+            "flushes": 0,
+            "flush_failures": 0,
+            "last_flush_seconds": 0.0,
+            "last_flush_timestamp": 0.0,
+            "staged_lag_seconds": {},  # topic -> max (staged - triggered) of the last batch
+            "merged": Counter(),
+            "merges": 0,
+            "merge_lock_waits": 0,
+            "merge_failures": 0,
+            "last_merge_timestamp": 0.0,
+            "lag_seconds": {},  # topic -> max (merged - triggered) of the last merge
+        }
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self._merge_thread = None
+
+    # --- Receiving ----------------------------------------------------------
+    def receive(self, body: bytes, headers) -> HTTPStatus:
+        from sources.shopify_webhooks import TOPICS
+
+        if not verify_hmac(body, headers.get("X-Shopify-Hmac-Sha256"), self.secret):
+            self.metrics["hmac_failures"] += 1
+            return HTTPStatus.UNAUTHORIZED
+
+        topic = headers.get("X-Shopify-Topic", "")
+        if topic not in TOPICS:
+            # Acknowledge so Shopify does not retry topics we do not ingest
+            self.metrics["ignored"] += 1
+            return HTTPStatus.OK
+
+        try:
+            payload = json.loads(body)
+        except ValueError:
+            return HTTPStatus.BAD_REQUEST
+
+        event = self.log.append(
+            topic, payload,
+            webhook_id=headers.get("X-Shopify-Webhook-Id") or headers.get("X-Shopify-Event-Id"),
+            triggered_at=headers.get("X-Shopify-Triggered-At"),
+        )
+        if event is None:
+            self.metrics["duplicates"] += 1
+        else:
+            self.metrics["received"][topic] += 1
+            if len(self.log.pending) >= self.flush_events:
+                self._wake.set()
+        return HTTPStatus.OK
+
+    # --- Flushing -----------------------------------------------------------
+    def flush(self) -> int:
+        """Stage pending events for the next merge; returns the number of events flushed."""
+        events = self.log.take()
+        if not events:
+            return 0
+
+        started = time.perf_counter()
+        try:
+            self.staging.stage(events)
+        except Exception as e:
+            # Events stay in the log and are retried on the next flush
+            self.metrics["flush_failures"] += 1
+            print(f"❌ Webhook flush of {len(events)} events failed: {e}")
+            return 0
+
+        self.log.commit(events[-1]["seq"])
+        for event in events:
+            self.metrics["flushed"][event["topic"]] += 1
+        self.metrics["staged_lag_seconds"].update(_lag_by_topic(events))
+        self.metrics["flushes"] += 1
+        self.metrics["last_flush_seconds"] = time.perf_counter() - started
+        self.metrics["last_flush_timestamp"] = time.time()
+        print(f"📥 Staged {len(events)} webhook events in {self.metrics['last_flush_seconds']:.2f}s")
+        return len(events)
+
+    def _flush_loop(self):
+        while not self._stop.is_set():
+            self._wake.wait(self.flush_seconds)
+            self._wake.clear()
+            self.flush()
+
+    # --- Merging ------------------------------------------------------------
+    def merge(self) -> list:
+        """Merge the staged events into data.duckdb; returns the changed tables ([] if it has to retry)."""
+        try:
+            changed, events = _merge(self.staging, self.db_path, self.dataset_name)
+        except Exception as e:
+            # Events stay staged and are retried on the next tick
+            if _is_lock_error(e):
+                self.metrics["merge_lock_waits"] += 1
+                print("⏳ data.duckdb is locked by another run, retrying the webhook merge later")
+            else:
+                self.metrics["merge_failures"] += 1
+                print(f"❌ Webhook merge failed: {e}")
+            return []
+
+        if events:
+            for event in events:
+                self.metrics["merged"][event["topic"]] += 1
+            self.metrics["lag_seconds"].update(_lag_by_topic(events))
+            self.metrics["merges"] += 1
+            self.metrics["last_merge_timestamp"] = time.time()
+        return changed
+
+    def _merge_loop(self):
+        while not self._stop.wait(self.merge_seconds):
+            self.merge()
+
+    def start(self):
+        self._thread = threading.Thread(target=self._flush_loop, name="webhook-flusher", daemon=True)
+        self._thread.start()
+        if self.merge_seconds:
+            self._merge_thread = threading.Thread(target=self._merge_loop, name="webhook-merger", daemon=True)
+            self._merge_thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+        for thread in (self._thread, self._merge_thread):
+            if thread:
+                thread.join()
+        self.flush()
+        self.log.close()
+
+    # --- Metrics ------------------------------------------------------------
+    def oldest_pending_seconds(self) -> float:
+        pending = self.log.take(1)
+        if not pending:
+            return 0.0
+        received = datetime.fromisoformat(pending[0]["received_at"])
+        return (datetime.now(timezone.utc) - received).total_seconds()
+
+    def oldest_unmerged_seconds(self) -> float:
+        oldest = self.staging.oldest_received_at()
+        pending = self.log.take(1)
+        received = [datetime.fromisoformat(r) for r in (oldest, pending and pending[0]["received_at"]) if r]
+        if not received:
+            return 0.0
+        return (datetime.now(timezone.utc) - min(received)).total_seconds()
+
+    def health(self) -> dict:
+        m = self.metrics
+        return {
+            "status": "ok",
+            "pending_events": len(self.log.pending),
+            "oldest_pending_seconds": round(self.oldest_pending_seconds(), 3),
+            "oldest_unmerged_seconds": round(self.oldest_unmerged_seconds(), 3),
+            "received": dict(m["received"]),
+            "flushed": dict(m["flushed"]),
+            "duplicates": m["duplicates"],
+            "ignored": m["ignored"],
+            "hmac_failures": m["hmac_failures"],
+            "flushes": m["flushes"],
+            "flush_failures": m["flush_failures"],
+            "last_flush_seconds": round(m["last_flush_seconds"], 4),
+            "staged_lag_seconds": {t: round(v, 3) for t, v in m["staged_lag_seconds"].items()},
+            "merged": dict(m["merged"]),
+            "merges": m["merges"],
+            "merge_lock_waits": m["merge_lock_waits"],
+            "merge_failures": m["merge_failures"],
+            "lag_seconds": {t: round(v, 3) for t, v in m["lag_seconds"].items()},
+        }
+
+    def to_openmetrics(self) -> str:
+        m = self.metrics
+        lines = []
+
+        def metric(name, kind, help_text, samples):
+            lines.append(f"# TYPE {name} {kind}")
+            lines.append(f"# HELP {name} {help_text}")
+            for suffix, labels, value in samples:
+                label_str = ",".join(f'{k}="{v}"' for k, v in labels.items())
+                lines.append(f"{name}{suffix}{{{label_str}}} {value}" if label_str else f"{name}{suffix} {value}")
+
+        metric("webhook_events_received", "counter", "Webhook events accepted into the log",
+               [("_total", {"topic": t}, v) for t, v in m["received"].items()])
+        metric("webhook_events_flushed", "counter", "Webhook events staged for the merge",
+               [("_total", {"topic": t}, v) for t, v in m["flushed"].items()])
+        metric("webhook_duplicates", "counter", "Redelivered webhooks dropped",
+               [("_total", {}, m["duplicates"])])
+        metric("webhook_hmac_failures", "counter", "Webhooks rejected for a bad HMAC",
+               [("_total", {}, m["hmac_failures"])])
+        metric("webhook_flush_failures", "counter", "Failed micro-batch flushes",
+               [("_total", {}, m["flush_failures"])])
+        metric("webhook_pending_events", "gauge", "Events logged but not yet staged",
+               [("", {}, len(self.log.pending))])
+        metric("webhook_oldest_pending_seconds", "gauge", "Age of the oldest event not yet staged",
+               [("", {}, round(self.oldest_pending_seconds(), 3))])
+        metric("webhook_staged_lag_seconds", "gauge", "Max time from Shopify trigger to staging in the last batch",
+               [("", {"topic": t}, round(v, 3)) for t, v in m["staged_lag_seconds"].items()])
+        metric("webhook_events_merged", "counter", "Webhook events merged into data.duckdb",
+               [("_total", {"topic": t}, v) for t, v in m["merged"].items()])
+        metric("webhook_merge_lock_waits", "counter", "Merges retried later because data.duckdb was locked",
+               [("_total", {}, m["merge_lock_waits"])])
+        metric("webhook_merge_failures", "counter", "Merges that failed for another reason",
+               [("_total", {}, m["merge_failures"])])
+        metric("webhook_oldest_unmerged_seconds", "gauge", "Age of the oldest event not yet merged into data.duckdb",
+               [("", {}, round(self.oldest_unmerged_seconds(), 3))])
+        metric("webhook_lag_seconds", "gauge", "Max time from Shopify trigger to the merge into data.duckdb in the last merge",
+               [("", {"topic": t}, round(v, 3)) for t, v in m["lag_seconds"].items()])
+        metric("webhook_last_merge_timestamp_seconds", "gauge", "Unix time of the last successful merge",
+               [("", {}, round(m["last_merge_timestamp"], 3))])
+        metric("webhook_last_flush_seconds", "gauge", "Duration of the last micro-batch flush",
+               [("", {}, round(m["last_flush_seconds"], 6))])
+        metric("webhook_last_flush_timestamp_seconds", "gauge", "Unix time of the last successful flush",
+               [("", {}, round(m["last_flush_timestamp"], 3))])
+
+        lines.append("# EOF")
+        return "\n".join(lines) + "\n"
+
+
+class WebhookHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    # Set by make_server
+    receiver: WebhookReceiver = None
+
+    def _send(self, status: HTTPStatus, body: bytes, content_type: str):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        body = self.rfile.read(length)
+        if self.path.rstrip("/") != "/webhooks/shopify":
+            self._send(HTTPStatus.NOT_FOUND, b"", "text/plain")
+            return
+        status = self.receiver.receive(body, self.headers)
+        self._send(status, b"", "text/plain")
+
+    def do_GET(self):
+        path = self.path.rstrip("/")
+        if path == "/metrics":
+            self._send(HTTPStatus.OK, self.receiver.to_openmetrics().encode("utf-8"),
+                       "application/openmetrics-text; version=1.0.0; charset=utf-8")
+        elif path == "/health":
+            self._send(HTTPStatus.OK, json.dumps(self.receiver.health()).encode("utf-8"), "application/json")
+        else:
+            self._send(HTTPStatus.NOT_FOUND, b"", "text/plain")
+
+
+def make_server(receiver: WebhookReceiver, host: str = "127.0.0.1", port: int = 8788) -> ThreadingHTTPServer:
+    handler = type("BoundWebhookHandler", (WebhookHandler,), {"receiver": receiver})
+    return ThreadingHTTPServer((host, port), handler)
+
+
+def replay(files: list, url: str, secret: str, topic: str = None) -> int:
+    """
+    POST saved webhook payloads to a receiver, signed like Shopify does.
+
+    Args:
+        files: JSON payload files, or JSONL files of logged events ({"topic", "payload"})
+        url: Receiver webhook URL
+        secret: Webhook signing secret
+        topic: Topic for raw payload files
+
+    Returns:
+        int: Number of events replayed
+    """
+    sent = 0
+    for file in files:
+        text = Path(file).read_text()
+        if file.endswith(".jsonl"):
+            events = [json.loads(line) for line in text.splitlines() if line.strip()]
+        else:
+            data = json.loads(text)
+            events = data if isinstance(data, list) else [data]
+
+        for event in events:
+            if "payload" in event and "topic" in event:
+                event_topic, payload = event["topic"], event["payload"]
+            else:
+                event_topic, payload = topic, event
+            if not event_topic:
+                raise ValueError(f"{file}: no topic in the file, pass --topic")
+
+            body = json.dumps(payload).encode("utf-8")
+            response = requests.post(url, data=body, headers={
+                "Content-Type": "application/json",
+                "X-Shopify-Topic": event_topic,
+                "X-Shopify-Hmac-Sha256": sign(body, secret),
+                "X-Shopify-Webhook-Id": str(uuid.uuid4()),
+                "X-Shopify-Triggered-At": datetime.now(timezone.utc).isoformat(),
+            })
+            response.raise_for_status()
+            sent += 1
+    return sent
+
+
+def _loaded_versions(db_path: str, dataset: str, rows: dict) -> dict:
+    """{table: {primary key: updated_at}} of the loaded rows the batch touches."""
+    if not Path(db_path).exists():
+        return {}  # nothing loaded yet
+    # Raises while another run holds the write lock, so stale rows are never merged unchecked
+    con = duckdb.connect(db_path, read_only=True)
+
+    loaded = {}
+    try:
+        for table, table_rows in rows.items():
+            if not table_rows:
+                continue
+            try:
+                loaded[table] = dict(con.execute(
+                    f"SELECT id, updated_at FROM {dataset}.{table} WHERE id IN (SELECT unnest(?))",
+                    [[row["id"] for row in table_rows]],
+                ).fetchall())
+            except duckdb.CatalogException:
+                continue
+    finally:
+        con.close()
+    return loaded
+
+
+def merge_staged(staging_path: str = None, db_path: str = None, dataset_name: str = None) -> list:
+    """
+    Merge the staged webhook events into data.duckdb.
+
+    The receiver runs this every WEBHOOK_MERGE_SECONDS (the ``merge`` command
+    runs it once). Products are validated and hashed like in the polling
+    pipeline, rows older than the loaded version are skipped, and the events
+    leave staging only after the load succeeded. Raises (events stay staged)
+    while another run holds the data.duckdb write lock.
+
+    Args:
+        staging_path: Staging DuckDB file (default: WEBHOOK_STAGING_DB_PATH, then webhooks.duckdb)
+        db_path: Destination DuckDB file (default: the polling pipeline's)
+        dataset_name: Dataset to merge into (default: SHOPIFY_DATASET_NAME, then "shopify")
+
+    Returns:
+        list: Tables that changed (also recorded in staging for the DAG's dbt run)
+    """
+    return _merge(StagingStore(staging_path), db_path, dataset_name)[0]
+
+
+def _merge(staging: StagingStore, db_path: str = None, dataset_name: str = None) -> tuple:
+    """merge_staged on an open staging store; returns (changed tables, merged events)."""
+    import dlt
+    from pipelines.change_detection import ChangeDetector
+    from pipelines.run_shopify_pipeline import DATASET_NAME, DB_PATH
+    from pipelines.validation import BatchValidator, build_contract
+    from sources.shopify_source import PRODUCT_COLUMNS, PRODUCT_DBT_MODEL, PRODUCT_RULES
+    from sources.shopify_webhooks import PRODUCTS_TABLE, drop_stale, rows_from_events, shopify_webhook_source
+
+    db_path = db_path or DB_PATH
+    dataset_name = dataset_name or os.getenv("SHOPIFY_DATASET_NAME", DATASET_NAME)
+
+    events = staging.events()
+    if not events:
+        return [], []
+
+    rows = rows_from_events(events)
+    rows = drop_stale(rows, _loaded_versions(db_path, dataset_name, rows))
+    change_detector = ChangeDetector(db_path, dataset_name, PRODUCTS_TABLE)
+    validator = BatchValidator(PRODUCTS_TABLE, build_contract(PRODUCT_COLUMNS, PRODUCT_DBT_MODEL, PRODUCT_RULES))
+
+    pipeline = dlt.pipeline(
+        pipeline_name="shopify_webhooks" if dataset_name == DATASET_NAME else f"shopify_webhooks_{dataset_name}",
+        destination=dlt.destinations.duckdb(db_path),
+        dataset_name=dataset_name,
+    )
+    pipeline.run(shopify_webhook_source(rows, change_detector, validator))
+    validator.commit(db_path, dataset_name)
+    change_detector.commit()
+
+    changed = [table for table, table_rows in rows.items() if table != PRODUCTS_TABLE and table_rows]
+    if change_detector.has_changes:
+        changed.insert(0, PRODUCTS_TABLE)
+    staging.discard(events[-1]["seq"], changed)
+    print(f"🧪 {validator.summary()}")
+    print(f"📊 {change_detector.summary()}")
+    print(f"✅ Merged {len(events)} staged webhook events into {dataset_name} ({', '.join(changed) or 'no changes'})")
+    return changed, events
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Shopify webhook receiver with micro-batch loads")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    serve_cmd = sub.add_parser("serve", help="Run the receiver")
+    serve_cmd.add_argument("--host", default="127.0.0.1")
+    serve_cmd.add_argument("--port", type=int, default=8788)
+    serve_cmd.add_argument("--log", help="Event log path (default logs/webhooks/events.jsonl)")
+    serve_cmd.add_argument("--flush-seconds", type=float, default=FLUSH_SECONDS)
+    serve_cmd.add_argument("--flush-events", type=int, default=FLUSH_EVENTS)
+    serve_cmd.add_argument("--staging", help="Staging DuckDB file (default webhooks.duckdb)")
+    serve_cmd.add_argument("--merge-seconds", type=float, default=MERGE_SECONDS,
+                           help="Merge staged events into data.duckdb this often (0: only the merge command)")
+    serve_cmd.add_argument("--db", help="Destination DuckDB file (default ../data.duckdb)")
+    serve_cmd.add_argument("--dataset", help="Dataset (default SHOPIFY_DATASET_NAME, then shopify)")
+
+    replay_cmd = sub.add_parser("replay", help="Replay saved payloads against a receiver")
+    replay_cmd.add_argument("files", nargs="+")
+    replay_cmd.add_argument("--url", default="http://127.0.0.1:8788/webhooks/shopify")
+    replay_cmd.add_argument("--topic", help="Topic for raw payload files (e.g. products/update)")
+
+    merge_cmd = sub.add_parser("merge", help="Merge staged events into data.duckdb")
+    merge_cmd.add_argument("--staging", help="Staging DuckDB file (default webhooks.duckdb)")
+    merge_cmd.add_argument("--db", help="Destination DuckDB file (default ../data.duckdb)")
+    merge_cmd.add_argument("--dataset", help="Dataset (default SHOPIFY_DATASET_NAME, then shopify)")
+
+    args = parser.parse_args()
+    if args.command == "merge":
+        changed = merge_staged(args.staging, args.db, args.dataset)
+        print(f"✅ Webhook merge done ({', '.join(changed) or 'nothing changed'})")
+        return
+
+    secret = os.getenv("SHOPIFY_WEBHOOK_SECRET")
+    if not secret:
+        print("❌ SHOPIFY_WEBHOOK_SECRET must be set")
+        sys.exit(1)
+
+    if args.command == "replay":
+        print(f"✅ Replayed {replay(args.files, args.url, secret, args.topic)} webhook events")
+        return
+
+    receiver = WebhookReceiver(secret, EventLog(args.log), args.flush_seconds, args.flush_events,
+                               StagingStore(args.staging), args.merge_seconds, args.db, args.dataset)
+    if receiver.log.pending:
+        print(f"♻️ Recovered {len(receiver.log.pending)} unflushed events from {receiver.log.path}")
+    receiver.start()
+    server = make_server(receiver, args.host, args.port)
+    print(f"🚀 Receiving Shopify webhooks on http://{args.host}:{args.port}/webhooks/shopify")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        receiver.stop()
+
+
+if __name__ == "__main__":
+    main()
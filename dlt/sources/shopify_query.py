@@ -0,0 +1,337 @@
+"""
+GraphQL query builder for the Shopify products resource.
+
+The selection is generated from the resource's declared columns, optionally
+narrowed by a projection (e.g. ``["title", "vendor", "variants.price"]``), so
+consumers that need a few columns stop paying for ``bodyHtml`` and every
+variant and image.
+
+Query cost is estimated with Shopify's calculated-cost rules before anything
+is sent (scalars 0, objects 1, connections 2 + ``first`` x node cost, nested
+connections multiply). Shopify only accepts a query whose requested cost is
+in the throttle bucket, and refunds the difference to its actual cost
+afterwards, so each products page is sized to what the bucket holds right
+now (``throttleStatus.currentlyAvailable`` of the last response plus the
+restore since), between a fraction of the bucket and the per-query limit.
+Nested connections (variants, images) are fetched with a small page; products
+that have more are completed afterwards with aliased ``product(id:)`` queries,
+batched as many per request as the cost limit allows.
+"""
+
+import os
+import time
+from collections import namedtuple
+
+MAX_QUERY_COST = 1000
+MAX_PAGE_SIZE = 250
+MIN_PAGE_COST_FRACTION = 0.5  # of the bucket; smaller pages wait for the bucket instead
+NESTED_PAGE_SIZE = 10       # variants / images per product in the products query
+OVERFLOW_PAGE_SIZE = 50     # variants / images per aliased follow-up query
+
+# A paginated connection; ``fields`` is the selection of each node
+Connection = namedtuple("Connection", ["fields"])
+
+# Everything the products resource can select: None is a scalar, a dict an
+# object (or list of objects), a Connection a paginated connection
+PRODUCT_FIELDS = {
+    "id": None,
+    "title": None,
+    "bodyHtml": None,
+    "vendor": None,
+    "productType": None,
+    "createdAt": None,
+    "handle": None,
+    "updatedAt": None,
+    "publishedAt": None,
+    "templateSuffix": None,
+    "tags": None,
+    "status": None,
+    "options": {"id": None, "name": None, "position": None, "values": None},
+    "variants": Connection({
+        "id": None,
+        "title": None,
+        "price": None,
+        "position": None,
+        "inventoryPolicy": None,
+        "compareAtPrice": None,
+        "createdAt": None,
+        "updatedAt": None,
+        "taxable": None,
+        "barcode": None,
+        "sku": None,
+        "image": {"id": None},
+        "selectedOptions": {"name": None, "value": None},
+    }),
+    "images": Connection({"id": None, "altText": None, "originalSrc": None, "width": None, "height": None}),
+    "featuredImage": {"id": None, "altText": None, "originalSrc": None, "width": None, "height": None},
+}
+
+# Merge key and the non-nullable timestamps change detection relies on
+REQUIRED_PRODUCT_FIELDS = ("id", "createdAt", "updatedAt")
+
+
+def product_fields_from_env():
+    """Projection from SHOPIFY_PRODUCT_FIELDS (comma separated), or None for every column."""
+    fields = [f.strip() for f in os.getenv("SHOPIFY_PRODUCT_FIELDS", "").split(",") if f.strip()]
+    return fields or None
+
+
+def _project(available: dict, path: list):
+    """Selection for one dotted path (e.g. ["variants", "price"]) within ``available``."""
+    name, rest = path[0], path[1:]
+    if name not in available:
+        raise ValueError(f"Unknown Shopify product field '{name}'")
+    spec = available[name]
+    if not rest or spec is None:
+        return {name: spec}
+
+    nested = spec.fields if isinstance(spec, Connection) else spec
+    # Keep node ids so nested rows stay identifiable
+    selection = {"id": None} if "id" in nested else {}
+    selection.update(_project(nested, rest))
+    return {name: Connection(selection) if isinstance(spec, Connection) else selection}
+
+
+def _merge(a: dict, b: dict) -> dict:
+    merged = dict(a)
+    for name, spec in b.items():
+        current = merged.get(name)
+        if isinstance(current, Connection) and isinstance(spec, Connection):
+            merged[name] = Connection(_merge(current.fields, spec.fields))
+        elif isinstance(current, dict) and isinstance(spec, dict):
+            merged[name] = _merge(current, spec)
+        else:
+            merged[name] = spec
+    return merged
+
+
+def select_fields(columns: dict, fields: list = None, available: dict = PRODUCT_FIELDS,
+                  required: tuple = REQUIRED_PRODUCT_FIELDS) -> dict:
+    """
+    Selection tree for a resource.
+
+    Args:
+        columns: Declared resource columns; only these top-level fields are selected
+        fields: Optional projection of column names or dotted paths ("variants.price")
+        available: Selectable fields
+        required: Fields that are always selected
+
+    Returns:
+        dict: Selection tree (same shape as ``available``)
+    """
+    paths = [f.split(".") for f in (fields or [name for name in columns if name in available])]
+    paths += [[name] for name in required]
+
+    selection = {}
+    for path in paths:
+        if path[0] not in columns:
+            raise ValueError(f"'{'.'.join(path)}' is not a declared column of the resource")
+        selection = _merge(selection, _project(available, path))
+    # Keep the declared column order
+    return {name: selection[name] for name in available if name in selection}
+
+
+def project_columns(columns: dict, selection: dict) -> dict:
+    """Column hints of the selected fields (plus hints that are not API fields, e.g. tombstones)."""
+    return {name: hints for name, hints in columns.items() if name in selection or name not in PRODUCT_FIELDS}
+
+
+def node_cost(selection: dict, nested_page_size: int = NESTED_PAGE_SIZE) -> int:
+    """Requested cost of one object with this selection."""
+    cost = 1
+    for spec in selection.values():
+        if isinstance(spec, Connection):
+            cost += connection_cost(spec.fields, nested_page_size, nested_page_size)
+        elif isinstance(spec, dict):
+            cost += node_cost(spec, nested_page_size)
+    return cost
+
+
+def connection_cost(fields: dict, first: int, nested_page_size: int = NESTED_PAGE_SIZE) -> int:
+    """Requested cost of a connection of ``first`` nodes."""
+    return 2 + first * node_cost(fields, nested_page_size)
+
+
+def _render(selection: dict, indent: int, first: int) -> str:
+    pad = " " * indent
+    lines = []
+    for name, spec in selection.items():
+        if spec is None:
+            lines.append(f"{pad}{name}")
+        elif isinstance(spec, Connection):
+            lines.append(f"{pad}{name}(first: {first}) {{")
+            lines.append(_render_connection_body(spec.fields, indent + 4, first))
+            lines.append(f"{pad}}}")
+        else:
+            lines.append(f"{pad}{name} {{")
+            lines.append(_render(spec, indent + 4, first))
+            lines.append(f"{pad}}}")
+    return "\n".join(lines)
+
+
+def _render_connection_body(fields: dict, indent: int, first: int) -> str:
+    pad = " " * indent
+    return "\n".join([
+        f"{pad}pageInfo {{",
+        f"{pad}    hasNextPage",
+        f"{pad}    endCursor",
+        f"{pad}}}",
+        f"{pad}edges {{",
+        f"{pad}    node {{",
+        _render(fields, indent + 8, first),
+        f"{pad}    }}",
+        f"{pad}}}",
+    ])
+
+
+class ProductsQuery:
+    """
+    Products query for a selection, with its page size tuned to the cost limit
+    and the throttle bucket.
+
+    Usage:
+        plan = ProductsQuery(PRODUCT_COLUMNS, fields=["title", "variants.price"])
+        time.sleep(plan.next_page())       # size the page to the bucket
+        result = shopify_graphql_query(plan.query, {"first": plan.page_size, "after": None})
+        plan.observe(result)
+        ...
+        query, variables = plan.overflow_query([(product_id, "variants", end_cursor), ...])
+    """
+
+    def __init__(self, columns: dict, fields: list = None, nested_page_size: int = NESTED_PAGE_SIZE,
+                 max_cost: int = MAX_QUERY_COST, overflow_page_size: int = OVERFLOW_PAGE_SIZE,
+                 min_cost_fraction: float = MIN_PAGE_COST_FRACTION):
+        self.selection = select_fields(columns, fields)
+        self.columns = project_columns(columns, self.selection)
+        self.nested_page_size = nested_page_size
+        self.overflow_page_size = overflow_page_size
+        self.max_cost = max_cost
+        self.node_cost = node_cost(self.selection, nested_page_size)
+
+        self.max_page_size = (max_cost - 2) // self.node_cost
+        if self.max_page_size < 1:
+            raise ValueError(
+                f"One product costs {self.node_cost} points with {nested_page_size} nested rows; "
+                f"lower the nested page size or project fewer fields"
+            )
+        self.max_page_size = min(self.max_page_size, MAX_PAGE_SIZE)
+        self.min_page_size = min(max(int(max_cost * min_cost_fraction - 2) // self.node_cost, 1), self.max_page_size)
+        # Until a response reports the bucket, assume another run may be sharing it
+        self.page_size = self.min_page_size
+        self._throttle = None  # (throttleStatus, monotonic time it was reported)
+        self.query = self._products_query()
+
+    @property
+    def connections(self) -> list:
+        """Names of the nested connections in the selection."""
+        return [name for name, spec in self.selection.items() if isinstance(spec, Connection)]
+
+    @property
+    def requested_cost(self) -> int:
+        return connection_cost(self.selection, self.page_size, self.nested_page_size)
+
+    def shrink(self) -> bool:
+        """Halve the page size for good (after a MAX_COST_EXCEEDED); False if it cannot shrink."""
+        if self.page_size <= 1:
+            return False
+        self.page_size //= 2
+        self.max_page_size = self.page_size
+        self.min_page_size = min(self.min_page_size, self.page_size)
+        return True
+
+    def observe(self, result: dict):
+        """Track the throttle bucket from a response's ``extensions.cost.throttleStatus``."""
+        status = ((result.get("extensions") or {}).get("cost") or {}).get("throttleStatus")
+        if status:
+            self._throttle = (status, time.monotonic())
+
+    def available(self):
+        """Points in the bucket now, projected from the last response (None before the first)."""
+        if self._throttle is None:
+            return None
+        status, observed_at = self._throttle
+        restored = (time.monotonic() - observed_at) * (status.get("restoreRate") or 0)
+        return min(status.get("currentlyAvailable", 0) + restored, status.get("maximumAvailable") or self.max_cost)
+
+    def next_page(self) -> float:
+        """
+        Size the next products page to the bucket.
+
+        The page takes what the bucket holds, between ``min_page_size`` and
+        ``max_page_size``. Sending a page the bucket cannot cover only earns a
+        THROTTLED response, so the caller waits the returned seconds first.
+
+        Returns:
+            float: Seconds until the bucket covers the page (0 if it does now)
+        """
+        available = self.available()
+        if available is None:
+            return 0.0
+        fits = int(available - 2) // self.node_cost
+        self.page_size = max(self.min_page_size, min(self.max_page_size, fits))
+        restore_rate = self._throttle[0].get("restoreRate") or 0
+        missing = self.requested_cost - available
+        if missing <= 0 or not restore_rate:
+            return 0.0
+        return missing / restore_rate
+
+    def _products_query(self) -> str:
+        return "\n".join([
+            "query GetProducts($first: Int!, $after: String) {",
+            "    products(first: $first, after: $after) {",
+            _render_connection_body(self.selection, 8, self.nested_page_size),
+            "    }",
+            "}",
+        ])
+
+    def overflow_cost(self, connection: str) -> int:
+        """Requested cost of one aliased ``product(id:)`` follow-up for a connection."""
+        fields = self.selection[connection].fields
+        return 1 + connection_cost(fields, self.overflow_page_size, self.nested_page_size)
+
+    def overflow_batches(self, pending: list) -> list:
+        """Split (product_id, connection, after) requests into batches that fit the cost limit."""
+        batches, batch, cost = [], [], 0
+        for request in pending:
+            request_cost = self.overflow_cost(request[1])
+            if batch and cost + request_cost > self.max_cost:
+                batches.append(batch)
+                batch, cost = [], 0
+            batch.append(request)
+            cost += request_cost
+        if batch:
+            batches.append(batch)
+        return batches
+
+    def overflow_query(self, batch: list) -> tuple:
+        """
+        One request completing several nested connections with aliases.
+
+        Args:
+            batch: (product_id, connection, after) tuples, e.g. from overflow_batches
+
+        Returns:
+            tuple: (query, variables); the result for batch[i] is under alias ``p<i>``
+        """
+        params, blocks, variables = [], [], {}
+        for i, (product_id, connection, after) in enumerate(batch):
+            params += [f"$id{i}: ID!", f"$after{i}: String"]
+            variables[f"id{i}"] = product_id
+            variables[f"after{i}"] = after
+            blocks += [
+                f"    p{i}: product(id: $id{i}) {{",
+                f"        {connection}(first: {self.overflow_page_size}, after: $after{i}) {{",
+                _render_connection_body(self.selection[connection].fields, 12, self.nested_page_size),
+                "        }",
+                "    }",
+            ]
+        query = "\n".join([f"query ProductConnections({', '.join(params)}) {{", *blocks, "}"])
+        return query, variables
+
+    def describe(self) -> str:
+        return (
+            f"{len(self.selection)} fields, {self.node_cost} points per product, "
+            f"{self.min_page_size}-{self.max_page_size} products per page "
+            f"({connection_cost(self.selection, self.min_page_size, self.nested_page_size)}-"
+            f"{connection_cost(self.selection, self.max_page_size, self.nested_page_size)} of {self.max_cost} points)"
+        )
@@ -1,19 +1,40 @@
 import dlt
 import requests
 import os
+import time
 import dotenv
+from datetime import datetime, timezone
 from dlt.pipeline import current
 
+from pipelines import telemetry
+from pipelines.change_detection import DELETED_FLAG
+from sources.shopify_query import ProductsQuery, product_fields_from_env
+
 dotenv.load_dotenv()
 
-def shopify_graphql_query(query, variables=None):
-    """Execute a GraphQL query against Shopify Admin API"""
+MAX_THROTTLE_RETRIES = 5
+
+def _throttle_wait_seconds(result):
+    """Seconds until enough query cost is restored, if Shopify throttled the request."""
+    errors = result.get("errors") or []
+    if not any(e.get("extensions", {}).get("code") == "THROTTLED" for e in errors):
+        return None
+
+    cost = result.get("extensions", {}).get("cost", {})
+    status = cost.get("throttleStatus", {})
+    missing = cost.get("requestedQueryCost", 0) - status.get("currentlyAvailable", 0)
+    restore_rate = status.get("restoreRate") or 50
+    return max(missing / restore_rate, 1.0)
+
+def shopify_graphql_query(query, variables=None, shop_name=None):
+    """Execute a GraphQL query against Shopify Admin API (shop_name defaults to SHOPIFY_SHOP_NAME)"""
     api_key = os.getenv('SHOPIFY_API_KEY')
     password = os.getenv('SHOPIFY_API_PASSWORD')
-    shop_name = os.getenv('SHOPIFY_SHOP_NAME')
+    shop_name = shop_name or os.getenv('SHOPIFY_SHOP_NAME')
     version = '2025-07'
 
-    url = f"https://{shop_name}.myshopify.com/admin/api/{version}/graphql.json"
+    # SHOPIFY_API_URL points the pipeline at another endpoint (e.g. benchmarks/fake_api_server.py)
+    url = os.getenv('SHOPIFY_API_URL') or f"https://{shop_name}.myshopify.com/admin/api/{version}/graphql.json"
     
     headers = {
         'Content-Type': 'application/json',
@@ -25,118 +46,182 @@ def shopify_graphql_query(query, variables=None):
         'variables': variables or {}
     }
     
-    response = requests.post(url, headers=headers, json=payload)
-    response.raise_for_status()
-    return response.json()
+    for attempt in range(MAX_THROTTLE_RETRIES + 1):
+        started = time.perf_counter()
+        response = requests.post(url, headers=headers, json=payload)
+        telemetry.active().record_request(time.perf_counter() - started, ok=response.ok)
+
+        if response.status_code == 429:
+            wait = float(response.headers.get("Retry-After", 2))
+        else:
+            response.raise_for_status()
+            result = response.json()
+            wait = _throttle_wait_seconds(result)
+            if wait is None:
+                return result
+
+        if attempt == MAX_THROTTLE_RETRIES:
+            break
+        telemetry.active().record_throttle_wait(wait)
+        time.sleep(wait)
+
+    raise RuntimeError(f"Shopify API still throttled after {MAX_THROTTLE_RETRIES} retries")
+
+def _query_errors(result, code):
+    return any(e.get("extensions", {}).get("code") == code for e in result.get("errors") or [])
+
+def _raise_for_errors(result):
+    if result.get("errors") and not result.get("data"):
+        raise RuntimeError(f"Shopify query failed: {result['errors']}")
+
+def _complete_connections(plan, products, shop_name=None):
+    """Fetch the rest of any nested connection cut off by the nested page size."""
+    pending = []
+    for product in products:
+        for name in plan.connections:
+            connection = product.get(name) or {}
+            page_info = connection.get("pageInfo") or {}
+            if page_info.get("hasNextPage"):
+                pending.append((product, name, page_info["endCursor"]))
+
+    while pending:
+        by_id = {(product["id"], name): product for product, name, _ in pending}
+        next_pending = []
+        for batch in plan.overflow_batches([(product["id"], name, after) for product, name, after in pending]):
+            query, variables = plan.overflow_query(batch)
+            result = shopify_graphql_query(query, variables, shop_name)
+            plan.observe(result)
+            _raise_for_errors(result)
+
+            for i, (product_id, name, _) in enumerate(batch):
+                page = (result["data"].get(f"p{i}") or {}).get(name) or {}
+                product = by_id[(product_id, name)]
+                product[name]["edges"].extend(page.get("edges", []))
+                page_info = page.get("pageInfo") or {}
+                if page_info.get("hasNextPage"):
+                    next_pending.append((product, name, page_info["endCursor"]))
+        pending = next_pending
+
+    # Stored rows keep the {"edges": [...]} shape
+    for product in products:
+        for name in plan.connections:
+            if product.get(name):
+                product[name].pop("pageInfo", None)
+
+def _paginate_products(plan, shop_name=None):
+    """Follow the products cursor until the last page, each page sized to the throttle bucket."""
+    after = None
+    while True:
+        wait = plan.next_page()
+        if wait:
+            telemetry.active().record_throttle_wait(wait)
+            time.sleep(wait)
+        data = shopify_graphql_query(plan.query, {"first": plan.page_size, "after": after}, shop_name)
+        plan.observe(data)
+        if _query_errors(data, "MAX_COST_EXCEEDED") and plan.shrink():
+            # Our estimate was low for this shop; retry the page with fewer products
+            continue
+        _raise_for_errors(data)
+        products = data.get("data", {}).get("products", {})
+
+        nodes = [edge["node"] for edge in products.get("edges", [])]
+        _complete_connections(plan, nodes, shop_name)
+        yield from nodes
+
+        page_info = products.get("pageInfo", {})
+        if not page_info.get("hasNextPage"):
+            break
+        after = page_info["endCursor"]
 
 # Define explicit schema to prevent dlt from auto-inferring types
+# (shared with the webhook micro-batches in sources/shopify_webhooks.py)
+PRODUCT_COLUMNS = {
+    "id": {"data_type": "text", "nullable": False},
+    "title": {"data_type": "text", "nullable": True},
+    "bodyHtml": {"data_type": "text", "nullable": True},
+    "vendor": {"data_type": "text", "nullable": True},
+    "productType": {"data_type": "text", "nullable": True},
+    "createdAt": {"data_type": "timestamp", "nullable": False},
+    "updatedAt": {"data_type": "timestamp", "nullable": False},
+    "publishedAt": {"data_type": "timestamp", "nullable": True},
+    "tags": {"data_type": "text", "nullable": True},
+    "status": {"data_type": "text", "nullable": True},
+    "handle": {"data_type": "text", "nullable": True},
+    "templateSuffix": {"data_type": "text", "nullable": True},
+    "featuredImage": {"data_type": "json", "nullable": True},  # Nested structure
+    "variants": {"data_type": "json", "nullable": True},       # Nested
+    "images": {"data_type": "json", "nullable": True},         # Nested
+    "options": {"data_type": "json", "nullable": True},        # Nested
+    DELETED_FLAG: {"data_type": "bool", "nullable": True, "hard_delete": True},  # Tombstones
+}
+
+# dbt model whose column tests also apply to extracted products (see pipelines/validation.py)
+PRODUCT_DBT_MODEL = "shopify_products_base"
+
+# ProductStatus enum of the pinned Admin API version (2025-07). The polling and
+# webhook loads quarantine any other value, which is what lets
+# pipelines/maintain_tables.py store the column as an ENUM of these values
+PRODUCT_STATUSES = ("ACTIVE", "ARCHIVED", "DRAFT", "UNLISTED")
+
+# Value rules on top of the column hints and dbt tests
+PRODUCT_RULES = [
+    ("non_negative", "variants.edges.node.price"),
+    ("non_negative", "variants.edges.node.compareAtPrice"),
+    ("accepted_values", "status", PRODUCT_STATUSES),
+]
+
+def product_tombstone(product_id, deleted_at=None):
+    """Row that makes the merge delete a product."""
+    # Tombstones still have to satisfy the non-nullable columns; the values
+    # are never stored because the merge deletes the row
+    deleted_at = deleted_at or datetime.now(timezone.utc)
+    return {"id": product_id, DELETED_FLAG: True, "createdAt": deleted_at, "updatedAt": deleted_at}
 
 @dlt.resource(
     name="shopify_products",
-    write_disposition="replace",
-    columns={
-        "id": {"data_type": "text", "nullable": False},
-        "title": {"data_type": "text", "nullable": True},
-        "bodyHtml": {"data_type": "text", "nullable": True},
-        "vendor": {"data_type": "text", "nullable": True},
-        "productType": {"data_type": "text", "nullable": True},
-        "createdAt": {"data_type": "timestamp", "nullable": False},
-        "updatedAt": {"data_type": "timestamp", "nullable": False},
-        "publishedAt": {"data_type": "timestamp", "nullable": True},
-        "tags": {"data_type": "text", "nullable": True},
-        "status": {"data_type": "text", "nullable": True},
-        "handle": {"data_type": "text", "nullable": True},
-        "templateSuffix": {"data_type": "text", "nullable": True},
-        "featuredImage": {"data_type": "json", "nullable": True},  # Nested structure
-        "variants": {"data_type": "json", "nullable": True},       # Nested
-        "images": {"data_type": "json", "nullable": True},         # Nested
-        "options": {"data_type": "json", "nullable": True},        # Nested
-    }
+    # merge (not replace) so change detection can hand over only the delta
+    write_disposition="merge",
+    primary_key="id",
+    columns=PRODUCT_COLUMNS,
 )
 
-def get_products():
-    query = """
-    query GetProducts($first: Int!) {
-    products(first: $first) {
-        edges {
-            node {
-                id
-                title
-                bodyHtml
-                vendor
-                productType
-                createdAt
-                handle
-                updatedAt
-                publishedAt
-                templateSuffix
-                tags
-                status
-
-                options {
-                    id
-                    name
-                    position
-                    values
-                }
-
-                variants(first: 100) {
-                    edges {
-                        node {
-                            id
-                            title
-                            price
-                            position
-                            inventoryPolicy
-                            compareAtPrice
-                            createdAt
-                            updatedAt
-                            taxable
-                            barcode
-                            sku
-                            image {
-                                id
-                            }
-                            selectedOptions {
-                                name
-                                value
-                            }
-                        }
-                    }
-                }
-
-                images(first: 100) {
-                    edges {
-                        node {
-                        id
-                        altText
-                        originalSrc
-                        width
-                        height
-                        }
-                    }
-                }
-
-                featuredImage {
-                    id
-                    altText
-                    originalSrc
-                    width
-                    height
-                }
-            }
-        }
-    }
-}
-"""
-    
-    variables = {"first": 100}
-    data = shopify_graphql_query(query, variables)
-    print(data)
+def get_products(change_detector=None, validator=None, fields=None, shop_name=None):
+    """
+    Shopify products, paged with a generated query sized to the cost limit (sources/shopify_query.py).
+
+    Args:
+        change_detector: Only yield changed rows and tombstones (pipelines/change_detection.py)
+        validator: Hold back rows failing the contract (pipelines/validation.py)
+        fields: Projection, e.g. ["title", "variants.price"] (default: SHOPIFY_PRODUCT_FIELDS, then every column)
+        shop_name: Shop to extract (default: SHOPIFY_SHOP_NAME)
+    """
+    plan = ProductsQuery(PRODUCT_COLUMNS, fields or product_fields_from_env())
+    rows = _paginate_products(plan, shop_name)
+
+    # Rows failing the contract are held back for quarantine before anything is hashed
+    if validator is not None:
+        rows = validator.validate(rows)
+
+    if change_detector is None:
+        yield from rows
+        return
+
+    # Only inserted/updated rows and deletion tombstones reach the load step
+    yield from change_detector.filter(rows)
+
+    # A quarantined product keeps its last good version instead of being deleted
+    if validator is not None:
+        change_detector.keep(validator.quarantined_ids)
 
-    for edge in data.get("data", {}).get("products", {}).get("edges", []):
-        yield edge["node"]
+    deleted_at = datetime.now(timezone.utc)
+    for tombstone in change_detector.deletions():
+        yield product_tombstone(tombstone["id"], deleted_at)
 
 @dlt.source
-def shopify_source():
-    yield get_products()
+def shopify_source(change_detector=None, validator=None, fields=None, shop_name=None):
+    products = get_products(change_detector, validator, fields, shop_name)
+    if fields or product_fields_from_env():
+        # A projection is a full snapshot of a few columns, not a delta of the
+        # full rows: replace its table instead of merging into it
+        products.apply_hints(write_disposition="replace")
+    yield products
@@ -0,0 +1,245 @@
+"""
+dlt source for micro-batches of Shopify webhook events.
+
+Webhook payloads use the REST shape (snake_case, numeric ids). Products are
+mapped onto the GraphQL shape produced by ``shopify_source.get_products`` so
+both paths merge into the same ``products`` table with the same column hints
+and tombstones. Orders and refunds land in their own merge tables, with nested
+fields kept as JSON.
+
+Within a batch only the newest version of each row is kept (by ``updated_at``,
+then arrival order), so a product updated ten times in a few seconds is merged
+once. Rows older than the version already loaded are dropped (``drop_stale``),
+so a late, out-of-order webhook never overwrites a newer row.
+"""
+
+from datetime import datetime, timezone
+
+import dlt
+
+from pipelines.change_detection import DELETED_FLAG
+from sources.shopify_source import PRODUCT_COLUMNS, product_tombstone
+
+PRODUCTS_TABLE = "products"
+ORDERS_TABLE = "orders"
+REFUNDS_TABLE = "refunds"
+
+# Webhook topic -> (table, action)
+TOPICS = {
+    "products/create": (PRODUCTS_TABLE, "upsert"),
+    "products/update": (PRODUCTS_TABLE, "upsert"),
+    "products/delete": (PRODUCTS_TABLE, "delete"),
+    "orders/create": (ORDERS_TABLE, "upsert"),
+    "orders/updated": (ORDERS_TABLE, "upsert"),
+    "refunds/create": (REFUNDS_TABLE, "upsert"),
+}
+
+# Column holding each table's row version (refunds are immutable and have none)
+UPDATED_AT = {PRODUCTS_TABLE: "updatedAt", ORDERS_TABLE: "updated_at", REFUNDS_TABLE: "updated_at"}
+
+REST_COLUMNS = {
+    "id": {"data_type": "bigint", "nullable": False},
+    "created_at": {"data_type": "timestamp", "nullable": True},
+    "updated_at": {"data_type": "timestamp", "nullable": True},
+}
+
+
+def _gid(kind: str, value) -> str:
+    return value if value is None or str(value).startswith("gid://") else f"gid://shopify/{kind}/{value}"
+
+
+def _parse_ts(value):
+    if not value:
+        return None
+    try:
+        ts = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    return ts if ts.tzinfo else ts.replace(tzinfo=timezone.utc)
+
+
+def _image_node(image):
+    if not image:
+        return None
+    return {
+        "id": image.get("admin_graphql_api_id") or _gid("ProductImage", image.get("id")),
+        "altText": image.get("alt"),
+        "originalSrc": image.get("src"),
+        "width": image.get("width"),
+        "height": image.get("height"),
+    }
+
+
+def product_from_webhook(payload: dict) -> dict:
+    """Map a REST products/* webhook payload onto the GraphQL product shape."""
+    option_names = [o.get("name") for o in payload.get("options") or []]
+
+    variants = []
+    for v in payload.get("variants") or []:
+        selected = [
+            {"name": name, "value": v.get(f"option{i}")}
+            for i, name in enumerate(option_names, 1)
+            if v.get(f"option{i}") is not None
+        ]
+        variants.append({"node": {
+            "id": v.get("admin_graphql_api_id") or _gid("ProductVariant", v.get("id")),
+            "title": v.get("title"),
+            "price": v.get("price"),
+            "position": v.get("position"),
+            "inventoryPolicy": (v.get("inventory_policy") or "").upper() or None,
+            "compareAtPrice": v.get("compare_at_price"),
+            "createdAt": v.get("created_at"),
+            "updatedAt": v.get("updated_at"),
+            "taxable": v.get("taxable"),
+            "barcode": v.get("barcode"),
+            "sku": v.get("sku"),
+            "image": {"id": _gid("ProductImage", v["image_id"])} if v.get("image_id") else None,
+            "selectedOptions": selected,
+        }})
+
+    tags = payload.get("tags")
+    if isinstance(tags, str):
+        tags = [t.strip() for t in tags.split(",") if t.strip()]
+
+    return {
+        "id": payload.get("admin_graphql_api_id") or _gid("Product", payload["id"]),
+        "title": payload.get("title"),
+        "bodyHtml": payload.get("body_html"),
+        "vendor": payload.get("vendor"),
+        "productType": payload.get("product_type"),
+        "createdAt": payload.get("created_at"),
+        "handle": payload.get("handle"),
+        "updatedAt": payload.get("updated_at"),
+        "publishedAt": payload.get("published_at"),
+        "templateSuffix": payload.get("template_suffix"),
+        "tags": tags,
+        "status": (payload.get("status") or "").upper() or None,
+        "options": [
+            {
+                "id": o.get("admin_graphql_api_id") or _gid("ProductOption", o.get("id")),
+                "name": o.get("name"),
+                "position": o.get("position"),
+                "values": o.get("values"),
+            }
+            for o in payload.get("options") or []
+        ],
+        "variants": {"edges": variants},
+        "images": {"edges": [{"node": _image_node(i)} for i in payload.get("images") or []]},
+        "featuredImage": _image_node(payload.get("image")),
+    }
+
+
+def rows_from_events(events: list) -> dict:
+    """
+    Latest row per primary key and table for a batch of logged webhook events.
+
+    Args:
+        events: Event log entries ({"seq", "topic", "triggered_at", "payload", ...})
+
+    Returns:
+        dict: {table: [rows]}
+    """
+    latest = {PRODUCTS_TABLE: {}, ORDERS_TABLE: {}, REFUNDS_TABLE: {}}
+
+    for event in events:
+        table, action = TOPICS[event["topic"]]
+        payload = event["payload"]
+        event_ts = _parse_ts(event.get("triggered_at")) or _parse_ts(event.get("received_at"))
+
+        if table == PRODUCTS_TABLE:
+            if action == "delete":
+                row = product_tombstone(_gid("Product", payload["id"]), event_ts)
+            else:
+                row = product_from_webhook(payload)
+            key = row["id"]
+        else:
+            row = payload
+            key = payload["id"]
+
+        order = (_parse_ts(payload.get("updated_at")) or event_ts or datetime.min.replace(tzinfo=timezone.utc),
+                 event["seq"])
+        current = latest[table].get(key)
+        if current is None or order >= current[0]:
+            latest[table][key] = (order, row)
+
+    return {table: [row for _, row in rows.values()] for table, rows in latest.items()}
+
+
+def drop_stale(rows: dict, loaded: dict) -> dict:
+    """
+    Drop rows older than the version already loaded.
+
+    Args:
+        rows: {table: [rows]} from ``rows_from_events``
+        loaded: {table: {primary key: loaded updated_at}}
+
+    Returns:
+        dict: {table: [rows]} without the stale ones; tombstones and rows
+            without an ``updated_at`` are always kept
+    """
+    kept = {}
+    for table, table_rows in rows.items():
+        versions = loaded.get(table) or {}
+        kept[table] = []
+        for row in table_rows:
+            updated_at = _parse_ts(row.get(UPDATED_AT[table]))
+            current = versions.get(row["id"])
+            if row.get(DELETED_FLAG) or updated_at is None or current is None or updated_at >= current:
+                kept[table].append(row)
+    return kept
+
+
+def _checked_products(rows: list, change_detector=None, validator=None):
+    """Products through the same validation and row hashes as the polling pipeline."""
+    live = [row for row in rows if not row.get(DELETED_FLAG)]
+    tombstones = [row for row in rows if row.get(DELETED_FLAG)]
+
+    if validator is not None:
+        live = validator.validate(live)
+    yield from live if change_detector is None else change_detector.filter(live)
+
+    if change_detector is not None:
+        change_detector.forget(row["id"] for row in tombstones)
+    yield from tombstones
+
+
+@dlt.source(name="shopify_webhooks")
+def shopify_webhook_source(rows: dict, change_detector=None, validator=None):
+    """
+    Merge resources for a batch of webhook rows.
+
+    Args:
+        rows: {table: [rows]} from ``rows_from_events`` (and ``drop_stale``)
+        change_detector: Product row hashes to check and update (pipelines/change_detection.py)
+        validator: Product contract; failing rows are held for quarantine (pipelines/validation.py)
+    """
+    if rows[PRODUCTS_TABLE]:
+        # Same table, key and column hints as the polling pipeline
+        yield dlt.resource(
+            _checked_products(rows[PRODUCTS_TABLE], change_detector, validator),
+            name="shopify_products",
+            table_name=PRODUCTS_TABLE,
+            write_disposition="merge",
+            primary_key="id",
+            columns=PRODUCT_COLUMNS,
+        )
+    if rows[ORDERS_TABLE]:
+        yield dlt.resource(
+            rows[ORDERS_TABLE],
+            name="shopify_orders",
+            table_name=ORDERS_TABLE,
+            write_disposition="merge",
+            primary_key="id",
+            columns=REST_COLUMNS,
+            max_table_nesting=0,  # line items, addresses, ... stay JSON
+        )
+    if rows[REFUNDS_TABLE]:
+        yield dlt.resource(
+            rows[REFUNDS_TABLE],
+            name="shopify_refunds",
+            table_name=REFUNDS_TABLE,
+            write_disposition="merge",
+            primary_key="id",
+            columns=REST_COLUMNS,
+            max_table_nesting=0,
+        )
@@ -1,9 +1,17 @@
 import dlt
 import requests
 import os
+import time
 
-def stripe_api_get(endpoint):
-    base_url = "https://api.stripe.com/v1"
+from pipelines import telemetry
+
+# Charges change after they are created (pending -> succeeded, refunds, disputes),
+# so each run re-reads this many days before the newest charge already loaded
+CHARGE_UPDATE_WINDOW_DAYS = float(os.getenv("STRIPE_CHARGE_UPDATE_WINDOW_DAYS", "3"))
+
+def stripe_api_get(endpoint, params=None):
+    # STRIPE_API_BASE points the pipeline at another endpoint (e.g. benchmarks/fake_api_server.py)
+    base_url = os.getenv("STRIPE_API_BASE", "https://api.stripe.com/v1")
     api_key = os.getenv("STRIPE_API_KEY")
 
     url = f"{base_url}/{endpoint}"
@@ -11,34 +19,51 @@ def stripe_api_get(endpoint):
         "Authorization": f"Bearer {api_key}"
     }
 
-    response = requests.get(url, headers=headers)
+    started = time.perf_counter()
+    response = requests.get(url, headers=headers, params=params)
+    telemetry.active().record_request(time.perf_counter() - started, ok=response.ok)
     response.raise_for_status()
     return response.json()
 
 
-@dlt.resource(name="stripe_customers", write_disposition="replace")
+def stripe_list_all(endpoint, page_size=100, params=None):
+    """Yield every object of a Stripe list endpoint (filtered by ``params``), following starting_after."""
+    params = {"limit": page_size, **(params or {})}
+    while True:
+        data = stripe_api_get(endpoint, params)
+        items = data.get("data", [])
+        yield from items
+
+        if not data.get("has_more") or not items:
+            break
+        params["starting_after"] = items[-1]["id"]
+
+
+@dlt.resource(name="stripe_customers", write_disposition="replace", parallelized=True)
 def get_customers():
-    data = stripe_api_get("customers")
-    for item in data.get("data", []):
-        yield item
+    yield from stripe_list_all("customers")
+
 
+@dlt.resource(name="stripe_charges", write_disposition="merge", primary_key="id", parallelized=True)
+def get_charges(created=dlt.sources.incremental("created", initial_value=0, lag=CHARGE_UPDATE_WINDOW_DAYS * 86400)):
+    """
+    Charges created since the last run (less the update window), merged on id.
 
-@dlt.resource(name="stripe_charges", write_disposition="replace")
-def get_charges():
-    data = stripe_api_get("charges")
-    for item in data.get("data", []):
-        yield item
+    A charge keeps its ``_dlt_load_id`` until it is loaded again, which is what
+    pipelines/reconcile_payments.py uses as its watermark.
+    """
+    yield from stripe_list_all("charges", params={"created[gte]": int(created.start_value)})
 
 
-@dlt.resource(name="stripe_invoices", write_disposition="replace")
+@dlt.resource(name="stripe_invoices", write_disposition="replace", parallelized=True)
 def get_invoices():
-    data = stripe_api_get("invoices")
-    for item in data.get("data", []):
-        yield item
+    yield from stripe_list_all("invoices")
 
 
 @dlt.source
 def stripe_source():
+    # The resources are parallelized, so EXTRACT__WORKERS threads page through
+    # customers, charges and invoices concurrently
     yield get_customers()
     yield get_charges()
     yield get_invoices()
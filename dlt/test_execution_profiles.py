@@ -0,0 +1,47 @@
+"""
+Tests for the execution profiles.
+
+Run from the dlt directory:
+    python -m pytest test_execution_profiles.py
+"""
+
+import os
+
+import pytest
+
+from pipelines import execution_profiles
+from pipelines.execution_profiles import DLT_ENV, PROFILES, apply_profile
+
+
+@pytest.fixture(autouse=True)
+def clean_env(monkeypatch):
+    for env_var in DLT_ENV.values():
+        monkeypatch.delenv(env_var, raising=False)
+    monkeypatch.setattr(execution_profiles, "_exported", {})
+
+
+def test_profile_is_exported():
+    effective = apply_profile({"profile": "small", **PROFILES["small"]})
+
+    assert effective["env_overrides"] == []
+    assert effective["normalize_workers"] == PROFILES["small"]["normalize_workers"]
+
+
+def test_later_profile_replaces_an_earlier_one():
+    apply_profile({"profile": "small", **PROFILES["small"]})
+    effective = apply_profile({"profile": "backfill", **PROFILES["backfill"]})
+
+    assert effective["env_overrides"] == []
+    assert effective["normalize_workers"] == PROFILES["backfill"]["normalize_workers"]
+    for key, env_var in DLT_ENV.items():
+        assert os.environ[env_var] == str(PROFILES["backfill"][key])
+
+
+def test_user_setting_wins_over_every_profile(monkeypatch):
+    apply_profile({"profile": "small", **PROFILES["small"]})
+    monkeypatch.setenv("NORMALIZE__WORKERS", "3")
+
+    for name in ("large", "backfill"):
+        effective = apply_profile({"profile": name, **PROFILES[name]})
+        assert effective["env_overrides"] == ["NORMALIZE__WORKERS"]
+        assert effective["normalize_workers"] == "3"
@@ -0,0 +1,111 @@
+"""
+Tests for the post-load table maintenance on small DuckDB files.
+
+Run from the dlt directory:
+    python -m pytest test_maintain_tables.py
+"""
+
+import duckdb
+import pytest
+
+from pipelines.maintain_tables import TableMaintainer, hot_tables, maintain
+from sources.shopify_source import PRODUCT_STATUSES
+
+ROWS = 300_000
+
+
+@pytest.fixture
+def con(tmp_path):
+    con = duckdb.connect(str(tmp_path / "data.duckdb"))
+    con.execute("CREATE SCHEMA shopify")
+    yield con
+    con.close()
+
+
+def _create_products(con, order_by: str):
+    con.execute(f"""
+        CREATE TABLE shopify.products AS
+        SELECT 'gid://shopify/Product/' || i AS id,
+               TIMESTAMPTZ '2025-01-01' + to_seconds(i * 60) AS updated_at,
+               {list(PRODUCT_STATUSES)}[1 + i % 4] AS status,
+               md5(i::VARCHAR) AS title
+        FROM range({ROWS}) r(i) ORDER BY {order_by}
+    """)
+
+
+def _merge(con, first_id: int, count: int):
+    """What a dlt merge does: delete the old versions in place, append the new ones."""
+    con.execute(f"DELETE FROM shopify.products WHERE id IN "
+                f"(SELECT 'gid://shopify/Product/' || i FROM range({first_id}, {first_id + count}) r(i))")
+    con.execute(f"""
+        INSERT INTO shopify.products
+        SELECT 'gid://shopify/Product/' || i, TIMESTAMPTZ '2026-01-01' + to_seconds(hash(i) % 86400), 'ACTIVE', 'new'
+        FROM range({first_id}, {first_id + count}) r(i)
+    """)
+
+
+def test_sort_reduces_row_groups_read(con):
+    _create_products(con, "hash(i)")
+    maintainer = TableMaintainer(con, "shopify.products", "updated_at", {"status": PRODUCT_STATUSES})
+
+    report = maintainer.run()
+
+    assert not report["was_sorted"]
+    assert report["rows_rewritten"] == ROWS
+    assert report["enum_columns"] == ["status"]
+    assert report["row_groups_read_before"] == report["row_groups_before"]
+    assert report["row_groups_read_after"] == 1
+    assert report["file_bytes_after"] > 0
+    assert maintainer.unsorted_from() is None
+
+
+def test_only_the_merged_tail_is_rewritten(con):
+    _create_products(con, "i")
+    maintainer = TableMaintainer(con, "shopify.products", "updated_at")
+    assert maintainer.run()["rows_rewritten"] == 0
+
+    _merge(con, first_id=1000, count=500)
+    report = maintainer.run()
+
+    assert report["rows_rewritten"] == 500
+    assert maintainer.unsorted_from() is None
+    assert con.execute("SELECT count(*) FROM shopify.products").fetchone() == (ROWS,)
+    assert maintainer.run()["rows_rewritten"] == 0
+
+
+def test_stored_rows_newer_than_the_tail_move_too(con):
+    _create_products(con, "i")
+    con.execute("INSERT INTO shopify.products VALUES ('late', TIMESTAMPTZ '2025-01-01', 'ACTIVE', 'late')")
+    maintainer = TableMaintainer(con, "shopify.products", "updated_at")
+
+    assert maintainer.run()["rows_rewritten"] == ROWS
+    assert con.execute("SELECT id FROM shopify.products ORDER BY rowid LIMIT 2").fetchall() == [
+        ("gid://shopify/Product/0",), ("late",)
+    ]
+
+
+def test_only_validated_domains_become_enums(con):
+    _create_products(con, "i")
+    con.execute("UPDATE shopify.products SET title = 'T' || (rowid % 3)")
+    maintainer = TableMaintainer(con, "shopify.products", "updated_at", {"status": ("ACTIVE", "ARCHIVED", "DRAFT")})
+
+    # UNLISTED is stored but not in the domain: the column stays text
+    report = maintainer.run()
+    assert report["enum_columns"] == []
+    assert sorted(report["enum_candidates"]) == ["status", "title"]
+    assert con.execute("SELECT data_type FROM duckdb_columns() WHERE column_name = 'status'").fetchone() == ("VARCHAR",)
+
+
+def test_hot_tables_take_the_dataset(tmp_path, monkeypatch, con):
+    monkeypatch.setenv("SHOPIFY_DATASET_NAME", "shopify_other")
+    assert hot_tables("shopify_shop_a")[0]["table"] == "shopify_shop_a.products"
+    assert hot_tables()[0]["table"] == "shopify_other.products"
+
+    _create_products(con, "i")
+    con.close()
+    monkeypatch.setenv("MAINTAIN_DLT_DB_PATH", str(tmp_path / "data.duckdb"))
+    monkeypatch.setenv("MAINTAIN_DBT_DB_PATH", str(tmp_path / "missing.duckdb"))
+
+    reports = maintain(dry_run=True, dataset_name="shopify")
+    assert [r["table"] for r in reports] == ["shopify.products"]
+    assert reports[0]["rows_rewritten"] == 0
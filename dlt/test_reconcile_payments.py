@@ -0,0 +1,196 @@
+"""
+Tests for the payment reconciliation.
+
+Run from the dlt directory:
+    python -m pytest test_reconcile_payments.py
+"""
+
+import sys
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+import dlt
+import duckdb
+import pytest
+
+BENCHMARKS_ROOT = Path(__file__).resolve().parent.parent / "benchmarks"
+if str(BENCHMARKS_ROOT) not in sys.path:
+    sys.path.append(str(BENCHMARKS_ROOT))
+
+import fake_api_server  # noqa: E402
+from pipelines.reconcile_payments import PaymentReconciler  # noqa: E402
+from sources.stripe_source import get_charges  # noqa: E402
+
+NOW = datetime.now(timezone.utc).replace(tzinfo=None, microsecond=0)
+
+
+@pytest.fixture
+def db_path(tmp_path, monkeypatch):
+    monkeypatch.delenv("RECONCILE_CHARGES_TABLE", raising=False)
+    monkeypatch.delenv("SHOPIFY_DATASET_NAME", raising=False)
+    db_path = str(tmp_path / "data.duckdb")
+    con = duckdb.connect(db_path)
+    con.execute("CREATE SCHEMA stripe_data")
+    con.execute("""
+        CREATE TABLE stripe_data.stripe_charges (
+            id VARCHAR, payment_intent VARCHAR, metadata__order_id VARCHAR, customer VARCHAR,
+            currency VARCHAR, amount BIGINT, created BIGINT, status VARCHAR, _dlt_load_id VARCHAR
+        )
+    """)
+    con.execute("CREATE SCHEMA store")
+    con.execute("CREATE TABLE store.customers (id INTEGER, stripe_customer_id VARCHAR, email VARCHAR)")
+    con.execute("""
+        CREATE TABLE store.transactions (
+            order_number VARCHAR, stripe_payment_intent_id VARCHAR, customer_id INTEGER, currency VARCHAR,
+            total_amount DECIMAL(18, 2), payment_status VARCHAR, created_at TIMESTAMP, updated_at TIMESTAMP
+        )
+    """)
+    con.execute("INSERT INTO store.customers VALUES (1, 'cus_1', 'a@example.com')")
+    con.close()
+    return db_path
+
+
+def _charge(db_path, charge_id, amount, created, loaded, payment_intent=None, order_id=None, customer="cus_1"):
+    con = duckdb.connect(db_path)
+    con.execute(
+        "INSERT INTO stripe_data.stripe_charges VALUES (?, ?, ?, ?, 'usd', ?, ?, 'succeeded', ?)",
+        [charge_id, payment_intent, order_id, customer, amount, int(created.replace(tzinfo=timezone.utc).timestamp()),
+         f"{loaded.replace(tzinfo=timezone.utc).timestamp():.6f}"],
+    )
+    con.close()
+
+
+def _order(db_path, order_number, total, created, updated=None, payment_intent=None):
+    con = duckdb.connect(db_path)
+    con.execute(
+        "INSERT INTO store.transactions VALUES (?, ?, 1, 'usd', ?, 'paid', ?, ?)",
+        [order_number, payment_intent, total, created, updated or created],
+    )
+    con.close()
+
+
+def _rows(db_path, sql):
+    con = duckdb.connect(db_path, read_only=True)
+    try:
+        return con.execute(sql).fetchall()
+    finally:
+        con.close()
+
+
+def _reconcile(db_path):
+    return PaymentReconciler(db_path, tolerance_hours=24, retry_days=30, postgres_url="").run()
+
+
+def test_match_rules(db_path):
+    _charge(db_path, "ch_1", 1000, NOW - timedelta(days=2), NOW, payment_intent="pi_1")
+    _order(db_path, "1001", 10, NOW - timedelta(days=5), payment_intent="pi_1")
+    _charge(db_path, "ch_2", 2000, NOW - timedelta(days=2), NOW, order_id="1002")
+    _order(db_path, "1002", 20, NOW - timedelta(days=9))
+    _charge(db_path, "ch_3", 3000, NOW - timedelta(hours=30), NOW)
+    _order(db_path, "1003", 30, NOW - timedelta(hours=26))
+
+    stats = _reconcile(db_path)
+
+    assert stats["matched"] == {"payment_reference": 1, "order_reference": 1, "customer_amount": 1}
+    assert _rows(db_path, "SELECT charge_id, order_id, match_rule FROM reconciliation.matches ORDER BY 1") == [
+        ("ch_1", "store:1001", "payment_reference"),
+        ("ch_2", "store:1002", "order_reference"),
+        ("ch_3", "store:1003", "customer_amount"),
+    ]
+    assert stats["new_exceptions"] == 0
+
+
+def test_late_and_changed_rows_are_read(db_path):
+    _charge(db_path, "ch_new", 500, NOW - timedelta(hours=1), NOW - timedelta(minutes=50))
+    _order(db_path, "2000", 5, NOW - timedelta(hours=1))
+    assert _reconcile(db_path)["matched"]["customer_amount"] == 1
+
+    # Loaded after the last run, but paid long before its watermark
+    _charge(db_path, "ch_late", 700, NOW - timedelta(days=3), NOW, payment_intent="pi_late")
+    # Created long ago, only now marked as paid with its payment intent
+    _order(db_path, "2001", 7, NOW - timedelta(days=3), updated=NOW, payment_intent="pi_late")
+
+    stats = _reconcile(db_path)
+    assert (stats["new_charges"], stats["new_orders"]) == (1, 1)
+    assert stats["matched"]["payment_reference"] == 1
+
+    # Nothing new: nothing to read
+    stats = _reconcile(db_path)
+    assert (stats["new_charges"], stats["new_orders"]) == (0, 0)
+
+
+def test_exceptions_are_resolved_by_later_matches(db_path):
+    _charge(db_path, "ch_old", 900, NOW - timedelta(days=3), NOW - timedelta(days=3))
+    _charge(db_path, "ch_recent", 800, NOW - timedelta(hours=2), NOW - timedelta(hours=2))
+
+    stats = _reconcile(db_path)
+    assert stats["new_exceptions"] == 1
+    assert _rows(db_path, "SELECT ref FROM reconciliation.exceptions") == [("ch_old",)]
+    assert _rows(db_path, "SELECT ref FROM reconciliation._pending") == [("ch_recent",)]
+
+    # Both orders arrive later, with created_at near their charges
+    _order(db_path, "3000", 9, NOW - timedelta(days=3, hours=1), updated=NOW)
+    _order(db_path, "3001", 8, NOW - timedelta(hours=3), updated=NOW)
+
+    stats = _reconcile(db_path)
+    assert stats["matched"]["customer_amount"] == 2
+    assert stats["resolved_exceptions"] == 1
+    assert _rows(db_path, "SELECT ref FROM reconciliation.exceptions WHERE resolved_at IS NOT NULL") == [("ch_old",)]
+    assert _rows(db_path, "SELECT count(*) FROM reconciliation._pending") == [(0,)]
+    assert stats["open_exceptions"] == {}
+
+
+
+def test_every_shop_dataset_is_reconciled(db_path):
+    con = duckdb.connect(db_path)
+    for number, shop in enumerate(("shop_a", "shop_b"), start=1):
+        con.execute(f"CREATE SCHEMA shopify_{shop}")
+        con.execute(f"""
+            CREATE TABLE shopify_{shop}.orders (
+                id BIGINT, name VARCHAR, email VARCHAR, currency VARCHAR, total_price DECIMAL(18, 2),
+                created_at TIMESTAMP, financial_status VARCHAR, _dlt_load_id VARCHAR
+            )
+        """)
+        con.execute(f"INSERT INTO shopify_{shop}.orders VALUES (?, ?, 'a@example.com', 'usd', 10, ?, 'paid', ?)",
+                    [number, f"#{shop}-{number}", NOW - timedelta(hours=2), f"{NOW.timestamp():.6f}"])
+    con.close()
+    _charge(db_path, "ch_a", 1000, NOW - timedelta(hours=2), NOW, order_id="#shop_a-1")
+    _charge(db_path, "ch_b", 1000, NOW - timedelta(hours=2), NOW, order_id="#shop_b-2")
+
+    stats = PaymentReconciler(db_path, postgres_url="", shopify_datasets=["shopify_shop_a", "shopify_shop_b"]).run()
+
+    assert stats["matched"]["order_reference"] == 2
+    assert _rows(db_path, "SELECT charge_id, order_id, order_source FROM reconciliation.matches ORDER BY 1") == [
+        ("ch_a", "shopify_shop_a:1", "shopify_shop_a"),
+        ("ch_b", "shopify_shop_b:2", "shopify_shop_b"),
+    ]
+
+
+def test_reloading_stripe_charges_does_not_reread_history(db_path, tmp_path, monkeypatch):
+    server, base_url = fake_api_server.start_in_thread(products=0, customers=5, charges=200, invoices=0)
+    monkeypatch.setenv("STRIPE_API_BASE", f"{base_url}/v1")
+    monkeypatch.setenv("DLT_DATA_DIR", str(tmp_path / "dlt"))
+    monkeypatch.setenv("RECONCILE_CHARGES_TABLE", "stripe_live.stripe_charges")
+    pipeline = dlt.pipeline(pipeline_name="stripe_reload", destination=dlt.destinations.duckdb(db_path),
+                            dataset_name="stripe_live")
+    succeeded = "FROM stripe_live.stripe_charges WHERE status = 'succeeded'"
+    try:
+        pipeline.run(get_charges())
+        assert _reconcile(db_path)["new_charges"] == _rows(db_path, f"SELECT count(*) {succeeded}")[0][0]
+
+        # The next Stripe run reloads only the charges inside the update window
+        pipeline.run(get_charges())
+    finally:
+        server.shutdown()
+        server.server_close()
+    assert _rows(db_path, "SELECT count(*), count(DISTINCT id) FROM stripe_live.stripe_charges") == [(200, 200)]
+    reloaded = _rows(db_path, f"""
+        SELECT count(*) {succeeded}
+        AND _dlt_load_id = (SELECT max(_dlt_load_id) FROM stripe_live.stripe_charges)
+    """)[0][0]
+    assert reloaded < _rows(db_path, f"SELECT count(*) {succeeded}")[0][0]
+
+    # The reloaded charges are unmatched exceptions past the retry window: nothing to re-check
+    stats = _reconcile(db_path)
+    assert stats["new_charges"] == 0
+    assert stats["open_exceptions"] == {"unmatched_charge": _rows(db_path, f"SELECT count(*) {succeeded}")[0][0]}
@@ -0,0 +1,109 @@
+"""
+Tests for the Shopify products pipeline against benchmarks/fake_api_server.py.
+
+Run from the dlt directory:
+    python -m pytest test_run_shopify_pipeline.py
+"""
+
+import sys
+from pathlib import Path
+
+import duckdb
+import pytest
+
+BENCHMARKS_ROOT = Path(__file__).resolve().parent.parent / "benchmarks"
+if str(BENCHMARKS_ROOT) not in sys.path:
+    sys.path.append(str(BENCHMARKS_ROOT))
+
+import fake_api_server  # noqa: E402
+from pipelines import run_shopify_pipeline  # noqa: E402
+
+PRODUCTS = 30
+
+
+@pytest.fixture
+def api(monkeypatch):
+    server, base_url = fake_api_server.start_in_thread(products=PRODUCTS)
+    monkeypatch.setenv("SHOPIFY_API_URL", f"{base_url}/admin/api/2025-07/graphql.json")
+    yield server.RequestHandlerClass.state
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def db_path(tmp_path, monkeypatch, api):
+    monkeypatch.setenv("DLT_DATA_DIR", str(tmp_path / "dlt"))
+    monkeypatch.setenv("PIPELINE_TELEMETRY_DIR", str(tmp_path / "telemetry"))
+    monkeypatch.setenv("PIPELINE_EXECUTION_PROFILE", "small")
+    monkeypatch.delenv("SHOPIFY_DATASET_NAME", raising=False)
+    monkeypatch.delenv("SHOPIFY_PRODUCT_FIELDS", raising=False)
+    db_path = str(tmp_path / "data.duckdb")
+    monkeypatch.setattr(run_shopify_pipeline, "DB_PATH", db_path)
+    return db_path
+
+
+def _query(db_path: str, sql: str):
+    con = duckdb.connect(db_path, read_only=True)
+    try:
+        return con.execute(sql).fetchall()
+    finally:
+        con.close()
+
+
+def test_projection_leaves_the_full_table_alone(db_path, monkeypatch):
+    assert run_shopify_pipeline.run() == ["products"]
+    full = _query(db_path, "SELECT * FROM shopify.products ORDER BY id")
+    hashes = _query(db_path, "SELECT * FROM shopify._row_hashes ORDER BY row_id")
+    assert len(full) == PRODUCTS and len(hashes) == PRODUCTS
+
+    monkeypatch.setenv("SHOPIFY_PRODUCT_FIELDS", "title")
+    for _ in range(2):
+        # Not a change of the dbt sources
+        assert run_shopify_pipeline.run() == []
+
+    # Full rows and their hashes are untouched
+    assert _query(db_path, "SELECT * FROM shopify.products ORDER BY id") == full
+    assert _query(db_path, "SELECT * FROM shopify._row_hashes ORDER BY row_id") == hashes
+
+    # The projection is a replaced snapshot of its own, without hashes or tombstones
+    assert _query(db_path, "SELECT COUNT(*), COUNT(title), COUNT(vendor) FROM shopify_projection.products") == [
+        (PRODUCTS, PRODUCTS, 0)
+    ]
+    assert _query(db_path, """
+        SELECT COUNT(*) FROM information_schema.tables
+        WHERE table_schema = 'shopify_projection' AND table_name = '_row_hashes'
+    """) == [(0,)]
+
+
+def test_replaced_table_is_reloaded(db_path):
+    assert run_shopify_pipeline.run() == ["products"]
+    full = _query(db_path, "SELECT id, title FROM shopify.products ORDER BY id")
+
+    # What the debug branch does: drop the table and write synthetic rows, leaving the hashes
+    con = duckdb.connect(db_path)
+    try:
+        con.execute("CREATE TEMP TABLE synthetic AS SELECT * FROM shopify.products LIMIT 1")
+        con.execute("UPDATE synthetic SET id = 'gid://shopify/Product/synthetic', title = 'Synthetic'")
+        con.execute("DROP TABLE shopify.products")
+        con.execute("CREATE TABLE shopify.products AS SELECT * FROM synthetic")
+    finally:
+        con.close()
+
+    assert run_shopify_pipeline.run() == ["products"]
+    assert _query(db_path, "SELECT id, title FROM shopify.products ORDER BY id") == full
+    assert _query(db_path, "SELECT COUNT(*) FROM shopify._row_hashes") == [(PRODUCTS,)]
+    assert run_shopify_pipeline.run() == []
+
+
+def test_telemetry_is_named_after_the_dataset(db_path, tmp_path):
+    assert run_shopify_pipeline.run(dataset_name="shopify_shop_a") == ["products"]
+
+    prom = (tmp_path / "telemetry" / "shopify_shop_a.prom").read_text()
+    assert 'pipeline="shopify_shop_a"' in prom
+    assert not (tmp_path / "telemetry" / "shopify.prom").exists()
+
+
+def test_pages_are_sized_to_the_throttle_bucket(db_path, api):
+    assert run_shopify_pipeline.run() == ["products"]
+    # Every page fit in the bucket when it was sent
+    assert api.stats()["throttled"] == 0
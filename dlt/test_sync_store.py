@@ -0,0 +1,93 @@
+"""
+Tests for the store sync, with a DuckDB file standing in for the store Postgres database.
+
+Run from the dlt directory:
+    python -m pytest test_sync_store.py
+"""
+
+import duckdb
+import pytest
+
+from pipelines.sync_store import StoreSync
+
+
+class DuckDBStoreSync(StoreSync):
+    """Attaches a DuckDB file as ``pg`` instead of Postgres."""
+
+    def _attach_source(self, con):
+        con.execute(f"ATTACH '{self.postgres_url}' AS pg (READ_ONLY)")
+
+
+@pytest.fixture
+def paths(tmp_path):
+    store_path = str(tmp_path / "store.duckdb")
+    con = duckdb.connect(store_path)
+    con.execute("CREATE SCHEMA public")
+    con.execute("CREATE TABLE public.customers (id INTEGER, email VARCHAR, updated_at TIMESTAMP)")
+    con.execute("""
+        INSERT INTO public.customers VALUES
+            (1, 'a@example.com', TIMESTAMP '2025-07-01 10:00:00'),
+            (2, 'b@example.com', TIMESTAMP '2025-07-02 10:00:00')
+    """)
+    con.close()
+    return store_path, str(tmp_path / "data.duckdb")
+
+
+def _store(store_path, sql):
+    con = duckdb.connect(store_path)
+    con.execute(sql)
+    con.close()
+
+
+def _rows(db_path, sql):
+    con = duckdb.connect(db_path, read_only=True)
+    try:
+        return con.execute(sql).fetchall()
+    finally:
+        con.close()
+
+
+def _sync(store_path, db_path):
+    return {r["table"]: r for r in DuckDBStoreSync(db_path, store_path, workers=2).run()}
+
+
+def test_requires_store_database_url(monkeypatch):
+    monkeypatch.delenv("STORE_DATABASE_URL", raising=False)
+    monkeypatch.setenv("DATABASE_URL", "postgresql://stripe-destination")
+
+    with pytest.raises(ValueError, match="STORE_DATABASE_URL"):
+        StoreSync("unused.duckdb")
+
+
+def test_incremental_sync_copies_changed_rows(paths):
+    store_path, db_path = paths
+    assert _sync(store_path, db_path)["customers"]["mode"] == "full"
+
+    _store(store_path, """
+        UPDATE public.customers SET email = 'b@new.example.com', updated_at = TIMESTAMP '2025-07-03 10:00:00' WHERE id = 2;
+        INSERT INTO public.customers VALUES (3, 'c@example.com', TIMESTAMP '2025-07-03 11:00:00');
+    """)
+    result = _sync(store_path, db_path)["customers"]
+
+    assert result["mode"] == "incremental"
+    # >= the watermark: the updated row, the new one and nothing older
+    assert result["rows"] == 2
+    assert _rows(db_path, "SELECT id, email FROM store.customers ORDER BY id") == [
+        (1, "a@example.com"), (2, "b@new.example.com"), (3, "c@example.com"),
+    ]
+    assert _rows(db_path, "SELECT watermark FROM store._sync_state WHERE table_name = 'customers'")[0][0].day == 3
+
+
+def test_columns_added_in_the_source_are_added(paths):
+    store_path, db_path = paths
+    _sync(store_path, db_path)
+
+    _store(store_path, """
+        ALTER TABLE public.customers ADD COLUMN stripe_customer_id VARCHAR;
+        INSERT INTO public.customers VALUES (3, 'c@example.com', TIMESTAMP '2025-07-03 11:00:00', 'cus_3');
+    """)
+    assert _sync(store_path, db_path)["customers"]["mode"] == "incremental"
+
+    assert _rows(db_path, "SELECT id, stripe_customer_id FROM store.customers ORDER BY id") == [
+        (1, None), (2, None), (3, "cus_3"),
+    ]
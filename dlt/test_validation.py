@@ -0,0 +1,109 @@
+"""
+Tests for the in-process validation of extracted products (pipelines/validation.py).
+
+Run from the dlt directory:
+    python -m pytest test_validation.py
+"""
+
+import duckdb
+import pytest
+
+from pipelines.change_detection import ChangeDetector
+from pipelines.validation import QUARANTINE_TABLE, BatchValidator, build_contract
+from sources.shopify_source import PRODUCT_COLUMNS, PRODUCT_DBT_MODEL, PRODUCT_RULES
+
+
+def _product(product_id="gid://shopify/Product/1", **overrides) -> dict:
+    product = {
+        "id": product_id,
+        "title": "Snowboard",
+        "createdAt": "2025-07-01T12:00:00Z",
+        "updatedAt": "2025-07-02T12:00:00Z",
+        "status": "ACTIVE",
+        "variants": {"edges": [{"node": {"price": "49.95", "compareAtPrice": None}}]},
+    }
+    product.update(overrides)
+    return product
+
+
+@pytest.fixture
+def validator():
+    return BatchValidator("products", build_contract(PRODUCT_COLUMNS, PRODUCT_DBT_MODEL, PRODUCT_RULES))
+
+
+def _failures(validator: BatchValidator) -> dict:
+    return {row_id: failures for row_id, failures, _ in validator.quarantined}
+
+
+def test_bad_rows_are_quarantined(validator):
+    rows = [
+        _product("gid://shopify/Product/1"),
+        _product(None),
+        _product("gid://shopify/Product/3", createdAt="not a date"),
+        _product("gid://shopify/Product/4", variants={"edges": [{"node": {"price": "-5.00"}}]}),
+        _product("gid://shopify/Product/5", status="RETIRED"),
+    ]
+
+    assert [row["id"] for row in validator.validate(rows)] == ["gid://shopify/Product/1"]
+    assert _failures(validator) == {
+        None: ["not_null:id"],
+        "gid://shopify/Product/3": ["timestamp:createdAt"],
+        "gid://shopify/Product/4": ["non_negative:variants.edges.node.price"],
+        "gid://shopify/Product/5": ["accepted_values:status"],
+    }
+    assert validator.stats["checked"] == 5
+    assert validator.stats["passed"] == 1
+    assert validator.quarantined_ids == {f"gid://shopify/Product/{n}" for n in (3, 4, 5)}
+
+
+def test_duplicate_ids_are_caught_across_batches(validator):
+    rows = [_product("gid://shopify/Product/1"), _product("gid://shopify/Product/2"),
+            _product("gid://shopify/Product/1", title="Again")]
+
+    passed = list(validator.validate(rows, batch_size=2))
+
+    assert [row["title"] for row in passed] == ["Snowboard", "Snowboard"]
+    assert _failures(validator) == {"gid://shopify/Product/1": ["unique:id"]}
+
+
+def test_quarantine_is_written_on_commit(validator, tmp_path):
+    db_path = str(tmp_path / "data.duckdb")
+    list(validator.validate([_product(status="RETIRED")]))
+    validator.commit(db_path, "shopify")
+
+    con = duckdb.connect(db_path, read_only=True)
+    try:
+        assert con.execute(f"SELECT table_name, row_id, failures FROM shopify.{QUARANTINE_TABLE}").fetchall() == [
+            ("products", "gid://shopify/Product/1", ["accepted_values:status"])
+        ]
+    finally:
+        con.close()
+
+
+def test_keep_spares_quarantined_rows_from_tombstones(validator, tmp_path):
+    db_path = str(tmp_path / "data.duckdb")
+    loaded = [_product(f"gid://shopify/Product/{n}") for n in (1, 2, 3)]
+    con = duckdb.connect(db_path)
+    try:
+        con.execute("CREATE SCHEMA shopify")
+        con.execute("CREATE TABLE shopify.products (id VARCHAR)")
+        con.executemany("INSERT INTO shopify.products VALUES (?)", [[row["id"]] for row in loaded])
+    finally:
+        con.close()
+    first = ChangeDetector(db_path, "shopify", "products")
+    list(first.filter(loaded))
+    first.commit()
+
+    # Product 2 now fails validation and product 3 is gone
+    extracted = [loaded[0], _product("gid://shopify/Product/2", status="RETIRED")]
+    detector = ChangeDetector(db_path, "shopify", "products")
+    assert list(detector.filter(validator.validate(extracted))) == []
+    detector.keep(validator.quarantined_ids)
+
+    assert [t["id"] for t in detector.deletions()] == ["gid://shopify/Product/3"]
+    assert detector.stats == {"inserted": 0, "updated": 0, "deleted": 1, "unchanged": 2}
+
+    # Without keep() the quarantined product would be deleted
+    detector = ChangeDetector(db_path, "shopify", "products")
+    list(detector.filter([loaded[0]]))
+    assert sorted(t["id"] for t in detector.deletions()) == ["gid://shopify/Product/2", "gid://shopify/Product/3"]
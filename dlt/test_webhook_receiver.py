@@ -0,0 +1,213 @@
+"""
+Tests for the webhook receiver: replays samples/webhooks against a live receiver.
+
+Run from the dlt directory:
+    python -m pytest test_webhook_receiver.py
+"""
+
+import copy
+import json
+import subprocess
+import sys
+import threading
+from pathlib import Path
+
+import duckdb
+import pytest
+import requests
+
+from pipelines.webhook_receiver import EventLog, StagingStore, WebhookReceiver, make_server, merge_staged, replay, sign
+
+SAMPLES = sorted(str(p) for p in (Path(__file__).resolve().parent / "samples" / "webhooks").glob("*.json"))
+SECRET = "test-secret"
+
+
+@pytest.fixture
+def receiver(tmp_path):
+    receiver = WebhookReceiver(SECRET, EventLog(tmp_path / "events.jsonl", fsync=False),
+                               staging=StagingStore(tmp_path / "webhooks.duckdb"))
+    yield receiver
+    receiver.log.close()
+
+
+@pytest.fixture
+def url(receiver):
+    server = make_server(receiver, port=0)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}/webhooks/shopify"
+    server.shutdown()
+    server.server_close()
+
+
+def _sample(topic: str) -> dict:
+    for path in SAMPLES:
+        event = json.loads(Path(path).read_text())
+        if event["topic"] == topic:
+            return copy.deepcopy(event["payload"])
+    raise KeyError(topic)
+
+
+def _headers(body: bytes, topic: str, webhook_id: str) -> dict:
+    return {"X-Shopify-Topic": topic, "X-Shopify-Hmac-Sha256": sign(body, SECRET), "X-Shopify-Webhook-Id": webhook_id}
+
+
+def test_replay_is_logged_and_staged(receiver, url):
+    assert replay(SAMPLES, url, SECRET) == len(SAMPLES)
+    assert sum(receiver.metrics["received"].values()) == len(SAMPLES)
+
+    assert receiver.flush() == len(SAMPLES)
+    assert [e["topic"] for e in receiver.staging.events()] == [json.loads(Path(p).read_text())["topic"] for p in SAMPLES]
+    assert receiver.log.pending == []
+
+
+def test_bad_hmac_is_rejected(receiver, url):
+    with pytest.raises(requests.HTTPError) as error:
+        replay(SAMPLES, url, "wrong-secret")
+
+    assert error.value.response.status_code == 401
+    assert receiver.metrics["hmac_failures"] == 1
+    assert receiver.log.pending == []
+
+
+def test_redelivered_webhook_is_dropped(receiver):
+    body = json.dumps(_sample("orders/create")).encode("utf-8")
+    headers = _headers(body, "orders/create", "delivery-1")
+
+    assert receiver.receive(body, headers) == 200
+    assert receiver.receive(body, headers) == 200
+
+    assert receiver.metrics["duplicates"] == 1
+    assert len(receiver.log.pending) == 1
+
+
+def test_offset_recovery_after_crash(tmp_path):
+    log = EventLog(tmp_path / "events.jsonl", fsync=False)
+    staging = StagingStore(tmp_path / "webhooks.duckdb")
+    receiver = WebhookReceiver(SECRET, log, staging=staging)
+    for i, path in enumerate(SAMPLES):
+        event = json.loads(Path(path).read_text())
+        body = json.dumps(event["payload"]).encode("utf-8")
+        receiver.receive(body, _headers(body, event["topic"], f"delivery-{i}"))
+
+    # Crash after the batch was staged but before the offset was written,
+    # in the middle of appending another event
+    staging.stage(log.take())
+    log.close()
+    with open(log.path, "a") as f:
+        f.write('{"seq": 99, "topic": "orders/cr')
+
+    log = EventLog(tmp_path / "events.jsonl", fsync=False)
+    receiver = WebhookReceiver(SECRET, log, staging=staging)
+    assert [e["seq"] for e in log.pending] == [1, 2, 3]
+
+    # Re-staging the recovered events does not duplicate them
+    assert receiver.flush() == 3
+    assert [e["seq"] for e in staging.events()] == [1, 2, 3]
+    assert log.offset_path.read_text() == "3"
+    log.close()
+
+    # Redeliveries of recovered events are still recognised
+    log = EventLog(tmp_path / "events.jsonl", fsync=False)
+    assert log.pending == []
+    assert log.append("orders/create", {}, webhook_id="delivery-0") is None
+    log.close()
+
+
+def _stage(staging: StagingStore, *events):
+    staging.stage([
+        {"seq": seq, "webhook_id": None, "topic": topic, "triggered_at": None,
+         "received_at": "2025-07-15T14:00:00+00:00", "payload": payload}
+        for seq, (topic, payload) in enumerate(events, start=staging.last_seq() + 1)
+    ])
+
+
+def test_merge_skips_out_of_order_rows_and_checks_products(tmp_path, monkeypatch):
+    monkeypatch.setenv("DLT_DATA_DIR", str(tmp_path / "dlt"))
+    db_path = str(tmp_path / "data.duckdb")
+    staging = StagingStore(tmp_path / "webhooks.duckdb")
+
+    product = _sample("products/update")
+    order = _sample("orders/create")
+    _stage(staging, ("products/update", product), ("orders/create", order))
+    assert merge_staged(str(staging.path), db_path, "shopify") == ["products", "orders"]
+    assert staging.events() == []
+
+    # An older version delivered late, a product with an unknown status and a newer order
+    older = {**product, "title": "Old title", "updated_at": "2025-07-01T00:00:00-04:00"}
+    invalid = {**product, "id": 1, "admin_graphql_api_id": "gid://shopify/Product/1", "status": "retired"}
+    newer_order = {**order, "note": "gift", "updated_at": "2099-01-01T00:00:00Z"}
+    _stage(staging, ("products/update", older), ("products/update", invalid), ("orders/updated", newer_order))
+    assert merge_staged(str(staging.path), db_path, "shopify") == ["orders"]
+
+    con = duckdb.connect(db_path, read_only=True)
+    try:
+        assert con.execute("SELECT id, title FROM shopify.products").fetchall() == [
+            (product["admin_graphql_api_id"], product["title"])
+        ]
+        assert con.execute("SELECT note FROM shopify.orders").fetchall() == [("gift",)]
+        assert con.execute("SELECT row_id FROM shopify._quarantine").fetchall() == [("gid://shopify/Product/1",)]
+        assert con.execute("SELECT row_id FROM shopify._row_hashes").fetchall() == [
+            (product["admin_graphql_api_id"],)
+        ]
+    finally:
+        con.close()
+
+    # A delete removes the row and its hash
+    _stage(staging, ("products/delete", {"id": product["id"]}))
+    assert merge_staged(str(staging.path), db_path, "shopify") == ["products"]
+
+    con = duckdb.connect(db_path, read_only=True)
+    try:
+        assert con.execute("SELECT COUNT(*) FROM shopify.products").fetchone() == (0,)
+        assert con.execute("SELECT COUNT(*) FROM shopify._row_hashes").fetchone() == (0,)
+    finally:
+        con.close()
+
+
+def test_receiver_merges_into_data_duckdb_and_retries_while_locked(tmp_path, monkeypatch):
+    monkeypatch.setenv("DLT_DATA_DIR", str(tmp_path / "dlt"))
+    db_path = str(tmp_path / "data.duckdb")
+    receiver = WebhookReceiver(SECRET, EventLog(tmp_path / "events.jsonl", fsync=False),
+                               staging=StagingStore(tmp_path / "webhooks.duckdb", lock_timeout=1),
+                               db_path=db_path, dataset_name="shopify")
+    order = _sample("orders/create")
+    receiver.log.append("orders/create", order, triggered_at="2025-07-15T14:00:00Z")
+    receiver.flush()
+    assert receiver.merge() == ["orders"]
+    assert receiver.metrics["merged"] == {"orders/create": 1}
+    assert receiver.metrics["lag_seconds"]["orders/create"] >= receiver.metrics["staged_lag_seconds"]["orders/create"]
+    assert receiver.oldest_unmerged_seconds() == 0.0
+
+    # Another run holds the write lock: the events stay staged until the next tick
+    holder = subprocess.Popen(
+        [sys.executable, "-c", f"import duckdb, sys; con = duckdb.connect({db_path!r}); print('locked', flush=True); sys.stdin.read()"],
+        stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True,
+    )
+    try:
+        assert holder.stdout.readline().strip() == "locked"
+        receiver.log.append("orders/updated", {**order, "note": "gift", "updated_at": "2099-01-01T00:00:00Z"})
+        receiver.flush()
+        assert receiver.merge() == []
+        assert receiver.metrics["merge_lock_waits"] == 1
+        assert receiver.metrics["merge_failures"] == 0
+        assert len(receiver.staging.events()) == 1
+        assert receiver.oldest_unmerged_seconds() > 0
+    finally:
+        holder.communicate("")
+
+    assert receiver.merge() == ["orders"]
+    assert receiver.staging.events() == []
+    assert receiver.metrics["merges"] == 2
+    assert "webhook_lag_seconds{topic=\"orders/create\"}" in receiver.to_openmetrics()
+
+    # The DAG collects the changed tables once
+    assert receiver.staging.take_changes() == ["orders"]
+    assert receiver.staging.take_changes() == []
+
+    con = duckdb.connect(db_path, read_only=True)
+    try:
+        assert con.execute("SELECT note FROM shopify.orders").fetchall() == [("gift",)]
+    finally:
+        con.close()
+    receiver.log.close()
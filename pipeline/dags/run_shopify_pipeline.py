@@ -21,10 +21,13 @@ def main():
         print(f"🐍 Python path: {sys.path}")
         
         # Import and run the DLT pipeline
-        from pipelines.run_shopify_pipeline import run
+        from pipelines.run_shopify_pipeline import resolve_dataset, run
+        from pipelines.telemetry import push_metrics
         
         print("📦 DLT pipeline imported successfully")
         run()
+        # The pod gets the shop's dataset as SHOPIFY_DATASET_NAME
+        push_metrics(resolve_dataset())
         
         print("✅ Shopify DLT pipeline completed successfully in Kubernetes!")
         
@@ -4,12 +4,14 @@ from pathlib import Path
 import os
 import sys
 
+# Only Airflow core is imported at parse time. The Kubernetes provider, dlt, SDV
+# and the pipeline modules are imported inside the tasks so the scheduler's parse
+# loop stays fast (see pipeline/test_dag_parse.py).
 from airflow import DAG
-from airflow.operators.python import PythonOperator
-from airflow.operators.bash import BashOperator
+from airflow.datasets import Dataset
+from airflow.models.baseoperator import BaseOperator
+from airflow.operators.python import BranchPythonOperator, PythonOperator
 from airflow.operators.empty import EmptyOperator
-from airflow.providers.cncf.kubernetes.operators.pod import KubernetesPodOperator
-from kubernetes.client import models as k8s
 
 # --- Paths --------------------------------------------------------------------
 HERE = Path(__file__).resolve().parent
@@ -17,12 +19,6 @@ PIPELINE_ROOT = HERE.parent  # ../
 DATA_ROOT = PIPELINE_ROOT.parent  # ../../
 DLT_ROOT = HERE.parent.parent / "dlt"  # ../../dlt
 
-# Add project dirs to PYTHONPATH so imports work when Airflow parses the DAG
-for p in (PIPELINE_ROOT, DLT_ROOT):
-    p_str = str(p)
-    if p_str not in sys.path:
-        sys.path.append(p_str)
-
 # --- Config -------------------------------------------------------------------
 default_args = {
     "owner": "airflow",
@@ -34,124 +30,376 @@ default_args = {
     "retry_delay": timedelta(minutes=5),
 }
 
-# Execution mode flags
-DEBUG_MODE = True      # True -> generate dummy data with SDV; False -> run DLT pipeline
-K8_MODE = True       # True -> run in Kubernetes pod; False -> run locally
+# Execution mode defaults. Resolved when the DAG runs (not at parse time), in order:
+#   1. DAG run params:     {"debug_mode": false, "k8_mode": true}
+#   2. Airflow Variables:  shopify_debug_mode / shopify_k8_mode ("true" / "false")
+#   3. These defaults
+DEFAULT_DEBUG_MODE = True   # True -> generate dummy data with SDV; False -> run DLT pipeline
+DEFAULT_K8_MODE = True      # True -> run in Kubernetes pod; False -> run locally
+
+# Comma separated shop names; one DAG is generated per shop (a single
+# "shopify_products_dag" for the shop in SHOPIFY_SHOP_NAME when unset)
+SHOPS = [s.strip() for s in os.getenv("SHOPIFY_SHOPS", "").split(",") if s.strip()]
+
+# Profiling and execution profile switches forwarded to the Kubernetes pods
+# (local tasks inherit the worker env)
+PROFILE_ENV_VARS = ("PIPELINE_PROFILE", "PIPELINE_PROFILE_SAMPLE_RATE", "PIPELINE_PROFILE_DIR",
+                    "PIPELINE_EXECUTION_PROFILE")
+
+# Branch task ids, keyed by (debug_mode, k8_mode)
+MODE_TASKS = {
+    (True, False): "generate_dummy_data",
+    (False, False): "run_dlt_pipeline",
+    (True, True): "generate_dummy_data_k8",
+    (False, True): "run_dlt_pipeline_k8",
+}
+
+# --- Helpers ------------------------------------------------------------------
+def _add_project_paths():
+    """Make the pipeline and dlt code importable (called inside tasks, not at parse time)."""
+    for p in (PIPELINE_ROOT, DLT_ROOT):
+        p_str = str(p)
+        if p_str not in sys.path:
+            sys.path.append(p_str)
+
+def _shop_dataset(shop: str | None) -> str | None:
+    """Dataset a shop is loaded into (None: the default from the environment)."""
+    return f"shopify_{shop.replace('-', '_')}" if shop else None
+
+def _shop_env(shop: str | None) -> dict:
+    """Environment that points the pipeline pods at one shop and its own dataset."""
+    if not shop:
+        return {}
+    return {"SHOPIFY_SHOP_NAME": shop, "SHOPIFY_DATASET_NAME": _shop_dataset(shop)}
+
+def _shop_loaded(shop: str | None) -> Dataset:
+    """Airflow dataset updated when a shop's DAG run has finished writing data.duckdb."""
+    return Dataset(f"duckdb://data.duckdb/{_shop_dataset(shop) or 'shopify'}")
+
+def _shop_staging(shop: str | None) -> str | None:
+    """Staging file of the shop's webhook receiver (None: WEBHOOK_STAGING_DB_PATH, then webhooks.duckdb)."""
+    return str(DATA_ROOT / f"webhooks_{shop.replace('-', '_')}.duckdb") if shop else None
+
+def _flag(value, default: bool) -> bool:
+    if value is None or value == "":
+        return default
+    if isinstance(value, bool):
+        return value
+    return str(value).strip().lower() in ("1", "true", "yes", "on")
 
 # --- Callables ----------------------------------------------------------------
-def generate_dummy_data():
-    """Generate dummy Shopify product data using SDV."""
-    from synthetic_data_generator import generate_synthetic_data, save_synthetic_data_to_duckdb
+def choose_mode(params=None):
+    """Pick the branch for this run from params, then Variables, then the defaults."""
+    from airflow.models import Variable
+
+    params = params or {}
+    debug_mode = _flag(params.get("debug_mode"), _flag(Variable.get("shopify_debug_mode", default_var=None), DEFAULT_DEBUG_MODE))
+    k8_mode = _flag(params.get("k8_mode"), _flag(Variable.get("shopify_k8_mode", default_var=None), DEFAULT_K8_MODE))
+
+    print(f"🔀 debug_mode={debug_mode} k8_mode={k8_mode}")
 
+    # A warm synthetic worker replaces the cold debug pod (see pipeline/synthetic_worker.py)
+    if debug_mode and os.getenv("SYNTHETIC_WORKER_URL"):
+        print(f"♨️ Submitting to synthetic worker at {os.getenv('SYNTHETIC_WORKER_URL')}")
+        return MODE_TASKS[(True, False)]
+    return MODE_TASKS[(debug_mode, k8_mode)]
+
+def generate_dummy_data():
+    """Generate dummy Shopify product data using SDV (on the warm worker if SYNTHETIC_WORKER_URL is set)."""
+    _add_project_paths()
     tables = ["shopify.products"]
     db_path = str(DATA_ROOT / "data.duckdb")
 
-    synthetic_data = generate_synthetic_data(
-        tables=tables,
-        db_path=db_path,
-        num_rows=1000,
-    )
-
-    save_synthetic_data_to_duckdb(
-        synthetic_data=synthetic_data,
-        db_path=db_path,
-        replace_existing=True,
-    )
-    print("✅ Generated and saved synthetic Shopify products data")
+    worker_url = os.getenv("SYNTHETIC_WORKER_URL")
+    if worker_url:
+        from synthetic_worker import submit_job
 
-def run_dlt_pipeline():
-    """Run the DLT Shopify pipeline."""
-    from pipelines.run_shopify_pipeline import run
-    run()
+        # SYNTHETIC_WORKER_DB_PATH: the database path as mounted on the worker
+        result = submit_job(worker_url, tables, num_rows=1000,
+                            db_path=os.getenv("SYNTHETIC_WORKER_DB_PATH", db_path))
+        print(f"✅ Synthetic worker generated {result['rows']} (cached synthesizers: {result['cache_hits']})")
+        return
 
-# --- DAG ----------------------------------------------------------------------
-with DAG(
-    dag_id="shopify_products_dag",
-    description="Shopify products pipeline (debug uses SDV; prod runs DLT; k8 runs in Kubernetes)",
-    default_args=default_args,
-    schedule=timedelta(days=1),
-    catchup=False,
-    tags=["shopify", "dlt", "sdv", "kubernetes"],
-) as dag:
-
-    start = EmptyOperator(task_id="start")
-
-    if K8_MODE:
-        # Kubernetes mode: Run specific Python files in isolated pods
-        if DEBUG_MODE:
-            # K8 + Debug: Generate dummy data using synthetic_data_generator_k8.py
-            generate_data_k8 = KubernetesPodOperator(
-                task_id="generate_dummy_data_k8",
-                namespace="default",
-                image="python:3.11-slim",
-                cmds=["bash", "-c"],
-                arguments=[
-                    """
-                    pip install -r /opt/airflow/dags/../requirements.txt &&
-                    python /opt/airflow/dags/synthetic_data_generator_k8.py
-                    """
-                ],
-                volumes=[
-                    k8s.V1Volume(
-                        name="dags-volume",
-                        persistent_volume_claim=k8s.V1PersistentVolumeClaimVolumeSource(
-                            claim_name="airflow-dags-pvc"
-                        )
-                    )
-                ],
-                volume_mounts=[
-                    k8s.V1VolumeMount(
-                        name="dags-volume",
-                        mount_path="/opt/airflow/dags"
-                    )
-                ],
-                get_logs=True,
-                is_delete_operator_pod=True,
+    from synthetic_data_generator import generate_synthetic_data, save_synthetic_data_to_duckdb
+    from pipelines.profiling import profile_run, span
+
+    # Profiled when PIPELINE_PROFILE / PIPELINE_PROFILE_SAMPLE_RATE is set on the worker
+    with profile_run("synthetic"):
+        with span("generate"):
+            synthetic_data = generate_synthetic_data(
+                tables=tables,
+                db_path=db_path,
+                num_rows=1000,
             )
-            start >> generate_data_k8
-        else:
-            # K8 + Production: Run DLT pipeline using run_shopify_pipeline.py
-            run_pipeline_k8 = KubernetesPodOperator(
-                task_id="run_dlt_pipeline_k8",
-                namespace="default",
-                image="python:3.11-slim",
-                cmds=["bash", "-c"],
-                arguments=[
-                    """
-                    pip install -r /opt/airflow/dags/../requirements.txt &&
-                    python /opt/airflow/dags/run_shopify_pipeline.py
-                    """
-                ],
-                volumes=[
-                    k8s.V1Volume(
-                        name="dags-volume",
-                        persistent_volume_claim=k8s.V1PersistentVolumeClaimVolumeSource(
-                            claim_name="airflow-dags-pvc"
-                        )
-                    )
-                ],
-                volume_mounts=[
-                    k8s.V1VolumeMount(
-                        name="dags-volume",
-                        mount_path="/opt/airflow/dags"
-                    )
-                ],
-                get_logs=True,
-                is_delete_operator_pod=True,
+
+        with span("save"):
+            save_synthetic_data_to_duckdb(
+                synthetic_data=synthetic_data,
+                db_path=db_path,
+                replace_existing=True,
             )
-            start >> run_pipeline_k8
+    print("✅ Generated and saved synthetic Shopify products data")
+
+def run_dlt_pipeline(shop=None):
+    """Run the DLT Shopify pipeline. Returns the tables the load changed (pushed to XCom)."""
+    _add_project_paths()
+    from pipelines.run_shopify_pipeline import resolve_dataset, run
+    from pipelines.telemetry import push_metrics
+
+    # The shop is passed explicitly; the worker's environment is shared by later tasks
+    changed_tables = run(shop_name=shop, dataset_name=_shop_dataset(shop))
+    # No-op unless PROMETHEUS_PUSHGATEWAY_URL is set; the run's metrics are named after its dataset
+    push_metrics(resolve_dataset(_shop_dataset(shop)))
+    return changed_tables
+
+class K8ScriptOperator(BaseOperator):
+    """
+    Runs one of the dags/*_k8 scripts in an isolated Kubernetes pod.
+
+    The KubernetesPodOperator (and the Kubernetes client it pulls in) is only
+    built when the task executes, so parsing the DAG file does not import them.
+    The pod is deleted when the task finishes or is killed.
+    """
+
+    ui_color = "#e4f0e8"
+
+    def __init__(self, script: str, env_vars: dict = None, **kwargs):
+        super().__init__(**kwargs)
+        self.script = script
+        self.env_vars = env_vars or {}
+        self._pod_operator = None
+
+    def pod_operator(self):
+        from airflow.providers.cncf.kubernetes.operators.pod import KubernetesPodOperator
+        from kubernetes.client import models as k8s
+
+        return KubernetesPodOperator(
+            task_id=self.task_id,
+            namespace="default",
+            image="python:3.11-slim",
+            cmds=["bash", "-c"],
+            arguments=[
+                f"""
+                pip install -r /opt/airflow/dags/../requirements.txt &&
+                python /opt/airflow/dags/{self.script}
+                """
+            ],
+            volumes=[
+                k8s.V1Volume(
+                    name="dags-volume",
+                    persistent_volume_claim=k8s.V1PersistentVolumeClaimVolumeSource(
+                        claim_name="airflow-dags-pvc"
+                    )
+                )
+            ],
+            volume_mounts=[
+                k8s.V1VolumeMount(
+                    name="dags-volume",
+                    mount_path="/opt/airflow/dags"
+                )
+            ],
+            env_vars=self.env_vars,
+            get_logs=True,
+            on_finish_action="delete_pod",
+        )
+
+    def execute(self, context):
+        self._pod_operator = self.pod_operator()
+        return self._pod_operator.execute(context)
+
+    def on_kill(self):
+        if self._pod_operator is not None:
+            self._pod_operator.on_kill()
 
-    else:
-        # Local mode: Run in Airflow worker
-        if DEBUG_MODE:
-            generate_data = PythonOperator(
+def k8_pod_task(task_id: str, script: str, shop: str | None = None) -> K8ScriptOperator:
+    """
+    Task that runs one of the dags/*_k8 scripts in an isolated Kubernetes pod.
+
+    The pod gets the shop and the profiling / execution profile switches of the
+    scheduler environment as explicit env vars.
+    """
+    env_vars = {k: os.environ[k] for k in PROFILE_ENV_VARS if k in os.environ}
+    env_vars.update(_shop_env(shop))
+    return K8ScriptOperator(task_id=task_id, script=script, env_vars=env_vars)
+
+def collect_webhook_changes(shop=None):
+    """Tables the webhook receiver's merges changed since the last run. Returns them for dbt (XCom)."""
+    _add_project_paths()
+    from pipelines.webhook_receiver import StagingStore
+
+    return StagingStore(_shop_staging(shop)).take_changes()
+
+def run_changed_dbt_models(ti=None):
+    """Run only the dbt models downstream of source tables the load changed."""
+    _add_project_paths()
+    from dbt_incremental import run_changed_models
+
+    # Local prod mode and the webhook merges report the changed tables via XCom;
+    # fingerprint detection inside run_changed_models covers the other modes
+    reported = ti.xcom_pull(task_ids=["run_dlt_pipeline", "collect_webhook_changes"]) if ti else None
+    changed_tables = [table for tables in reported or [] if tables for table in tables]
+    run_changed_models(changed_tables=changed_tables)
+
+def run_stripe_pipeline():
+    """Load Stripe customers, charges and invoices into the DATABASE_URL Postgres (skips without STRIPE_API_KEY)."""
+    if not os.getenv("STRIPE_API_KEY"):
+        print("⏭️ STRIPE_API_KEY not set, skipping the Stripe load")
+        return
+    _add_project_paths()
+    from pipelines.run_stripe_pipeline import run
+
+    run()
+
+def sync_store_db():
+    """Copy new and updated rows of the store Postgres tables into store.* (skips without STORE_DATABASE_URL)."""
+    # DATABASE_URL is the Stripe destination, never the store
+    if not os.getenv("STORE_DATABASE_URL"):
+        print("⏭️ STORE_DATABASE_URL not set, skipping the store sync")
+        return
+    _add_project_paths()
+    from pipelines.sync_store import run
+
+    run(db_path=str(DATA_ROOT / "data.duckdb"))
+
+def reconcile_payments():
+    """Match newly loaded Stripe charges to store / Shopify orders of every shop (skips when the tables are missing)."""
+    _add_project_paths()
+    from pipelines.reconcile_payments import run
+
+    # None: the dataset of SHOPIFY_SHOP_NAME's single DAG
+    run(db_path=str(DATA_ROOT / "data.duckdb"), shopify_datasets=[_shop_dataset(shop) for shop in SHOPS] or None)
+
+def maintain_tables(shop=None):
+    """Sort the hot tables by time and ENUM-encode their validated closed-domain columns (skips missing tables)."""
+    _add_project_paths()
+    from pipelines.maintain_tables import run
+
+    run(dataset_name=_shop_dataset(shop))
+
+# --- DAG factory --------------------------------------------------------------
+def create_shopify_products_dag(dag_id: str, shop: str | None = None, schedule=timedelta(days=1)) -> DAG:
+    """
+    Build the Shopify products DAG for one shop.
+
+    Args:
+        dag_id: DAG id
+        shop: Shop name; None uses SHOPIFY_SHOP_NAME from the environment
+        schedule: Airflow schedule
+
+    Returns:
+        DAG: start -> choose_mode -> one of the four mode tasks -> collect_webhook_changes
+             -> run_changed_dbt_models -> maintain_tables (updates the shop's Airflow dataset)
+    """
+    with DAG(
+        dag_id=dag_id,
+        description="Shopify products pipeline (debug uses SDV; prod runs DLT; k8 runs in Kubernetes)",
+        default_args=default_args,
+        schedule=schedule,
+        catchup=False,
+        params={"debug_mode": None, "k8_mode": None},
+        tags=["shopify", "dlt", "sdv", "kubernetes"] + ([f"shop:{shop}"] if shop else []),
+    ) as dag:
+
+        start = EmptyOperator(task_id="start")
+
+        choose = BranchPythonOperator(
+            task_id="choose_mode",
+            python_callable=choose_mode,
+        )
+
+        mode_tasks = [
+            # Local debug: SDV in the Airflow worker
+            PythonOperator(
                 task_id="generate_dummy_data",
                 python_callable=generate_dummy_data,
-            )
-            start >> generate_data
-        else:
-            run_pipeline = PythonOperator(
+            ),
+            # Local production: DLT pipeline in the Airflow worker
+            PythonOperator(
                 task_id="run_dlt_pipeline",
                 python_callable=run_dlt_pipeline,
-            )
-            start >> run_pipeline
+                op_kwargs={"shop": shop},
+            ),
+            # K8 + debug: synthetic_data_generator_k8.py in a pod
+            k8_pod_task("generate_dummy_data_k8", "synthetic_data_generator_k8.py", shop),
+            # K8 + production: run_shopify_pipeline.py in a pod
+            k8_pod_task("run_dlt_pipeline_k8", "run_shopify_pipeline.py", shop),
+        ]
+
+        # The webhook receiver merges its events into data.duckdb every minute;
+        # dbt also rebuilds the models downstream of the tables those merges changed
+        webhooks = PythonOperator(
+            task_id="collect_webhook_changes",
+            python_callable=collect_webhook_changes,
+            op_kwargs={"shop": shop},
+            # Runs after whichever mode task the branch picked
+            trigger_rule="none_failed_min_one_success",
+        )
+
+        transform = PythonOperator(
+            task_id="run_changed_dbt_models",
+            python_callable=run_changed_dbt_models,
+        )
+
+        # Last, so the rewrite sees every load of the run; its dataset schedules the payments DAG
+        maintenance = PythonOperator(
+            task_id="maintain_tables",
+            python_callable=maintain_tables,
+            op_kwargs={"shop": shop},
+            outlets=[_shop_loaded(shop)],
+        )
+
+        start >> choose >> mode_tasks >> webhooks >> transform >> maintenance
+
+    return dag
+
+def create_payments_dag(dag_id: str = "payments_reconciliation_dag", shops: list | None = None) -> DAG:
+    """
+    Build the DAG that loads Stripe and reconciles it against the orders of every shop.
+
+    The store sync and the reconciliation schema are shared by all shops, so they
+    run once, after every shop DAG has finished its run.
+
+    Args:
+        dag_id: DAG id
+        shops: Shop names whose DAG runs it waits for; None waits for the single shop DAG
+
+    Returns:
+        DAG: run_stripe_pipeline -> sync_store -> reconcile_payments
+    """
+    with DAG(
+        dag_id=dag_id,
+        description="Stripe load, store sync and payment reconciliation across all shops",
+        default_args=default_args,
+        schedule=[_shop_loaded(shop) for shop in shops or [None]],
+        catchup=False,
+        tags=["stripe", "dlt", "reconciliation"],
+    ) as dag:
+
+        stripe = PythonOperator(
+            task_id="run_stripe_pipeline",
+            python_callable=run_stripe_pipeline,
+        )
+
+        # Store transactions / customers feed the reconciliation
+        store_sync = PythonOperator(
+            task_id="sync_store",
+            python_callable=sync_store_db,
+        )
+
+        reconcile = PythonOperator(
+            task_id="reconcile_payments",
+            python_callable=reconcile_payments,
+        )
+
+        stripe >> store_sync >> reconcile
+
+    return dag
+
+# --- DAGs ---------------------------------------------------------------------
+if SHOPS:
+    for _shop in SHOPS:
+        _dag_id = f"shopify_products_dag__{_shop.replace('-', '_')}"
+        globals()[_dag_id] = create_shopify_products_dag(_dag_id, shop=_shop)
+else:
+    dag = create_shopify_products_dag("shopify_products_dag")
+payments_dag = create_payments_dag(shops=SHOPS)
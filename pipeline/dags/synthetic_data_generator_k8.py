@@ -21,7 +21,8 @@ def main():
         print(f"🐍 Python path: {sys.path}")
         
         # Import the synthetic data generator
-        from synthetic_data_generator import generate_synthetic_data, save_synthetic_data_to_duckdb
+        # profile_run / span fall back to no-ops when dlt/ is not in the pod
+        from synthetic_data_generator import generate_synthetic_data, profile_run, save_synthetic_data_to_duckdb, span
         
         print("📦 Synthetic data generator imported successfully")
         
@@ -31,18 +32,22 @@ def main():
         
         print(f"🗄️ Database path: {db_path}")
         
-        synthetic_data = generate_synthetic_data(
-            tables=tables,
-            db_path=db_path,
-            num_rows=1000,
-        )
-        
-        # Save to DuckDB
-        save_synthetic_data_to_duckdb(
-            synthetic_data=synthetic_data,
-            db_path=db_path,
-            replace_existing=True,
-        )
+        # Profiled when PIPELINE_PROFILE / PIPELINE_PROFILE_SAMPLE_RATE is set on the pod
+        with profile_run("synthetic"):
+            with span("generate"):
+                synthetic_data = generate_synthetic_data(
+                    tables=tables,
+                    db_path=db_path,
+                    num_rows=1000,
+                )
+
+            # Save to DuckDB
+            with span("save"):
+                save_synthetic_data_to_duckdb(
+                    synthetic_data=synthetic_data,
+                    db_path=db_path,
+                    replace_existing=True,
+                )
         
         print("✅ Synthetic data generated and saved successfully in Kubernetes!")
         
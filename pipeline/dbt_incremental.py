@@ -0,0 +1,148 @@
+"""
+Run only the dbt models downstream of source tables that actually changed.
+
+The nightly transform used to rebuild every model. Now the load step reports
+which raw tables it touched (or we detect it from a cheap per-table
+fingerprint), and dbt is invoked with ``source:<source>.<table>+`` selectors so
+transform time scales with the day's changes instead of total history.
+"""
+
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import duckdb
+
+PIPELINE_ROOT = Path(__file__).resolve().parent
+DBT_PROJECT_DIR = PIPELINE_ROOT.parent / "data"
+DBT_SOURCE_NAME = "shopify_raw"
+STATE_PATH = DBT_PROJECT_DIR / "target" / "source_fingerprints.json"
+DBT_DB_PATH = DBT_PROJECT_DIR / "shopify_monolith.duckdb"
+
+# Raw tables the dbt project reads from (see data/models/staging/shopify/shopify_src.yml)
+SOURCE_TABLES = ["transactions_table_1", "transactions_table_2"]
+
+# Tables the dlt loads report (e.g. run_shopify_pipeline returns ["products"])
+# -> the (source, table) pairs the models read them through
+DLT_TABLE_SOURCES = {
+    "products": [("shopify_products_table", "product"), (DBT_SOURCE_NAME, "shopify_products")],
+    "orders": [("shopify_orders_table", "order"), (DBT_SOURCE_NAME, "shopify_orders")],
+    "customers": [("shopify_customer", "customer"), (DBT_SOURCE_NAME, "shopify_customers")],
+    "refunds": [("shopify_refunds_table", "refund")],
+}
+
+
+def _source_db_path() -> str:
+    """DuckDB file holding the raw shopify_airflow tables."""
+    return os.getenv("SHOPIFY_RAW_DB_PATH", str(DBT_PROJECT_DIR / "shopify_airflow.duckdb"))
+
+
+def source_fingerprints(db_path: str = None, tables: list = None) -> dict:
+    """Cheap fingerprint (row count + max updated_at) for each raw source table."""
+    db_path = db_path or _source_db_path()
+    tables = tables or SOURCE_TABLES
+    fingerprints = {}
+
+    if not Path(db_path).exists():
+        return fingerprints
+
+    con = duckdb.connect(db_path, read_only=True)
+    try:
+        for table in tables:
+            try:
+                count, max_updated_at = con.execute(
+                    f"SELECT COUNT(*), MAX(updated_at) FROM public.{table}"
+                ).fetchone()
+            except duckdb.CatalogException:
+                continue
+            fingerprints[table] = [count, str(max_updated_at)]
+    finally:
+        con.close()
+
+    return fingerprints
+
+
+def _load_state() -> dict:
+    if STATE_PATH.exists():
+        return json.loads(STATE_PATH.read_text())
+    return {}
+
+
+def _save_state(fingerprints: dict):
+    state = {**_load_state(), **fingerprints}
+    STATE_PATH.parent.mkdir(parents=True, exist_ok=True)
+    STATE_PATH.write_text(json.dumps(state, indent=2))
+
+
+def detect_changed_tables(fingerprints: dict) -> list:
+    """Compare current fingerprints with the ones stored after the last dbt run."""
+    previous = _load_state()
+    return [table for table, fp in fingerprints.items() if previous.get(table) != fp]
+
+
+def build_selectors(changed_tables: list) -> list:
+    """Map changed raw or dlt tables to dbt selectors for everything downstream of them."""
+    selectors = []
+    for table in changed_tables:
+        sources = [(DBT_SOURCE_NAME, table)] if table in SOURCE_TABLES else DLT_TABLE_SOURCES.get(table)
+        if not sources:
+            print(f"⚠️ No dbt source for changed table '{table}', ignoring it")
+            continue
+        for source_name, source_table in sources:
+            selector = f"source:{source_name}.{source_table}+"
+            if selector not in selectors:
+                selectors.append(selector)
+    return selectors
+
+
+def refresh_transaction_rollups():
+    """Fold the rows this run loaded into the dashboard rollup tables (data/rollups.py)."""
+    if str(DBT_PROJECT_DIR) not in sys.path:
+        sys.path.append(str(DBT_PROJECT_DIR))
+    from rollups import refresh_rollups
+
+    con = duckdb.connect(str(DBT_DB_PATH))
+    try:
+        refresh_rollups(con)
+    finally:
+        con.close()
+
+
+def run_changed_models(changed_tables: list = None, full_refresh: bool = False) -> list:
+    """
+    Run the dbt models downstream of the changed source tables.
+
+    Args:
+        changed_tables: Raw (or dlt, see DLT_TABLE_SOURCES) tables the load reported as changed. Tables whose
+            fingerprint differs from the last run are always added to these.
+        full_refresh: Rebuild the selected incremental models from scratch.
+
+    Returns:
+        list: The dbt selectors that were run (empty if nothing changed)
+    """
+    fingerprints = source_fingerprints()
+    changed_tables = sorted(set(changed_tables or []) | set(detect_changed_tables(fingerprints)))
+
+    selectors = build_selectors(changed_tables)
+    if not selectors:
+        print("✅ No source tables changed, skipping dbt run")
+        return []
+
+    cmd = ["dbt", "run", "--profiles-dir", str(DBT_PROJECT_DIR), "--select", *selectors]
+    if full_refresh:
+        cmd.append("--full-refresh")
+
+    print(f"🔄 Running dbt for changed sources: {', '.join(changed_tables)}")
+    subprocess.run(cmd, cwd=DBT_PROJECT_DIR, check=True)
+
+    # Only remember the fingerprints once the models built successfully
+    _save_state(fingerprints)
+    refresh_transaction_rollups()
+    print("✅ dbt models downstream of changed sources are up to date")
+    return selectors
+
+
+if __name__ == "__main__":
+    run_changed_models()
@@ -1,4 +1,6 @@
+import argparse
 import os
+from contextlib import nullcontext
 from pathlib import Path
 import re
 import duckdb
@@ -6,6 +8,20 @@ import pandas as pd
 from sdv.metadata import SingleTableMetadata
 from sdv.single_table import GaussianCopulaSynthesizer
 
+try:
+    # Profiling helpers live with the dlt pipelines (importable when dlt/ is on the path,
+    # as in the Airflow worker)
+    from pipelines.profiling import profile_run, span
+except ImportError:
+    # e.g. the K8 pod, which only has the pipeline directory: run unprofiled
+    def profile_run(name: str, enabled: bool = False, **kwargs):
+        if enabled:
+            print("⚠️ pipelines.profiling is not importable (add dlt/ to PYTHONPATH), running unprofiled")
+        return nullcontext()
+
+    def span(name: str):
+        return nullcontext()
+
 UUID_RE = re.compile(r"^[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[1-5][0-9a-fA-F]{3}-[89abAB][0-9a-fA-F]{3}-[0-9a-fA-F]{12}$")
 
 def _infer_sdtype(col, dtype, sample: pd.Series) -> str:
@@ -42,6 +58,19 @@ def _infer_sdtype(col, dtype, sample: pd.Series) -> str:
 
     return "text"
 
+def to_categoricals(df: pd.DataFrame, max_categories: int = 255, max_ratio: float = 0.2) -> pd.DataFrame:
+    """
+    Store low-cardinality text columns of a sampled frame as pandas categoricals.
+
+    Each distinct value is kept once with small integer codes per row, which
+    cuts the frame's memory (and the CSV / DuckDB writes) for status-like columns.
+    """
+    for col in df.select_dtypes(include=["object", "string"]).columns:
+        nunique = df[col].nunique(dropna=True)
+        if 0 < nunique <= max_categories and nunique / max(1, len(df)) <= max_ratio:
+            df[col] = df[col].astype("category")
+    return df
+
 def build_metadata_from_duckdb(con: duckdb.DuckDBPyConnection, table: str, sample_limit: int = 100_000):
     """
     Pull schema via PRAGMA, load a sample (or full) table, and construct SDV SingleTableMetadata with
@@ -88,14 +117,41 @@ def build_metadata_from_duckdb(con: duckdb.DuckDBPyConnection, table: str, sampl
 
     return meta, df
 
-def generate_synthetic_data(tables: list, db_path: str = "data.duckdb", num_rows: int = 1000):
+def fit_synthesizer(con: duckdb.DuckDBPyConnection, table: str) -> GaussianCopulaSynthesizer:
+    """
+    Fit a synthesizer on the current contents of a table.
+
+    Args:
+        con: DuckDB connection
+        table: Table name (e.g., "shopify.products")
+
+    Returns:
+        GaussianCopulaSynthesizer: Fitted synthesizer, reusable for any number of samples
+    """
+    # Build metadata and get seed data
+    metadata, df_seed = build_metadata_from_duckdb(con, table)
+
+    # Ensure pandas dtypes are good for SDV (timestamps become datetime64)
+    for col, sdtype in (metadata.to_dict()["columns"]).items():
+        if sdtype.get("sdtype") == "datetime":
+            df_seed[col] = pd.to_datetime(df_seed[col], errors="coerce")
+
+    # Create synthesizer and fit
+    synth = GaussianCopulaSynthesizer(metadata, enforce_rounding=False)
+    with span("fit"):
+        synth.fit(df_seed)
+    return synth
+
+def generate_synthetic_data(tables: list, db_path: str = "data.duckdb", num_rows=1000, synthesizers: dict = None):
     """
     Generate synthetic data for specified tables using SDV.
     
     Args:
         tables: List of table names (e.g., ["shopify.products", "shopify.orders"])
         db_path: Path to DuckDB database
-        num_rows: Number of synthetic rows to generate per table
+        num_rows: Number of synthetic rows to generate per table, or a {table: rows} dict
+        synthesizers: Optional {table: synthesizer} cache; cached tables are sampled
+            without refitting and newly fitted synthesizers are added to it
     
     Returns:
         dict: Dictionary with table names as keys and synthetic DataFrames as values
@@ -105,36 +161,35 @@ def generate_synthetic_data(tables: list, db_path: str = "data.duckdb", num_rows
 
     print(f"Generating synthetic data to {db_path}")
 
-    con = duckdb.connect(db_path)
+    synthesizers = {} if synthesizers is None else synthesizers
+    con = None
     synthetic_data = {}
     
     for table in tables:
         try:
             print(f"Processing table: {table}")
-            
-            # Build metadata and get seed data
-            metadata, df_seed = build_metadata_from_duckdb(con, table)
-            
-            # Ensure pandas dtypes are good for SDV (timestamps become datetime64)
-            for col, sdtype in (metadata.to_dict()["columns"]).items():
-                if sdtype.get("sdtype") == "datetime":
-                    df_seed[col] = pd.to_datetime(df_seed[col], errors="coerce")
-            
-            # Create synthesizer and fit
-            synth = GaussianCopulaSynthesizer(metadata, enforce_rounding=False)
-            synth.fit(df_seed)
+            rows = num_rows.get(table, 1000) if isinstance(num_rows, dict) else num_rows
+
+            synth = synthesizers.get(table)
+            if synth is None:
+                # Only connect when something has to be fitted
+                con = con or duckdb.connect(db_path)
+                synth = fit_synthesizer(con, table)
+                synthesizers[table] = synth
             
             # Generate synthetic data
-            df_synth = synth.sample(num_rows=num_rows)
+            with span("sample"):
+                df_synth = to_categoricals(synth.sample(num_rows=rows))
             synthetic_data[table] = df_synth
             
-            print(f"✅ Generated {num_rows} synthetic rows for {table}")
+            print(f"✅ Generated {rows} synthetic rows for {table}")
             
         except Exception as e:
             print(f"❌ Error processing table {table}: {str(e)}")
             synthetic_data[table] = None
     
-    con.close()
+    if con is not None:
+        con.close()
     return synthetic_data
 
 def save_synthetic_data_to_duckdb(synthetic_data: dict, db_path: str = "data.duckdb", replace_existing: bool = True):
@@ -164,9 +219,23 @@ def save_synthetic_data_to_duckdb(synthetic_data: dict, db_path: str = "data.duc
                 if replace_existing:
                     # Drop existing table if it exists
                     con.execute(f"DROP TABLE IF EXISTS {full_table_name}")
+                    # The row hashes of dlt/pipelines/change_detection.py describe the
+                    # dropped rows; without them the next dlt run reloads the table
+                    if '.' in table_name and con.execute(
+                        "SELECT count(*) FROM duckdb_tables() WHERE schema_name = ? AND table_name = '_row_hashes'",
+                        [schema],
+                    ).fetchone()[0]:
+                        con.execute(f"DELETE FROM {schema}._row_hashes WHERE table_name = ?", [table])
                 
+                # Categoricals would become ENUM columns, which the dlt merges into the
+                # same table cannot extend; store them as text (closed domains are
+                # ENUM-encoded by dlt/pipelines/maintain_tables.py)
+                categoricals = [c for c in df.columns if isinstance(df[c].dtype, pd.CategoricalDtype)]
+                casts = ", ".join(f'CAST("{c}" AS VARCHAR) AS "{c}"' for c in categoricals)
+                replace = f" REPLACE ({casts})" if categoricals else ""
+
                 # Create table and insert data
-                con.execute(f"CREATE TABLE {full_table_name} AS SELECT * FROM df")
+                con.execute(f"CREATE TABLE {full_table_name} AS SELECT *{replace} FROM df")
                 print(f"✅ Saved synthetic data to {full_table_name}")
 
                 
@@ -175,23 +244,29 @@ def save_synthetic_data_to_duckdb(synthetic_data: dict, db_path: str = "data.duc
     
     con.close()
 
-def main():
+def main(profile: bool = False):
     """Main function for standalone execution"""
-    # Default tables to process
-    default_tables = ["shopify.products"]
-    
-    # Generate synthetic data
-    synthetic_data = generate_synthetic_data(default_tables)
-    
-    # Save to DuckDB
-    save_synthetic_data_to_duckdb(synthetic_data)
-    
-    # Also save to CSV for reference
-    for table_name, df in synthetic_data.items():
-        if df is not None:
-            csv_filename = f"synthetic_{table_name.replace('.', '_')}.csv"
-            df.to_csv(csv_filename, index=False)
-            print(f"✅ Saved CSV: {csv_filename}")
+    with profile_run("synthetic", enabled=profile):
+        # Default tables to process
+        default_tables = ["shopify.products"]
+
+        # Generate synthetic data
+        with span("generate"):
+            synthetic_data = generate_synthetic_data(default_tables)
+
+        # Save to DuckDB
+        with span("save"):
+            save_synthetic_data_to_duckdb(synthetic_data)
+
+        # Also save to CSV for reference
+        with span("csv"):
+            for table_name, df in synthetic_data.items():
+                if df is not None:
+                    csv_filename = f"synthetic_{table_name.replace('.', '_')}.csv"
+                    df.to_csv(csv_filename, index=False)
+                    print(f"✅ Saved CSV: {csv_filename}")
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Generate synthetic Shopify data with SDV")
+    parser.add_argument("--profile", action="store_true", help="Write a CPU/allocation profile to logs/profiles")
+    main(profile=parser.parse_args().profile)
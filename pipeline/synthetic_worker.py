@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+"""
+Long-lived synthetic data worker.
+
+Keeps SDV / RDT / pandas imported and fitted synthesizers in memory, and runs
+generation jobs submitted over HTTP. The DAG submits jobs here (when
+SYNTHETIC_WORKER_URL is set) instead of paying for a cold process, or a pod
+with a fresh `pip install`, on every run.
+
+Endpoints:
+    GET  /health    uptime, jobs served, cached synthesizers
+    POST /jobs      run a job synchronously:
+                    {"tables": ["shopify.products"],
+                     "num_rows": 1000 | {"shopify.products": 1000},
+                     "db_path": "/abs/path/data.duckdb",
+                     "replace_existing": true,
+                     "refit": false}
+
+Synthesizers are cached per (db_path, table) and refit after
+SYNTHETIC_WORKER_REFIT_SECONDS (default 3600) or when a job asks for "refit".
+Jobs run one at a time: fitting is CPU bound and DuckDB allows one writer.
+
+Run:
+    python synthetic_worker.py --host 0.0.0.0 --port 8790
+"""
+
+import argparse
+import json
+import os
+import threading
+import time
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import requests
+
+DEFAULT_DB_PATH = str(Path(__file__).resolve().parent.parent / "data.duckdb")
+REFIT_SECONDS = float(os.getenv("SYNTHETIC_WORKER_REFIT_SECONDS", "3600"))
+
+
+class SyntheticWorker:
+    """Fitted synthesizer cache + job runner."""
+
+    def __init__(self, refit_seconds: float = REFIT_SECONDS):
+        # Imported once when the worker starts (not when submit_job's module is
+        # imported by the DAG); this is the cold-start cost the worker amortizes
+        from synthetic_data_generator import generate_synthetic_data, save_synthetic_data_to_duckdb
+        self._generate = generate_synthetic_data
+        self._save = save_synthetic_data_to_duckdb
+
+        self.refit_seconds = refit_seconds
+        self.started = time.time()
+        self.jobs = 0
+        self.synthesizers = {}  # db_path -> {table: synthesizer}
+        self.fitted_at = {}     # (db_path, table) -> unix time
+        self.lock = threading.Lock()
+
+    def _cache_for(self, db_path: str, tables: list, refit: bool) -> dict:
+        cache = self.synthesizers.setdefault(db_path, {})
+        now = time.time()
+        for table in tables:
+            fitted = self.fitted_at.get((db_path, table))
+            if refit or fitted is None or now - fitted > self.refit_seconds:
+                cache.pop(table, None)
+        return cache
+
+    def run_job(self, job: dict) -> dict:
+        """
+        Generate and save synthetic data for one job.
+
+        Args:
+            job: {"tables", "num_rows", "db_path", "replace_existing", "refit"}
+
+        Returns:
+            dict: Rows generated per table, cache hits and timings
+        """
+        tables = job.get("tables") or ["shopify.products"]
+        num_rows = job.get("num_rows", 1000)
+        db_path = os.path.abspath(job.get("db_path") or DEFAULT_DB_PATH)
+
+        with self.lock:
+            started = time.perf_counter()
+            cache = self._cache_for(db_path, tables, job.get("refit", False))
+            cached = [t for t in tables if t in cache]
+
+            synthetic_data = self._generate(tables, db_path=db_path, num_rows=num_rows, synthesizers=cache)
+            for table in tables:
+                if table in cache and table not in cached:
+                    self.fitted_at[(db_path, table)] = time.time()
+            generated = time.perf_counter()
+
+            self._save(synthetic_data, db_path=db_path,
+                       replace_existing=job.get("replace_existing", True))
+            saved = time.perf_counter()
+            self.jobs += 1
+
+        failed = [t for t, df in synthetic_data.items() if df is None]
+        return {
+            "status": "failed" if failed else "ok",
+            "failed_tables": failed,
+            "rows": {t: len(df) for t, df in synthetic_data.items() if df is not None},
+            "cache_hits": cached,
+            "generate_seconds": round(generated - started, 4),
+            "save_seconds": round(saved - generated, 4),
+        }
+
+    def health(self) -> dict:
+        return {
+            "status": "ok",
+            "uptime_seconds": round(time.time() - self.started, 1),
+            "jobs": self.jobs,
+            "cached_synthesizers": [f"{db}:{t}" for db, tables in self.synthesizers.items() for t in tables],
+        }
+
+
+class WorkerHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    # Set by make_server
+    worker: SyntheticWorker = None
+
+    def _send_json(self, status: HTTPStatus, payload: dict):
+        body = json.dumps(payload, default=str).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path.rstrip("/") == "/health":
+            self._send_json(HTTPStatus.OK, self.worker.health())
+        else:
+            self._send_json(HTTPStatus.NOT_FOUND, {"error": f"Unknown path {self.path}"})
+
+    def do_POST(self):
+        if self.path.rstrip("/") != "/jobs":
+            self._send_json(HTTPStatus.NOT_FOUND, {"error": f"Unknown path {self.path}"})
+            return
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            job = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError as e:
+            self._send_json(HTTPStatus.BAD_REQUEST, {"error": f"Invalid job: {e}"})
+            return
+
+        try:
+            result = self.worker.run_job(job)
+        except Exception as e:
+            self.log_error("Job failed: %s", e)
+            self._send_json(HTTPStatus.INTERNAL_SERVER_ERROR, {"status": "failed", "error": str(e)})
+            return
+        status = HTTPStatus.OK if result["status"] == "ok" else HTTPStatus.INTERNAL_SERVER_ERROR
+        self._send_json(status, result)
+
+
+def make_server(host: str = "127.0.0.1", port: int = 8790, refit_seconds: float = REFIT_SECONDS) -> ThreadingHTTPServer:
+    """Build the worker HTTP server."""
+    handler = type("BoundWorkerHandler", (WorkerHandler,), {"worker": SyntheticWorker(refit_seconds)})
+    return ThreadingHTTPServer((host, port), handler)
+
+
+def submit_job(url: str, tables: list, num_rows=1000, db_path: str = None,
+               replace_existing: bool = True, refit: bool = False, timeout: float = 1800) -> dict:
+    """
+    Submit a generation job to a running worker and wait for the result.
+
+    Args:
+        url: Worker base URL (e.g. SYNTHETIC_WORKER_URL)
+        tables: Tables to generate
+        num_rows: Rows per table, or a {table: rows} dict
+        db_path: Target DuckDB path as seen by the worker
+        replace_existing: Replace the tables instead of appending
+        refit: Refit the synthesizers even if cached
+
+    Returns:
+        dict: Job result from the worker
+    """
+    response = requests.post(f"{url.rstrip('/')}/jobs", json={
+        "tables": tables,
+        "num_rows": num_rows,
+        "db_path": db_path,
+        "replace_existing": replace_existing,
+        "refit": refit,
+    }, timeout=timeout)
+    result = response.json()
+    if not response.ok:
+        raise RuntimeError(f"Synthetic worker job failed: {result}")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Long-lived synthetic data worker")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8790)
+    parser.add_argument("--refit-seconds", type=float, default=REFIT_SECONDS,
+                        help="Refit cached synthesizers older than this")
+    args = parser.parse_args()
+
+    server = make_server(args.host, args.port, args.refit_seconds)
+    print(f"🚀 Synthetic worker listening on http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
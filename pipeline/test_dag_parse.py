@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Parse-time regression test for the DAGs in pipeline/dags.
+
+Parses every DAG file the way the scheduler does (DagBag) and fails if:
+- a file has import errors
+- a file takes longer than the parse budget (DAG_PARSE_BUDGET_SECONDS, default 1.0)
+- parsing pulled in heavy modules that belong inside tasks (dlt, SDV, pandas,
+  duckdb, the Kubernetes provider and client, ...)
+
+Run from the pipeline directory with Airflow installed:
+    python -m pytest test_dag_parse.py
+    python test_dag_parse.py
+    SHOPIFY_SHOPS=shop-a,shop-b,shop-c python test_dag_parse.py   # per-shop DAGs
+"""
+
+import os
+import sys
+import time
+from pathlib import Path
+
+DAGS_DIR = Path(__file__).resolve().parent / "dags"
+PARSE_BUDGET_SECONDS = float(os.getenv("DAG_PARSE_BUDGET_SECONDS", "1.0"))
+
+# Modules that must only be imported when a task executes
+HEAVY_MODULES = (
+    "dlt",
+    "sdv",
+    "rdt",
+    "pandas",
+    "duckdb",
+    "synthetic_data_generator",
+    "pipelines",
+    "kubernetes",
+    "airflow.providers.cncf.kubernetes",
+)
+
+# Scripts in dags/ that run inside Kubernetes pods, not DAG definitions
+NON_DAG_FILES = ("run_shopify_pipeline.py", "synthetic_data_generator_k8.py")
+
+
+def test_dag_parse():
+    """Parse all DAGs and check import errors, parse time and heavy imports"""
+    from airflow.models import DagBag
+
+    # Airflow core is loaded before timing; only the DAG files are measured
+    preloaded = {m for m in sys.modules if any(m == h or m.startswith(h + ".") for h in HEAVY_MODULES)}
+
+    started = time.perf_counter()
+    dagbag = DagBag(dag_folder=str(DAGS_DIR), include_examples=False)
+    total = time.perf_counter() - started
+
+    problems = []
+    for path, error in dagbag.import_errors.items():
+        print(f"❌ Import error in {path}:\n{error}")
+        problems.append(f"import error in {Path(path).name}")
+
+    for stat in dagbag.dagbag_stats:
+        name = Path(stat.file.lstrip("/")).name
+        if name in NON_DAG_FILES:
+            continue
+        seconds = stat.duration.total_seconds()
+        status = "✅" if seconds <= PARSE_BUDGET_SECONDS else "❌"
+        print(f"{status} {name}: {seconds:.3f}s, {stat.dag_num} DAG(s), {stat.task_num} tasks "
+              f"(budget {PARSE_BUDGET_SECONDS:.2f}s)")
+        if seconds > PARSE_BUDGET_SECONDS:
+            problems.append(f"{name} parsed in {seconds:.3f}s")
+
+    leaked = sorted(
+        m for m in sys.modules
+        if m not in preloaded and any(m == h or m.startswith(h + ".") for h in HEAVY_MODULES)
+    )
+    if leaked:
+        problems.append(f"heavy modules imported at parse time: {', '.join(leaked[:10])}")
+        print(f"❌ Heavy modules imported at parse time: {', '.join(leaked[:10])}"
+              f"{' ...' if len(leaked) > 10 else ''}")
+
+    print(f"📊 Parsed {len(dagbag.dags)} DAG(s) in {total:.3f}s")
+    assert not problems, "; ".join(problems)
+
+
+if __name__ == "__main__":
+    try:
+        test_dag_parse()
+    except AssertionError:
+        sys.exit(1)
@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+"""
+Tests for the changed-source dbt selection in dbt_incremental.py.
+
+Run from the pipeline directory:
+    python -m pytest test_dbt_incremental.py
+"""
+
+import re
+
+from dbt_incremental import DBT_PROJECT_DIR, DBT_SOURCE_NAME, DLT_TABLE_SOURCES, SOURCE_TABLES, build_selectors
+
+SOURCE_CALL = re.compile(r"source\(\s*'([^']+)'\s*,\s*'([^']+)'\s*\)")
+
+
+def _model_sources() -> set:
+    """(source, table) pairs the project's models read."""
+    return {
+        match for path in (DBT_PROJECT_DIR / "models").rglob("*.sql")
+        for match in SOURCE_CALL.findall(path.read_text())
+    }
+
+
+def test_raw_source_tables_are_selected():
+    assert build_selectors(["transactions_table_1"]) == [f"source:{DBT_SOURCE_NAME}.transactions_table_1+"]
+
+
+def test_dlt_table_names_map_to_their_source():
+    # run_shopify_pipeline pushes the dlt table name via XCom
+    assert build_selectors(["products"]) == [
+        "source:shopify_products_table.product+", f"source:{DBT_SOURCE_NAME}.shopify_products+"
+    ]
+    assert build_selectors(["products", "products"]) == build_selectors(["products"])
+
+
+def test_every_selector_reaches_a_model():
+    # A selector for a source no model reads selects nothing
+    read = {f"source:{source}.{table}+" for source, table in _model_sources()}
+    for table in [*SOURCE_TABLES, *DLT_TABLE_SOURCES]:
+        selectors = build_selectors([table])
+        assert selectors and set(selectors) <= read, table
+
+
+def test_unknown_tables_are_ignored():
+    assert build_selectors(["_dlt_loads", "transactions_table_2"]) == [f"source:{DBT_SOURCE_NAME}.transactions_table_2+"]